@@ -0,0 +1,99 @@
+"""
+webhook 回應時間比較（一般模式 vs 快速回應模式）
+python harness/bench_ack.py [請求數] [每個事件處理毫秒] [sqlite|memory]
+
+以模擬延遲的處理函數取代實際處理（不會讀寫 Firestore 或呼叫 LINE API），
+量測 lineWebhook 回應 LINE 所需的時間：
+  - 一般模式：處理完所有事件才回應
+  - 快速回應模式：驗證簽章並排入佇列後就回應，再由 worker 處理
+並確認快速回應模式下 worker 處理了所有事件
+不需要 chatBotConfig.py 或 Firebase 憑證（事件去重記錄寫入 FakeFirestore）
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from env import load_line_bot, message_event, webhook_request
+from fake_firestore import FakeFirestore
+from line_stub import LineRecorder
+
+main = load_line_bot(FakeFirestore(), LineRecorder())
+
+
+def build_request(index, run_name):
+    """
+    產生一個以第一台 Bot 簽章、含一個文字訊息事件的 webhook 請求
+    每一輪使用不同的 run_name，webhookEventId 才不會被當成重送而丟棄
+    """
+    return webhook_request(1, [message_event(f"U{index:032d}", "班表", f"EV{run_name}{index:08d}", f"reply-{index}")])
+
+
+def measure(requests):
+    """
+    依序送出請求並量測每次 lineWebhook 的回應時間
+
+    Returns:
+        list: 毫秒
+    """
+    samples = []
+    for request in requests:
+        started = time.perf_counter()
+        main.lineWebhook(request)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+def summarize(label, samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label}: p50 {statistics.median(ordered):.1f}ms  p95 {p95:.1f}ms  max {ordered[-1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 300) / 1000
+    queue_type = sys.argv[3] if len(sys.argv) > 3 else 'sqlite'
+
+    handled = []
+    lock = threading.Lock()
+
+    def slow_dispatch(event):
+        # 模擬 Firestore 查詢與 LINE API 往返
+        time.sleep(latency)
+        with lock:
+            handled.append(event.reply_token)
+
+    main.event_scheduler = main.EventScheduler(dispatch=slow_dispatch)
+    queue_path = os.path.join(tempfile.mkdtemp(), 'events.sqlite3')
+    main.set_event_queue(main.SQLiteEventQueue(queue_path) if queue_type == 'sqlite' else main.MemoryEventQueue())
+    print(f"{count} 個請求，每個事件處理 {latency * 1000:.0f}ms，佇列: {queue_type}")
+
+    main.FAST_ACK = False
+    summarize("一般模式", measure([build_request(i, "sync") for i in range(count)]))
+
+    handled.clear()
+    main.FAST_ACK = True
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            if not main.process_queued_events():
+                time.sleep(0.01)
+
+    worker_thread = threading.Thread(target=worker, daemon=True)
+    worker_thread.start()
+    summarize("快速回應模式", measure([build_request(i, "fast") for i in range(count)]))
+
+    deadline = time.time() + count * latency + 5
+    while len(handled) < count and time.time() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    worker_thread.join()
+    print(f"worker 處理 {len(handled)}/{count} 個事件，佇列剩餘 {len(main.get_event_queue())} 筆")
+    sys.exit(0 if len(handled) == count else 1)
@@ -0,0 +1,122 @@
+"""
+多事件 webhook 排程檢查
+python harness/bench_events.py [使用者數] [每人事件數] [每個事件延遲毫秒]
+
+產生一個多位使用者事件交錯的 webhook 請求（以 harness 假設定中第一台 Bot 的 secret 簽章），
+以模擬延遲的處理函數取代實際處理（不會讀寫 Firestore 或呼叫 LINE API），
+比較依序處理與 EventScheduler 並行處理的耗時，並檢查：
+  - 每個事件都只處理一次
+  - 同一位使用者的事件依原本順序處理
+有任何錯誤時以非 0 結束
+不需要 chatBotConfig.py 或 Firebase 憑證
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from env import CHANNEL_SECRETS, load_line_bot
+from fake_firestore import FakeFirestore
+from line_stub import LineRecorder
+
+main = load_line_bot(FakeFirestore(), LineRecorder())
+
+
+def build_payload(user_count, events_per_user):
+    """
+    產生多事件 webhook 請求，各使用者的事件交錯排列
+
+    Returns:
+        tuple: (body, signature)
+    """
+    events = []
+    for seq in range(events_per_user):
+        for user in range(user_count):
+            events.append({
+                "type": "message",
+                "mode": "active",
+                "timestamp": int(time.time() * 1000),
+                "webhookEventId": f"EV{user:04d}{seq:04d}",
+                "deliveryContext": {"isRedelivery": False},
+                "source": {"type": "user", "userId": f"U{user:032d}"},
+                "replyToken": f"reply-{user}-{seq}",
+                "message": {"type": "text", "id": f"{user}{seq}", "text": str(seq)},
+            })
+    body = json.dumps({"destination": "Ubenchmark", "events": events})
+    signature = base64.b64encode(
+        hmac.new(CHANNEL_SECRETS[0].encode(), body.encode(), hashlib.sha256).digest()
+    ).decode()
+    return body, signature
+
+
+class RecordingDispatch:
+    """模擬處理函數：等待固定延遲（Firestore / LINE 往返），並記錄每位使用者的處理順序"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.processed = {}  # { userId: [序號, ...] }
+
+    def __call__(self, event):
+        time.sleep(self.latency)
+        with self.lock:
+            self.processed.setdefault(event.source.user_id, []).append(int(event.message.text))
+
+
+def run(workers, events, latency):
+    """
+    以指定的 worker 數處理事件
+
+    Returns:
+        tuple: (秒數, RecordingDispatch)
+    """
+    dispatch = RecordingDispatch(latency)
+    scheduler = main.EventScheduler(workers=workers, dispatch=dispatch)
+    started = time.perf_counter()
+    scheduler.run(events)
+    return time.perf_counter() - started, dispatch
+
+
+def check(dispatch, user_count, events_per_user):
+    """
+    檢查每位使用者的事件都依序處理且沒有遺漏
+
+    Returns:
+        list: 錯誤訊息
+    """
+    errors = []
+    expected = list(range(events_per_user))
+    if len(dispatch.processed) != user_count:
+        errors.append(f"處理了 {len(dispatch.processed)} 位使用者，應為 {user_count} 位")
+    for user_id, order in dispatch.processed.items():
+        if order != expected:
+            errors.append(f"{user_id} 的處理順序為 {order}")
+    return errors
+
+
+if __name__ == "__main__":
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    events_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 100) / 1000
+
+    body, signature = build_payload(user_count, events_per_user)
+    events = main.parsers[1].parse(body, signature)
+    print(f"{len(events)} 個事件（{user_count} 位使用者 × {events_per_user}），每個事件 {latency * 1000:.0f}ms")
+
+    errors = []
+    for label, workers in (("依序處理", 1), (f"EventScheduler（{main.EVENT_WORKERS} workers）", main.EVENT_WORKERS)):
+        elapsed, dispatch = run(workers, events, latency)
+        problems = check(dispatch, user_count, events_per_user)
+        errors += [f"{label}: {problem}" for problem in problems]
+        print(f"{label}: {elapsed:.2f}s {'順序正確' if not problems else '順序錯誤'}")
+
+    for error in errors:
+        print(f"  {error}")
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,104 @@
+"""
+week_clock_alarm 提醒流程量測（FakeFirestore + benchmark_push 的本地 LINE API stub）
+python harness/bench_reminder.py [Firestore 延遲毫秒] [LINE API 延遲毫秒] [人數]
+
+指定人數時改用 synthetic.seed_congregation 產生的資料（24 場崇拜、3 年，提醒日依資料而定），
+否則使用 fixtures.seed_basic 的資料並讓每個人每天都提醒
+
+依序執行：
+  1. 第一次提醒（_reminders 中沒有 outbox，需要從班表產生）
+  2. 同一天再執行一次（outbox 已存在，_reminder_log 中的用戶全部跳過）
+  3. 收件匣到期通知推播
+輸出每一步的耗時、讀寫次數與 stub 收到的推播數
+週日不提醒，在週日執行時以前一天（週六）的日期量測
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from env import WEEK_CLOCK_ALARM_DIR, load_line_bot, load_week_clock_alarm
+from fake_firestore import FakeFirestore
+from fixtures import seed_basic
+from line_stub import LineRecorder
+
+
+class SaturdayDatetime(datetime):
+    """把今天（週日）當成前一天，讓週日也能量測提醒流程"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime.now(tz) - timedelta(days=1)
+
+
+def measure(db, stub, step, func):
+    before = db.stats()
+    requests_before = stub.requests
+    started = time.perf_counter()
+    func()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    after = db.stats()
+    return (step, elapsed_ms, after['reads'] - before['reads'], after['writes'] - before['writes'],
+            stub.requests - requests_before)
+
+
+def run_benchmark(firestore_latency=0.02, line_latency=0.05, user_count=None):
+    """
+    Args:
+        user_count: 以 synthetic 產生這麼多位使用者，None 時使用 seed_basic
+
+    Returns:
+        list: [(步驟, 毫秒, reads, writes, 推播請求數), ...]
+    """
+    db = FakeFirestore(latency=firestore_latency)
+    # 種子資料的索引需要 line_bot_GCF 的 build_indexes
+    load_line_bot(db, LineRecorder())
+    if user_count:
+        from synthetic import seed_congregation
+        seed_congregation(db, users=user_count)
+    else:
+        seed_basic(db)
+        # 每天都提醒，讓量測不受執行當天影響
+        for user_name in db.dump().get('users', {}):
+            db.collection('users').document(user_name).update({'alarm_days': list(range(6))})
+
+    sys.path.insert(0, WEEK_CLOCK_ALARM_DIR)
+    from benchmark_push import LineApiStub
+    stub = LineApiStub(line_latency, 0)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    alarm = load_week_clock_alarm(db, stub.endpoint)
+    if datetime.now().weekday() == 6:
+        alarm.datetime = SaturdayDatetime
+
+    try:
+        return [
+            measure(db, stub, "提醒（產生 outbox）", alarm.reminder_all_serves),
+            measure(db, stub, "提醒（重複執行）", alarm.reminder_all_serves),
+            measure(db, stub, "收件匣到期通知", alarm.deliver_expired_notices),
+        ]
+    finally:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    firestore_latency = (float(sys.argv[1]) if len(sys.argv) > 1 else 20) / 1000
+    line_latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    user_count = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        results = run_benchmark(firestore_latency, line_latency, user_count)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print(f"Firestore 延遲 {firestore_latency * 1000:.0f}ms，LINE API 延遲 {line_latency * 1000:.0f}ms"
+          + (f"，{user_count} 人" if user_count else ""))
+    print(f"{'步驟':<16}{'耗時(ms)':>10}{'讀取':>8}{'寫入':>8}{'推播':>8}")
+    for step, elapsed_ms, reads, writes, pushes in results:
+        print(f"{step:<16}{elapsed_ms:>10.1f}{reads:>8}{writes:>8}{pushes:>8}")
@@ -0,0 +1,210 @@
+"""
+lineWebhook 端到端延遲量測（FakeFirestore + 記錄用 LINE API，不連線任何外部服務）
+python harness/bench_webhook.py [回合數] [Firestore 延遲毫秒] [LINE API 延遲毫秒]
+
+每回合從相同的初始資料開始，依實際操作順序送出所有文字指令與 postback：
+  文字：目錄 / 班表 / 總班表 / 設定 / 換班 / 代班 / 未登入訊息 / 邀請碼登入，以及加入好友
+  postback：A* A& B# B& C& D& F&（調班）、A* A& G# G& E&（代班）、C*、W&
+postback data 取自前一步的回覆（或推播給對方的訊息），與使用者實際點選的按鈕相同
+輸出每一步的 p50 / p95 延遲（lineWebhook 回應前的完整時間）與平均讀寫、推播次數
+有任何一步無法執行時以非 0 結束
+"""
+
+import itertools
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from env import load_line_bot, webhook_request, message_event, postback_event, follow_event
+from fake_firestore import FakeFirestore
+from fixtures import seed_basic
+from line_stub import LineRecorder, find_postback_data
+
+TEXT_COMMANDS = ['目錄', '班表', '總班表', '設定']
+POSTBACK_PREFIXES = ['A*', 'A&', 'B&', 'B#', 'G#', 'C&', 'G&', 'D&', 'E&', 'F&', 'C*', 'W&']
+
+
+class MissingStep(Exception):
+    """前一步的回覆中找不到需要的按鈕"""
+
+
+class Replay:
+    """送出 webhook 事件並記錄每一步的延遲與讀寫次數"""
+
+    def __init__(self, main, db, line):
+        self.main = main
+        self.db = db
+        self.line = line
+        self.samples = {}  # { 步驟: [{ ms, reads, writes, pushes, ... }, ...] }
+        self.missing = set()
+        self.counter = itertools.count(1)
+
+    def send(self, step, bot_id, make_event):
+        """
+        送出一個事件
+
+        Args:
+            step: 報告中的步驟名稱
+            bot_id: 使用者所在的 bot
+            make_event: (event_id, reply_token) → 事件 dict
+
+        Returns:
+            list: 此事件收到的回覆訊息（JSON dict）
+        """
+        number = next(self.counter)
+        reply_token = f"reply-{number}"
+        request = webhook_request(bot_id, [make_event(f"bench-{number:08d}", reply_token)])
+
+        before = self.db.stats()
+        pushes_before = self.line.count('push')
+        started = time.perf_counter()
+        self.main.lineWebhook(request)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        after = self.db.stats()
+
+        sample = {key: after[key] - before[key] for key in after}
+        sample['ms'] = elapsed_ms
+        sample['pushes'] = self.line.count('push') - pushes_before
+        self.samples.setdefault(step, []).append(sample)
+        return self.line.replies(reply_token)
+
+    def text(self, user, text, step=None):
+        return self.send(step or f"文字 {text}", user['line_bot_id'] or 1,
+                         lambda event_id, token: message_event(user['lineId'], text, event_id, token))
+
+    def postback(self, user, data):
+        return self.send(data[:2], user['line_bot_id'] or 1,
+                         lambda event_id, token: postback_event(user['lineId'], data, event_id, token))
+
+    def follow(self, user):
+        return self.send("加入好友", user['line_bot_id'] or 1,
+                         lambda event_id, token: follow_event(user['lineId'], event_id, token))
+
+    def pick(self, messages, prefix):
+        """取出回覆中第一個以 prefix 開頭的 postback data"""
+        found = find_postback_data(messages, prefix)
+        if not found:
+            self.missing.add(prefix)
+            raise MissingStep(prefix)
+        return found[0]
+
+
+def user_by_name(users, name):
+    return next(user for user in users.values() if user['name'] == name)
+
+
+def run_round(replay, users):
+    """依實際操作順序送出一回合的所有事件"""
+    requester = users['requester']
+
+    for text in TEXT_COMMANDS:
+        replies = replay.text(requester, text)
+        if text == '設定':
+            replay.postback(requester, replay.pick(replies, 'C*'))
+        elif text == '班表':
+            replay.postback(requester, replay.pick(replies, 'W&'))
+
+    # 調班：A* → A& → B#（兩人的日期）→ B& → C& → 對方 D& → F&
+    try:
+        replies = replay.text(requester, '換班')
+        replies = replay.postback(requester, replay.pick(replies, 'A*S|youth-serve'))
+        replies = replay.postback(requester, replay.pick(replies, 'A&'))
+        replies = replay.postback(requester, replay.pick(replies, 'B#'))
+        replies = replay.postback(requester, replay.pick(replies, 'B&'))
+        request_data = replay.pick(replies, 'C&')
+        respondent = user_by_name(users, request_data[2:].split('|')[1])
+        replay.postback(requester, request_data)
+        replies = replay.postback(respondent, replay.pick(replay.line.pushes(respondent['lineId'])[-1:], 'D&'))
+        replay.postback(respondent, replay.pick(replies, 'F&'))
+    except MissingStep:
+        pass
+
+    # 代班：A* → A& → G# → G& → 對方 E&
+    try:
+        replies = replay.text(requester, '代班')
+        replies = replay.postback(requester, replay.pick(replies, 'A*G|youth-serve'))
+        replies = replay.postback(requester, replay.pick(replies, 'A&'))
+        replies = replay.postback(requester, replay.pick(replies, 'G#'))
+        request_data = replay.pick(replies, 'G&')
+        respondent = user_by_name(users, request_data[2:].split('|')[0])
+        replay.postback(requester, request_data)
+        replay.postback(respondent, replay.pick(replay.line.pushes(respondent['lineId'])[-1:], 'E&'))
+    except MissingStep:
+        pass
+
+    # 未登入使用者
+    newcomer = users['newcomer']
+    replay.follow(newcomer)
+    replay.text(newcomer, '你好', step="文字 未登入")
+    replay.text(newcomer, newcomer['login_token'], step="文字 邀請碼登入")
+
+
+def percentile(values, ratio):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+
+def print_row(step, samples):
+    latencies = [sample['ms'] for sample in samples]
+    print(f"{step:<16}{len(samples):>6}{statistics.median(latencies):>10.1f}{percentile(latencies, 0.95):>10.1f}"
+          + "".join(f"{statistics.mean(sample[key] for sample in samples):>8.1f}"
+                    for key in ('reads', 'writes', 'pushes')))
+
+
+def print_report(replay):
+    print(f"{'步驟':<16}{'次數':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'讀取':>8}{'寫入':>8}{'推播':>8}")
+    all_samples = []
+    for step, samples in replay.samples.items():
+        all_samples += samples
+        print_row(step, samples)
+    print_row('全部', all_samples)
+
+
+def run_benchmark(rounds=10, firestore_latency=0.02, line_latency=0.05, db=None):
+    """
+    Args:
+        db: 要使用的 client（需支援 dump / restore / stats，如包住 FakeFirestore 的 MeteredFirestore），
+            None 時建立新的 FakeFirestore
+
+    Returns:
+        Replay: 含每一步的量測結果
+    """
+    db = db or FakeFirestore(latency=firestore_latency)
+    line = LineRecorder(latency=line_latency)
+    main = load_line_bot(db, line)
+    users = seed_basic(db)
+    initial = db.dump()
+
+    replay = Replay(main, db, line)
+    for _ in range(rounds):
+        db.restore(initial)
+        line.clear()
+        run_round(replay, users)
+    return replay
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    firestore_latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    line_latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 50) / 1000
+
+    # 處理函數會印出每個事件的讀取次數，量測時不需要
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        replay = run_benchmark(rounds, firestore_latency, line_latency)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    print(f"{rounds} 回合，Firestore 延遲 {firestore_latency * 1000:.0f}ms，LINE API 延遲 {line_latency * 1000:.0f}ms")
+    print_report(replay)
+
+    covered = {step for step in replay.samples if step in POSTBACK_PREFIXES}
+    missing = sorted(set(POSTBACK_PREFIXES) - covered | replay.missing)
+    if missing:
+        print(f"無法執行: {', '.join(missing)}")
+    sys.exit(1 if missing else 0)
@@ -0,0 +1,69 @@
+"""
+每個指令的 Firestore 讀寫上限（以 fixtures.seed_basic 的資料：4 位使用者、2 場崇拜、各 8 週班表）
+
+上限依每個指令「應該」讀取哪些文件訂定，不是目前量測到的數值：
+  - reads 加上少量餘裕（約 1 次或 25%），冷快取多一次查詢、多讀一份設定不會讓檢查失敗，
+    多一次查詢所有使用者或每次都重新產生快取這類退步仍會超過上限
+  - writes 由流程決定（去重記錄、使用量、交易內容），多一次寫入就是行為改變，不加餘裕
+  - reads 寫成「需要的次數 + 餘裕」
+修改程式使讀寫次數超過上限時，確認必要後再調高這裡的數值並更新說明
+
+python harness/check_budgets.py 或 pytest harness 會實際執行每個指令並比較
+
+- reads: 計費讀取（文件讀取 + 查詢結果，查詢沒有結果也算 1 次）
+- writes: 寫入的文件數；有副作用的事件（C& G& E& F& C* 與邀請碼登入）另外包含 webhook 事件去重記錄（_webhook_events）1 次，
+  已登入使用者的文字指令包含使用量統計 1 次
+"""
+
+# 以 lineId 找使用者：_idx_line + users
+USER_LOOKUP = 2
+# 換班 / 代班 每場崇拜讀取 _metadata 與之後各週的班表（seed_basic 為 8 週，再留 4 週）
+WEEKS_AHEAD = 12
+
+BUDGETS = {
+    # ---------- 文字指令（handle_message） ----------
+    # 使用者
+    "文字 目錄": {"reads": USER_LOOKUP + 1, "writes": 1},
+    # 使用者 + 崇拜清單（冷快取）；參與多場崇拜時只回覆選單
+    "文字 班表": {"reads": USER_LOOKUP + 2, "writes": 1},
+    "文字 總班表": {"reads": USER_LOOKUP + 1, "writes": 1},
+    "文字 設定": {"reads": USER_LOOKUP + 1, "writes": 1},
+    # 使用者 + 每場崇拜的 _metadata 與之後的日期（2 場）
+    "文字 換班": {"reads": USER_LOOKUP + 2 * (1 + WEEKS_AHEAD), "writes": 1},
+    # 使用者 + 各崇拜的 _metadata + 有服事的那場之後的日期（seed_basic 中只有 1 場）+ 領取收件匣
+    "文字 代班": {"reads": USER_LOOKUP + 2 + WEEKS_AHEAD + 1, "writes": 3},
+    # 只查 _idx_line（沒有結果）
+    "文字 未登入": {"reads": 1 + 1, "writes": 0},
+    # _idx_line + _idx_token + 使用者 + 推播額度 + sync_user_reminders 查詢之後日期的 _reminders（沒有結果也算 1 次）
+    "文字 邀請碼登入": {"reads": 5 + 1, "writes": 4},
+
+    # ---------- postback（handle_postback） ----------
+    # 使用者 + _metadata
+    "A*": {"reads": USER_LOOKUP + 1 + 1, "writes": 0},
+    # _metadata（班表快取）
+    "A&": {"reads": 1 + 1, "writes": 0},
+    # 只根據 postback data 產生選單
+    "B#": {"reads": 0, "writes": 0},
+    # 申請人的 serve_types + 申請人參與的崇拜該日期（field mask）
+    "B&": {"reads": 1 + 2 + 1, "writes": 0},
+    # 對方的使用者資料 + 提醒對方的該日期班表；寫入 _shift、使用量、推播額度
+    "C&": {"reads": 2 + 1, "writes": 4},
+    # _shift
+    "D&": {"reads": 1 + 1, "writes": 0},
+    # transaction 讀 _shift 與兩個日期 + 申請人 + 兩天的 _reminders；
+    # 寫入兩個日期、_shift、_current_week、_metadata、通知收件匣與 _reminders
+    "F&": {"reads": 6 + 2, "writes": 9},
+    "G#": {"reads": 0, "writes": 0},
+    # 對方的使用者資料；寫入 _shift、使用量、推播額度
+    "G&": {"reads": 1 + 1, "writes": 4},
+    # _shift + 申請人；寫入 _shift、通知收件匣與使用者
+    "E&": {"reads": 2 + 1, "writes": 5},
+    # 使用者 + sync_user_reminders 查詢之後日期的 _reminders（沒有結果也算 1 次）
+    "C*": {"reads": USER_LOOKUP + 1 + 1, "writes": 2},
+    # _current_week；過期時重新產生（_metadata + 最多 2 筆班表）並寫回
+    "W&": {"reads": 1 + 3 + 1, "writes": 1},
+
+    # ---------- 其他事件 ----------
+    # 不讀不寫
+    "加入好友": {"reads": 0, "writes": 0},
+}
@@ -0,0 +1,69 @@
+"""
+檢查每個指令的 Firestore 讀寫次數是否超過 budgets.BUDGETS 的上限
+python harness/check_budgets.py [回合數]
+
+以 MeteredFirestore 包住 FakeFirestore，依 bench_webhook 的操作順序執行所有文字指令與 postback，
+取每個步驟所有回合中的最大值（第一回合包含冷快取的讀取）與上限比較
+任何步驟超過上限、沒有設定上限或無法執行時以非 0 結束
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_webhook import run_benchmark
+from budgets import BUDGETS
+from fake_firestore import FakeFirestore
+from metered_firestore import MeteredFirestore
+
+
+def check_budgets(replay, budgets):
+    """
+    Args:
+        replay: bench_webhook.Replay（samples 需包含 budgets 中的欄位）
+        budgets: { 步驟: { 欄位: 上限 } }
+
+    Returns:
+        list: 問題描述，沒有問題時為空列表
+    """
+    problems = []
+    print(f"{'步驟':<16}{'讀取':>8}{'上限':>6}{'寫入':>8}{'上限':>6}{'查詢結果':>10}")
+    for step, samples in replay.samples.items():
+        actual = {key: max(sample[key] for sample in samples) for key in ('reads', 'writes', 'query_results')}
+        budget = budgets.get(step)
+        if budget is None:
+            problems.append(f"{step}: 沒有設定上限（實際 reads={actual['reads']} writes={actual['writes']}）")
+            budget = {}
+
+        over = [key for key, limit in budget.items() if actual[key] > limit]
+        for key in over:
+            problems.append(f"{step}: {key} {actual[key]} 超過上限 {budget[key]}")
+        print(f"{step:<16}{actual['reads']:>8}{budget.get('reads', '-'):>6}"
+              f"{actual['writes']:>8}{budget.get('writes', '-'):>6}{actual['query_results']:>10}"
+              + ("  ✗" if over else ""))
+
+    for step in budgets:
+        if step not in replay.samples:
+            problems.append(f"{step}: 沒有執行")
+    for prefix in sorted(replay.missing):
+        problems.append(f"{prefix}: 前一步的回覆中找不到按鈕")
+    return problems
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        replay = run_benchmark(rounds, 0, 0, db=MeteredFirestore(FakeFirestore()))
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+    problems = check_budgets(replay, BUDGETS)
+    if problems:
+        print()
+        print("\n".join(problems))
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,154 @@
+"""
+在本地模擬環境中載入 line_bot_GCF / week_clock_alarm
+
+- 以假的 chatBotConfig 取代真正的設定（不會用到真正的 channel secret / token）
+- Firestore 改用傳入的 client（FakeFirestore 或 emulator_client() 連線的模擬器）
+- LINE API 改用 LineRecorder（line_bot_GCF）或本地 HTTP stub（week_clock_alarm）
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+import types
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINE_BOT_DIR = os.path.join(ROOT, 'line_bot_GCF')
+WEEK_CLOCK_ALARM_DIR = os.path.join(ROOT, 'week_clock_alarm')
+
+BOT_COUNT = 2
+CHANNEL_SECRETS = [f"harness-secret-{bot_id}" for bot_id in range(1, BOT_COUNT + 1)]
+CHANNEL_ACCESS_TOKENS = [f"harness-token-{bot_id}" for bot_id in range(1, BOT_COUNT + 1)]
+
+warnings.filterwarnings('ignore', module='linebot')
+
+
+def install_config():
+    """以假的 chatBotConfig 取代部署目錄中的設定"""
+    config = types.ModuleType('chatBotConfig')
+    config.channel_secret = list(CHANNEL_SECRETS)
+    config.channel_access_token = list(CHANNEL_ACCESS_TOKENS)
+    config.line_bot_id = 1
+    sys.modules['chatBotConfig'] = config
+
+
+def load_line_bot(db, line):
+    """
+    載入 line_bot_GCF/main.py
+
+    Args:
+        db: Firestore client（FakeFirestore 或模擬器的 client）
+        line: LineRecorder
+
+    Returns:
+        module: main
+    """
+    install_config()
+    if LINE_BOT_DIR not in sys.path:
+        sys.path.insert(0, LINE_BOT_DIR)
+    import main
+    main.db.set_client(db)
+    line.install(main, BOT_COUNT)
+    return main
+
+
+def load_week_clock_alarm(db, endpoint):
+    """
+    載入 week_clock_alarm/week_clock_alarm.py
+
+    Args:
+        db: Firestore client
+        endpoint: LINE API stub 的位址（如 benchmark_push.LineApiStub().endpoint）
+
+    Returns:
+        module: week_clock_alarm
+    """
+    install_config()
+    if WEEK_CLOCK_ALARM_DIR not in sys.path:
+        sys.path.insert(0, WEEK_CLOCK_ALARM_DIR)
+    import week_clock_alarm
+    week_clock_alarm.db.set_client(db)
+    week_clock_alarm.LINE_API_ENDPOINT = endpoint
+    return week_clock_alarm
+
+
+def emulator_client(project=None):
+    """
+    連線 Firestore 模擬器的 client（需設定 FIRESTORE_EMULATOR_HOST，如 localhost:8080）
+
+    Args:
+        project: 專案 ID，預設取 GCLOUD_PROJECT 或 demo-harness
+
+    Returns:
+        google.cloud.firestore.Client
+    """
+    from google.cloud import firestore
+
+    if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        raise RuntimeError("請先設定 FIRESTORE_EMULATOR_HOST（如 localhost:8080）")
+    return firestore.Client(project=project or os.environ.get('GCLOUD_PROJECT', 'demo-harness'))
+
+
+class WebhookRequest:
+    """與 GCF / Flask request 相同的介面（headers / path / get_data）"""
+
+    def __init__(self, body, signature, path):
+        self.headers = {'X-Line-Signature': signature}
+        self.path = path
+        self._body = body
+
+    def get_data(self, as_text=False):
+        return self._body if as_text else self._body.encode()
+
+
+def webhook_request(bot_id, events):
+    """
+    產生以該 bot 的 channel secret 簽章的 webhook 請求
+
+    Args:
+        bot_id: line_bot_id
+        events: webhook 事件 dict 列表（見 message_event / postback_event）
+
+    Returns:
+        WebhookRequest
+    """
+    body = json.dumps({"destination": f"Uharnessbot{bot_id}", "events": events}, ensure_ascii=False)
+    signature = base64.b64encode(
+        hmac.new(CHANNEL_SECRETS[bot_id - 1].encode(), body.encode(), hashlib.sha256).digest()
+    ).decode()
+    return WebhookRequest(body, signature, f"/lineWebhook/{bot_id}")
+
+
+def base_event(event_type, line_id, event_id, reply_token):
+    return {
+        "type": event_type,
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "webhookEventId": event_id,
+        "deliveryContext": {"isRedelivery": False},
+        "source": {"type": "user", "userId": line_id},
+        "replyToken": reply_token,
+    }
+
+
+def message_event(line_id, text, event_id, reply_token):
+    """文字訊息事件"""
+    event = base_event("message", line_id, event_id, reply_token)
+    event["message"] = {"type": "text", "id": event_id, "text": text}
+    return event
+
+
+def postback_event(line_id, data, event_id, reply_token):
+    """Postback 事件"""
+    event = base_event("postback", line_id, event_id, reply_token)
+    event["postback"] = {"data": data}
+    return event
+
+
+def follow_event(line_id, event_id, reply_token):
+    """加入好友事件"""
+    return base_event("follow", line_id, event_id, reply_token)
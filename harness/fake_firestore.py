@@ -0,0 +1,524 @@
+"""
+記憶體中的 Firestore 替代品（本地量測與模擬用，不連線 Firebase）
+
+支援 line_bot_GCF 與 week_clock_alarm 用到的操作：
+  - collection / document / add / get / set(merge) / update / delete / create
+  - where（含 __name__ 範圍）/ order_by / limit / select / stream
+  - db.get_all(refs, field_paths, transaction) / batch / transaction（可搭配 @firestore.transactional）
+  - Increment / Minimum / Maximum / ArrayUnion / ArrayRemove / DELETE_FIELD / SERVER_TIMESTAMP
+
+每次 RPC 可加上固定延遲（latency）與隨機延遲（jitter），並依 Firestore 計費方式累計讀寫次數：
+  - 文件讀取 1 次；查詢依回傳文件數計算（沒有結果也算 1 次）；get_all 依文件數計算
+  - 每個寫入的文件 1 次（batch / transaction 內的每個操作各 1 次）
+
+用法：
+    fake = FakeFirestore(latency=0.02)
+    main.db.set_client(fake)
+"""
+
+import copy
+import itertools
+import random
+import string
+import threading
+import time
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import AlreadyExists, Aborted, NotFound
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+
+
+def split_field_path(field_path):
+    """把欄位路徑（如 "usage_count.`2026.01`.調班"）拆成各層名稱"""
+    if isinstance(field_path, FieldPath):
+        return list(field_path.parts)
+    return list(FieldPath.from_string(field_path).parts)
+
+
+def get_field(data, parts):
+    """
+    取得巢狀欄位的值
+
+    Returns:
+        tuple: (是否存在, 值)
+    """
+    value = data
+    for part in parts:
+        if not isinstance(value, dict) or part not in value:
+            return False, None
+        value = value[part]
+    return True, value
+
+
+def apply_value(data, parts, value):
+    """把單一欄位的新值（或 transform）寫入 data"""
+    target = data
+    for part in parts[:-1]:
+        if not isinstance(target.get(part), dict):
+            target[part] = {}
+        target = target[part]
+    last = parts[-1]
+
+    if value is transforms.DELETE_FIELD:
+        target.pop(last, None)
+    elif value is transforms.SERVER_TIMESTAMP:
+        target[last] = datetime.now(timezone.utc)
+    elif isinstance(value, transforms.Increment):
+        current = target.get(last)
+        target[last] = (current if isinstance(current, (int, float)) else 0) + value.value
+    elif isinstance(value, transforms.Minimum):
+        current = target.get(last)
+        target[last] = min(current, value.value) if isinstance(current, (int, float)) else value.value
+    elif isinstance(value, transforms.Maximum):
+        current = target.get(last)
+        target[last] = max(current, value.value) if isinstance(current, (int, float)) else value.value
+    elif isinstance(value, transforms.ArrayUnion):
+        current = list(target.get(last) or [])
+        target[last] = current + [item for item in value.values if item not in current]
+    elif isinstance(value, transforms.ArrayRemove):
+        target[last] = [item for item in (target.get(last) or []) if item not in value.values]
+    else:
+        target[last] = copy.deepcopy(value)
+
+
+def merge_into(data, updates):
+    """set(merge=True)：巢狀 map 逐層合併，其餘欄位覆蓋"""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            merge_into(data[key], value)
+        elif isinstance(value, dict):
+            data[key] = {}
+            merge_into(data[key], value)
+        else:
+            apply_value(data, [key], value)
+
+
+def project(data, field_paths):
+    """只保留指定欄位（field mask）"""
+    if field_paths is None:
+        return data
+    projected = {}
+    for field_path in field_paths:
+        parts = split_field_path(field_path)
+        found, value = get_field(data, parts)
+        if found:
+            apply_value(projected, parts, value)
+    return projected
+
+
+class FakeDocumentSnapshot:
+    """與 DocumentSnapshot 相同的介面（reference / id / exists / to_dict / get）"""
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = copy.deepcopy(data)
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field_path):
+        found, value = get_field(self._data or {}, split_field_path(field_path))
+        if not found:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class FakeDocumentReference:
+
+    def __init__(self, db, collection_path, document_id):
+        self._db = db
+        self._collection_path = collection_path
+        self.id = document_id
+        self.path = f"{collection_path}/{document_id}"
+
+    @property
+    def parent(self):
+        return FakeCollectionReference(self._db, self._collection_path)
+
+    def collection(self, collection_id):
+        return FakeCollectionReference(self._db, f"{self.path}/{collection_id}")
+
+    def get(self, field_paths=None, transaction=None):
+        self._db._rpc()
+        data = self._db._read(self, transaction)
+        return FakeDocumentSnapshot(self, project(data, field_paths) if data is not None else None)
+
+    def set(self, document_data, merge=False):
+        self._db._rpc()
+        self._db._commit([('set', self, document_data, merge)])
+
+    def update(self, field_updates):
+        self._db._rpc()
+        self._db._commit([('update', self, field_updates, None)])
+
+    def create(self, document_data):
+        self._db._rpc()
+        self._db._commit([('create', self, document_data, None)])
+
+    def delete(self):
+        self._db._rpc()
+        self._db._commit([('delete', self, None, None)])
+
+    def __eq__(self, other):
+        return isinstance(other, FakeDocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return f"<FakeDocumentReference {self.path}>"
+
+
+class FakeQuery:
+
+    def __init__(self, db, collection_path, filters=(), orders=(), limit_count=None, field_paths=None):
+        self._db = db
+        self._collection_path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._field_paths = field_paths
+
+    def _copy(self, **changes):
+        values = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit_count': self._limit,
+            'field_paths': self._field_paths,
+        }
+        values.update(changes)
+        return FakeQuery(self._db, self._collection_path, **values)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def select(self, field_paths):
+        return self._copy(field_paths=list(field_paths))
+
+    @staticmethod
+    def _value_of(document_id, data, field_path):
+        if field_path == '__name__':
+            return True, document_id
+        return get_field(data, split_field_path(field_path))
+
+    @staticmethod
+    def _matches(found, value, op_string, expected):
+        if isinstance(expected, FakeDocumentReference):
+            expected = expected.id
+        if op_string == 'array_contains':
+            return found and isinstance(value, list) and expected in value
+        if op_string == 'array_contains_any':
+            return found and isinstance(value, list) and any(item in value for item in expected)
+        if op_string == 'in':
+            return found and value in [item.id if isinstance(item, FakeDocumentReference) else item
+                                       for item in expected]
+        if op_string == 'not-in':
+            return found and value not in expected
+        if not found:
+            return False
+        try:
+            return {
+                '==': lambda: value == expected,
+                '!=': lambda: value != expected,
+                '<': lambda: value < expected,
+                '<=': lambda: value <= expected,
+                '>': lambda: value > expected,
+                '>=': lambda: value >= expected,
+            }[op_string]()
+        except TypeError:
+            return False  # 型別不同的值不會互相比較（與 Firestore 相同）
+
+    def _run(self, transaction=None):
+        documents = self._db._scan(self._collection_path, transaction)
+        results = [
+            (document_id, data) for document_id, data in documents
+            if all(self._matches(*self._value_of(document_id, data, field_path), op_string, expected)
+                   for field_path, op_string, expected in self._filters)
+        ]
+        for field_path, direction in reversed(self._orders or (('__name__', ASCENDING),)):
+            results = [item for item in results if self._value_of(item[0], item[1], field_path)[0]]
+            results.sort(key=lambda item: self._value_of(item[0], item[1], field_path)[1],
+                         reverse=direction == DESCENDING)
+        if self._limit is not None:
+            results = results[:self._limit]
+        self._db._count_reads(max(len(results), 1))
+        return [
+            FakeDocumentSnapshot(FakeDocumentReference(self._db, self._collection_path, document_id),
+                                 project(data, self._field_paths))
+            for document_id, data in results
+        ]
+
+    def get(self, transaction=None):
+        self._db._rpc()
+        return self._run(transaction)
+
+    def stream(self, transaction=None):
+        self._db._rpc()
+        yield from self._run(transaction)
+
+
+class FakeCollectionReference(FakeQuery):
+
+    def __init__(self, db, collection_path):
+        super().__init__(db, collection_path)
+        self.id = collection_path.rsplit('/', 1)[-1]
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = ''.join(random.choices(string.ascii_letters + string.digits, k=20))
+        return FakeDocumentReference(self._db, self._collection_path, document_id)
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        reference.create(document_data)
+        return datetime.now(timezone.utc), reference
+
+
+class FakeWriteBatch:
+    """累積寫入操作，commit 時一次套用（全部成功或全部失敗）"""
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append(('update', reference, field_updates, None))
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference, document_data, None))
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference, None, None))
+
+    def commit(self):
+        self._db._rpc()
+        writes, self._writes = self._writes, []
+        self._db._commit(writes)
+        return [None] * len(writes)
+
+
+class FakeTransaction(FakeWriteBatch):
+    """
+    樂觀鎖 transaction：記錄讀取時的文件版本，commit 時若有文件被其他寫入修改則拋出 Aborted
+    實作 @firestore.transactional 使用的介面（_begin / _commit / _rollback ...），失敗時由裝飾器重試
+    """
+
+    _id_counter = itertools.count(1)
+
+    def __init__(self, db, max_attempts=5, read_only=False):
+        super().__init__(db)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._read_versions = {}
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    @property
+    def id(self):
+        return self._id
+
+    def _clean_up(self):
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = str(next(self._id_counter)).encode()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        self._db._rpc()
+        try:
+            self._db._commit(self._writes, self._read_versions)
+        finally:
+            self._clean_up()
+        return []
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, FakeDocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return iter(ref_or_query.get(transaction=self))
+
+    def get_all(self, references):
+        return self._db.get_all(references, transaction=self)
+
+
+class FakeFirestore:
+    """
+    記憶體中的 Firestore client
+
+    Attributes:
+        latency: 每次 RPC 的固定延遲（秒）
+        jitter: 每次 RPC 額外的隨機延遲上限（秒）
+        reads / writes / rpcs: 累計的計費讀取、寫入文件數與 RPC 次數
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._documents = {}  # { collection 路徑: { document ID: dict } }
+        self._versions = {}  # { 文件路徑: 版本 }，transaction 用
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+
+    # ---------- client 介面 ----------
+
+    def collection(self, collection_path):
+        return FakeCollectionReference(self, collection_path)
+
+    def document(self, document_path):
+        collection_path, document_id = document_path.rsplit('/', 1)
+        return FakeDocumentReference(self, collection_path, document_id)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return FakeTransaction(self, max_attempts, read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        references = list(references)
+        self._rpc()
+        snapshots = []
+        for reference in references:
+            data = self._read(reference, transaction)
+            snapshots.append(FakeDocumentSnapshot(reference, project(data, field_paths) if data is not None else None))
+        return iter(snapshots)
+
+    # ---------- 量測 ----------
+
+    def reset_stats(self):
+        """歸零讀寫次數"""
+        with self._lock:
+            self.reads = self.writes = self.rpcs = 0
+
+    def stats(self):
+        """
+        Returns:
+            dict: { reads, writes, rpcs }
+        """
+        with self._lock:
+            return {"reads": self.reads, "writes": self.writes, "rpcs": self.rpcs}
+
+    # ---------- 資料 ----------
+
+    def load(self, documents):
+        """
+        直接寫入資料（不計讀寫次數）
+
+        Args:
+            documents: { collection 路徑: { document ID: dict } }
+        """
+        with self._lock:
+            for collection_path, collection_documents in documents.items():
+                self._documents.setdefault(collection_path, {}).update(copy.deepcopy(collection_documents))
+
+    def dump(self):
+        """目前所有資料的副本 { collection 路徑: { document ID: dict } }"""
+        with self._lock:
+            return copy.deepcopy(self._documents)
+
+    def restore(self, documents):
+        """以 dump() 的結果取代目前所有資料"""
+        with self._lock:
+            self._documents = copy.deepcopy(documents)
+            self._versions = {}
+
+    # ---------- 內部 ----------
+
+    def _rpc(self):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        with self._lock:
+            self.rpcs += 1
+        if delay > 0:
+            time.sleep(delay)
+
+    def _count_reads(self, count):
+        with self._lock:
+            self.reads += count
+
+    def _read(self, reference, transaction=None):
+        with self._lock:
+            self.reads += 1
+            if transaction is not None:
+                transaction._read_versions.setdefault(reference.path, self._versions.get(reference.path, 0))
+            data = self._documents.get(reference._collection_path, {}).get(reference.id)
+            return copy.deepcopy(data)
+
+    def _scan(self, collection_path, transaction=None):
+        with self._lock:
+            documents = sorted(copy.deepcopy(self._documents.get(collection_path, {})).items())
+            if transaction is not None:
+                for document_id, _ in documents:
+                    path = f"{collection_path}/{document_id}"
+                    transaction._read_versions.setdefault(path, self._versions.get(path, 0))
+            return documents
+
+    def _commit(self, writes, read_versions=None):
+        """一次套用多個寫入（全部成功或全部失敗）"""
+        with self._lock:
+            for path, version in (read_versions or {}).items():
+                if self._versions.get(path, 0) != version:
+                    raise Aborted(f"{path} 在 transaction 期間被修改")
+
+            staged = {}  # { (collection 路徑, document ID): 寫入後的資料 or None }
+            for operation, reference, data, merge in writes:
+                key = (reference._collection_path, reference.id)
+                if key in staged:
+                    current = staged[key]
+                else:
+                    current = copy.deepcopy(self._documents.get(key[0], {}).get(key[1]))
+
+                if operation == 'delete':
+                    current = None
+                elif operation == 'create':
+                    if current is not None:
+                        raise AlreadyExists(f"Document already exists: {reference.path}")
+                    current = {}
+                    merge_into(current, data)
+                elif operation == 'update':
+                    if current is None:
+                        raise NotFound(f"No document to update: {reference.path}")
+                    for field_path, value in data.items():
+                        apply_value(current, split_field_path(field_path), value)
+                elif merge and current is not None:
+                    merge_into(current, data)
+                else:
+                    current = {}
+                    merge_into(current, data)
+                staged[key] = current
+
+            for (collection_path, document_id), data in staged.items():
+                collection = self._documents.setdefault(collection_path, {})
+                if data is None:
+                    collection.pop(document_id, None)
+                else:
+                    collection[document_id] = data
+                path = f"{collection_path}/{document_id}"
+                self._versions[path] = self._versions.get(path, 0) + 1
+            self.writes += len(writes)
@@ -0,0 +1,81 @@
+"""
+模擬環境的基本測試資料（兩場崇拜、四位使用者、之後 8 週的班表）
+
+    users = seed_basic(fake)
+    users['requester']  → { name, lineId, line_bot_id, login_token }
+"""
+
+from datetime import datetime, timedelta
+
+SERVES = [
+    {"id": "youth-serve", "name": "青年崇拜", "emoji": "🎸"},
+    {"id": "kids-serve", "name": "兒童崇拜", "emoji": "🧒"},
+]
+SERVICE_ITEMS = {
+    "youth-serve": ["主領", "司琴"],
+    "kids-serve": ["司會"],
+}
+WEEKS = 8
+
+# 角色: (名稱, LINE ID, line_bot_id, serve_types)
+USERS = {
+    "requester": ("小明", "U" + "a" * 32, 1, {"youth-serve": ["主領"], "kids-serve": ["司會"]}),
+    "respondent": ("小華", "U" + "b" * 32, 2, {"youth-serve": ["主領"]}),
+    "partner": ("小美", "U" + "c" * 32, 1, {"youth-serve": ["主領", "司琴"]}),
+    "newcomer": ("小新", "U" + "d" * 32, 0, {"kids-serve": ["司會"]}),
+}
+
+
+def upcoming_sundays(count, today=None):
+    """今天（含）之後的 count 個週日 ["YYYY.MM.DD", ...]"""
+    today = today or datetime.now()
+    first = today + timedelta(days=(6 - today.weekday()) % 7)
+    return [(first + timedelta(days=7 * week)).strftime("%Y.%m.%d") for week in range(count)]
+
+
+def seed_basic(db):
+    """
+    寫入基本資料並建立索引（需先以 harness.env.load_line_bot 載入 main）
+
+    Args:
+        db: FakeFirestore
+
+    Returns:
+        dict: { 角色: { name, lineId, line_bot_id, login_token } }
+    """
+    import build_indexes
+
+    requester, respondent, partner, _ = (USERS[role][0] for role in USERS)
+    documents = {
+        "_config": {"serve-list": {"serves": SERVES}},
+        "users": {},
+    }
+    users = {}
+    for index, (role, (name, line_id, bot_id, serve_types)) in enumerate(USERS.items()):
+        login_token = f"HARNESS{index:09d}"
+        users[role] = {"name": name, "lineId": line_id, "line_bot_id": bot_id, "login_token": login_token}
+        documents["users"][name] = {
+            "lineId": line_id if bot_id else "",
+            "line_bot_id": bot_id,
+            "login_token": login_token,
+            "alarm_type": [True, False, False, False, False, False],
+            "serve_types": serve_types,
+        }
+
+    for collection_id, items in SERVICE_ITEMS.items():
+        documents[collection_id] = {"_metadata": {"serviceItems": items, "updatedAt": 1}}
+
+    # 青年崇拜主領：小明與小華輪流，小明不排的週由小華與小美兩人一起（產生 B# 選項）
+    for week, date in enumerate(upcoming_sundays(WEEKS)):
+        documents["youth-serve"][date] = {
+            "主領": [requester] if week % 2 == 0 else [respondent, partner],
+            "司琴": [partner],
+        }
+        documents["kids-serve"][date] = {"司會": [requester]}
+
+    # 申請人開啟通知收件匣，讓調班結果走收件匣流程
+    documents["users"][requester]["inbox_notices"] = True
+
+    db.load(documents)
+    build_indexes.build_indexes(db)
+    return users
@@ -0,0 +1,123 @@
+"""
+記錄所有呼叫的 LINE Messaging API 替代品（不會真的發送訊息）
+
+    line = LineRecorder(latency=0.05)
+    main.set_line_bot_api(1, line.api(1))
+    ...
+    line.replies("reply-token")   # 某個 reply token 收到的訊息（JSON dict 列表）
+    line.pushes("Uxxxx")           # 推播給某位使用者的訊息
+"""
+
+import threading
+import time
+
+
+def to_json(messages):
+    """訊息物件或列表轉為 JSON dict 列表"""
+    if not isinstance(messages, (list, tuple)):
+        messages = [messages]
+    return [message.as_json_dict() if hasattr(message, 'as_json_dict') else message for message in messages]
+
+
+def find_postback_data(messages, prefix):
+    """
+    在訊息（JSON dict）中找出所有以 prefix 開頭的 postback data，依出現順序
+
+    Args:
+        messages: JSON dict 列表
+        prefix: 如 "A&"
+
+    Returns:
+        list: postback data 字串
+    """
+    found = []
+
+    def walk(value):
+        if isinstance(value, dict):
+            data = value.get('data')
+            if isinstance(data, str) and data.startswith(prefix):
+                found.append(data)
+            for child in value.values():
+                walk(child)
+        elif isinstance(value, list):
+            for child in value:
+                walk(child)
+
+    walk(messages)
+    return found
+
+
+class LineCall:
+    """一次 API 呼叫：kind 為 'reply' 或 'push'，target 為 reply token 或收件者"""
+
+    def __init__(self, kind, bot_id, target, messages):
+        self.kind = kind
+        self.bot_id = bot_id
+        self.target = target
+        self.messages = messages
+        self.at = time.perf_counter()
+
+
+class RecordingLineBotApi:
+    """與 LineBotApi 相同的 reply_message / push_message 介面，只記錄呼叫"""
+
+    def __init__(self, recorder, bot_id):
+        self.recorder = recorder
+        self.bot_id = bot_id
+        self.headers = {}
+
+    def reply_message(self, reply_token, messages, notification_disabled=False, timeout=None):
+        self.recorder.record('reply', self.bot_id, reply_token, messages)
+
+    def push_message(self, to, messages, notification_disabled=False, custom_aggregation_units=None,
+                     retry_key=None, timeout=None):
+        self.recorder.record('push', self.bot_id, to, messages)
+
+
+class LineRecorder:
+    """
+    所有 bot 共用的呼叫記錄
+
+    Attributes:
+        latency: 每次 API 呼叫的延遲（秒）
+        calls: [LineCall, ...]
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def api(self, bot_id):
+        return RecordingLineBotApi(self, bot_id)
+
+    def install(self, main, bot_count):
+        """把 line_bot_GCF 的每台 bot 換成記錄用的 API"""
+        for bot_id in range(1, bot_count + 1):
+            main.set_line_bot_api(bot_id, self.api(bot_id))
+
+    def record(self, kind, bot_id, target, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls.append(LineCall(kind, bot_id, target, to_json(messages)))
+
+    def clear(self):
+        with self.lock:
+            self.calls = []
+
+    def count(self, kind):
+        with self.lock:
+            return sum(1 for call in self.calls if call.kind == kind)
+
+    def replies(self, reply_token):
+        """某個 reply token 收到的訊息"""
+        with self.lock:
+            return [message for call in self.calls if call.kind == 'reply' and call.target == reply_token
+                    for message in call.messages]
+
+    def pushes(self, to):
+        """推播給某位使用者的訊息（依時間順序）"""
+        with self.lock:
+            return [message for call in self.calls if call.kind == 'push' and call.target == to
+                    for message in call.messages]
@@ -0,0 +1,296 @@
+"""
+包住任何 Firestore client 的計數器（FakeFirestore 或模擬器的 firestore.client() 都可以）
+
+在呼叫端計算，不依賴 client 自己的統計：
+  - document_reads: 文件讀取（DocumentReference.get、get_all 的每個文件、transaction 中的讀取）
+  - query_results: 查詢回傳的文件數
+  - query_reads: 查詢的計費讀取（沒有結果也算 1 次）
+  - writes: 寫入的文件數（set / update / create / delete / add，batch 與 transaction 成功 commit 後才計入）
+  - reads = document_reads + query_reads
+
+用法：
+    metered = MeteredFirestore(FakeFirestore())
+    main.db.set_client(metered)
+    with metered.measure() as usage:
+        main.lineWebhook(request)
+    usage.reads, usage.writes
+"""
+
+import threading
+from contextlib import contextmanager
+
+COUNTERS = ('document_reads', 'query_results', 'query_reads', 'writes')
+
+
+def unwrap(value):
+    """取出被包住的原始物件（引用、transaction），其他值原樣返回"""
+    return value._target if isinstance(value, MeteredObject) else value
+
+
+class Usage:
+    """一段期間內的讀寫次數"""
+
+    def __init__(self, **counts):
+        for name in COUNTERS:
+            setattr(self, name, counts.get(name, 0))
+
+    @property
+    def reads(self):
+        return self.document_reads + self.query_reads
+
+    def as_dict(self):
+        counts = {name: getattr(self, name) for name in COUNTERS}
+        counts['reads'] = self.reads
+        return counts
+
+    def __sub__(self, other):
+        return Usage(**{name: getattr(self, name) - getattr(other, name) for name in COUNTERS})
+
+    def __repr__(self):
+        return f"<Usage reads={self.reads} writes={self.writes} query_results={self.query_results}>"
+
+
+class MeteredObject:
+    """轉發所有屬性到原始物件的代理"""
+
+    def __init__(self, meter, target):
+        object.__setattr__(self, '_meter', meter)
+        object.__setattr__(self, '_target', target)
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __eq__(self, other):
+        return self._target == unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def __repr__(self):
+        return f"<Metered {self._target!r}>"
+
+
+class MeteredSnapshot(MeteredObject):
+    """reference 也包住，透過 snapshot.reference 的寫入同樣會計入"""
+
+    @property
+    def reference(self):
+        return MeteredDocumentReference(self._meter, self._target.reference)
+
+
+class MeteredQuery(MeteredObject):
+
+    def _wrap(self, query):
+        return MeteredQuery(self._meter, query)
+
+    def where(self, *args, **kwargs):
+        args = [unwrap(arg) for arg in args]
+        if 'value' in kwargs:
+            kwargs['value'] = unwrap(kwargs['value'])
+        return self._wrap(self._target.where(*args, **kwargs))
+
+    def order_by(self, *args, **kwargs):
+        return self._wrap(self._target.order_by(*args, **kwargs))
+
+    def limit(self, count):
+        return self._wrap(self._target.limit(count))
+
+    def select(self, field_paths):
+        return self._wrap(self._target.select(field_paths))
+
+    def get(self, transaction=None, **kwargs):
+        results = list(self._target.get(transaction=unwrap(transaction), **kwargs))
+        self._meter.count_query(len(results))
+        return [MeteredSnapshot(self._meter, snapshot) for snapshot in results]
+
+    def stream(self, transaction=None, **kwargs):
+        return iter(self.get(transaction=transaction, **kwargs))
+
+
+class MeteredCollectionReference(MeteredQuery):
+
+    def document(self, document_id=None):
+        return MeteredDocumentReference(self._meter, self._target.document(document_id))
+
+    def add(self, document_data, document_id=None):
+        update_time, reference = self._target.add(document_data, document_id=document_id)
+        self._meter.count('writes')
+        return update_time, MeteredDocumentReference(self._meter, reference)
+
+
+class MeteredDocumentReference(MeteredObject):
+
+    @property
+    def parent(self):
+        return MeteredCollectionReference(self._meter, self._target.parent)
+
+    def collection(self, collection_id):
+        return MeteredCollectionReference(self._meter, self._target.collection(collection_id))
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        snapshot = self._target.get(field_paths=field_paths, transaction=unwrap(transaction), **kwargs)
+        self._meter.count('document_reads')
+        return MeteredSnapshot(self._meter, snapshot)
+
+    def set(self, document_data, merge=False):
+        result = self._target.set(document_data, merge=merge)
+        self._meter.count('writes')
+        return result
+
+    def update(self, field_updates, **kwargs):
+        result = self._target.update(field_updates, **kwargs)
+        self._meter.count('writes')
+        return result
+
+    def create(self, document_data):
+        result = self._target.create(document_data)
+        self._meter.count('writes')
+        return result
+
+    def delete(self, **kwargs):
+        result = self._target.delete(**kwargs)
+        self._meter.count('writes')
+        return result
+
+
+class MeteredWriteBatch(MeteredObject):
+    """
+    WriteBatch / Transaction 共用：寫入先記在 pending，commit 成功後才計入
+    transaction 重試時 @firestore.transactional 會呼叫 _clean_up / _rollback，pending 一併清除
+    """
+
+    def __init__(self, meter, target):
+        super().__init__(meter, target)
+        object.__setattr__(self, '_pending', 0)
+
+    def _queue(self, method, reference, *args, **kwargs):
+        result = getattr(self._target, method)(unwrap(reference), *args, **kwargs)
+        object.__setattr__(self, '_pending', self._pending + 1)
+        return result
+
+    def set(self, reference, document_data, merge=False):
+        return self._queue('set', reference, document_data, merge=merge)
+
+    def update(self, reference, field_updates, **kwargs):
+        return self._queue('update', reference, field_updates, **kwargs)
+
+    def create(self, reference, document_data):
+        return self._queue('create', reference, document_data)
+
+    def delete(self, reference, **kwargs):
+        return self._queue('delete', reference, **kwargs)
+
+    def _flush(self, commit):
+        pending = self._pending
+        object.__setattr__(self, '_pending', 0)
+        result = commit()
+        self._meter.count('writes', pending)
+        return result
+
+    def commit(self, **kwargs):
+        return self._flush(lambda: self._target.commit(**kwargs))
+
+    # ---------- transaction ----------
+
+    def _commit(self):
+        return self._flush(self._target._commit)
+
+    def _clean_up(self):
+        object.__setattr__(self, '_pending', 0)
+        return self._target._clean_up()
+
+    def _rollback(self):
+        object.__setattr__(self, '_pending', 0)
+        return self._target._rollback()
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, MeteredQuery):
+            return iter(ref_or_query.get(transaction=self))
+        snapshots = list(self._target.get(unwrap(ref_or_query), **kwargs))
+        self._meter.count('document_reads', len(snapshots))
+        return iter(MeteredSnapshot(self._meter, snapshot) for snapshot in snapshots)
+
+    def get_all(self, references, **kwargs):
+        return self._meter.get_all(references, transaction=self, **kwargs)
+
+
+class MeteredFirestore:
+    """
+    Firestore client 的計數代理
+
+    Attributes:
+        client: 被包住的原始 client
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(COUNTERS, 0)
+
+    # ---------- client 介面 ----------
+
+    def collection(self, collection_path):
+        return MeteredCollectionReference(self, self.client.collection(collection_path))
+
+    def document(self, document_path):
+        return MeteredDocumentReference(self, self.client.document(document_path))
+
+    def batch(self):
+        return MeteredWriteBatch(self, self.client.batch())
+
+    def transaction(self, **kwargs):
+        return MeteredWriteBatch(self, self.client.transaction(**kwargs))
+
+    def get_all(self, references, field_paths=None, transaction=None, **kwargs):
+        references = [unwrap(reference) for reference in references]
+        snapshots = list(self.client.get_all(references, field_paths=field_paths,
+                                             transaction=unwrap(transaction), **kwargs))
+        self.count('document_reads', len(references))
+        return iter(MeteredSnapshot(self, snapshot) for snapshot in snapshots)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    # ---------- 計數 ----------
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self._counts[counter] += amount
+
+    def count_query(self, result_count):
+        with self._lock:
+            self._counts['query_results'] += result_count
+            self._counts['query_reads'] += max(result_count, 1)
+
+    def usage(self):
+        """目前為止的累計次數"""
+        with self._lock:
+            return Usage(**self._counts)
+
+    def stats(self):
+        """與 FakeFirestore.stats() 相同的介面，另外包含各項細分"""
+        return self.usage().as_dict()
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts = dict.fromkeys(COUNTERS, 0)
+
+    @contextmanager
+    def measure(self):
+        """
+        量測 with 區塊內的讀寫次數（區塊結束後 usage 的數值才會更新）
+
+        Yields:
+            Usage
+        """
+        before = self.usage()
+        usage = Usage()
+        try:
+            yield usage
+        finally:
+            delta = self.usage() - before
+            for name in COUNTERS:
+                setattr(usage, name, getattr(delta, name))
@@ -0,0 +1,309 @@
+"""
+大規模測試資料產生器（數千位使用者、數十場崇拜、數年的班表與調班記錄）
+python harness/synthetic.py [人數] [崇拜數] [年數] [seed]
+
+設定 FIRESTORE_EMULATOR_HOST 時寫入 Firestore 模擬器（project 取 GCLOUD_PROJECT，預設 demo-harness），
+否則寫入 FakeFirestore 並只輸出統計
+
+產生的資料：
+  - users：serve_types / alarm_type / alarm_days / lineId / line_bot_id / login_token / usage_count
+  - _config/serve-list、每場崇拜的 _metadata 與每週日的班表
+  - _shift：過去的調班/代班記錄（成功 / 拒絕），以及之後日期尚未回應的請求
+  - 寫入後以 build_indexes 建立 _idx_line / _idx_token / _roster
+
+相同的 seed 與參數會產生完全相同的資料：
+
+    documents = generate_congregation(seed=1, users=5000, serves=30, years=3)
+    write_documents(db, documents)
+"""
+
+import os
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+BATCH_LIMIT = 500  # Firestore 單一 batch 最多 500 筆寫入
+
+SURNAMES = "陳林黃張李王吳劉蔡楊許鄭謝郭洪邱曾廖賴周徐蘇葉莊呂江何蕭羅高"
+GIVEN_NAME_CHARS = "家睿芯芳捷希佳柔詠晴嘉瑩承亞晞湲庭奇暐卓宇安欣穎婕明華美新志偉雅婷俊傑怡君宗翰冠廷思妤子涵品妍宥辰柏彥恩慈"
+
+SERVE_NAMES = [
+    ("youth-serve", "青年崇拜", "🎸"),
+    ("kids-serve", "兒童崇拜", "🧒"),
+    ("adult-serve", "成人崇拜", "⛪"),
+    ("english-serve", "英語崇拜", "🌏"),
+    ("saturday-serve", "週六崇拜", "🌙"),
+    ("prayer-serve", "禱告會", "🙏"),
+]
+EXTRA_EMOJIS = ["🎵", "🕊️", "✝️", "📖", "🔥", "🌱"]
+SERVICE_ITEM_POOL = ["主領", "司琴", "音控", "字幕", "招待", "司會", "鼓手", "吉他", "貝斯",
+                     "攝影", "讀經", "投影", "奉獻", "直播", "茶點", "兒童看顧"]
+TWO_PERSON_ITEMS = {"音控", "招待", "茶點", "兒童看顧"}  # 通常兩人一起
+
+USAGE_TYPES = {  # 使用量類型: 每月平均次數
+    "當週班表": 3.0, "全部班表": 1.0, "目錄": 1.0, "設定提醒": 0.1, "換班": 0.3, "代班": 0.2,
+    "調班/代班請求": 0.3, "調班/代班成功通知": 0.2, "調班/代班失敗通知": 0.05,
+}
+
+
+def sunday_on_or_after(day):
+    return day + timedelta(days=(6 - day.weekday()) % 7)
+
+
+def make_names(rng, count):
+    """產生 count 個不重複的中文姓名"""
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_NAME_CHARS) for _ in range(rng.choice((1, 2, 2, 2))))
+        base, number = name, 1
+        while name in seen:
+            number += 1
+            name = f"{base}{number}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def make_serves(rng, count, items_per_serve):
+    """
+    Returns:
+        list: [{ id, name, emoji, items: [服事項目, ...] }, ...]
+    """
+    serves = []
+    for index in range(count):
+        if index < len(SERVE_NAMES):
+            serve_id, name, emoji = SERVE_NAMES[index]
+        else:
+            serve_id, name, emoji = f"serve-{index + 1:02d}", f"第{index + 1}堂崇拜", rng.choice(EXTRA_EMOJIS)
+        items = ["主領"] + rng.sample(SERVICE_ITEM_POOL[1:], rng.randint(*items_per_serve) - 1)
+        serves.append({"id": serve_id, "name": name, "emoji": emoji, "items": items})
+    return serves
+
+
+def make_usage_count(rng, months):
+    """依 USAGE_TYPES 的平均次數產生每月使用量 { "YYYY.MM": { 類型: 次數 } }"""
+    usage = {}
+    activity = rng.uniform(0.2, 2.0)  # 每個人使用頻率不同
+    for month in months:
+        counts = {}
+        for usage_type, mean in USAGE_TYPES.items():
+            count = int(rng.expovariate(1 / (mean * activity))) if mean * activity > 0.05 else 0
+            if count:
+                counts[usage_type] = count
+        if counts:
+            usage[month] = counts
+    return usage
+
+
+def random_id(rng, length=20):
+    """與 Firestore 自動產生的 document ID 格式相同"""
+    return "".join(rng.choice(string.ascii_letters + string.digits) for _ in range(length))
+
+
+def generate_congregation(seed=0, users=2000, serves=24, years=3, weeks_ahead=26, bots=2,
+                          linked_ratio=0.85, serves_per_user=(1, 3), items_per_serve=(4, 8),
+                          items_per_user=(1, 3), shifts_per_week=0.3, usage_months=12, today=None):
+    """
+    產生一個教會的完整資料（只產生，不寫入）
+
+    Args:
+        seed: 亂數種子，相同的 seed 與參數產生相同的資料
+        users: 使用者人數
+        serves: 崇拜（班表 collection）數
+        years: 過去幾年的班表與調班記錄
+        weeks_ahead: 之後幾週的班表
+        bots: LINE Bot 台數（line_bot_id 1..bots，越前面的 Bot 人越多）
+        linked_ratio: 已綁定 LINE 的比例（其餘 lineId 為空、line_bot_id 為 0）
+        serves_per_user: 每人參與的崇拜數範圍
+        items_per_serve: 每場崇拜的服事項目數範圍
+        items_per_user: 每人在每場崇拜負責的項目數範圍
+        shifts_per_week: 每場崇拜每週平均的調班/代班記錄數
+        usage_months: usage_count 包含最近幾個月
+        today: 基準日（預設今天），固定 today 才能在不同天產生相同的日期
+
+    Returns:
+        dict: { collection 路徑: { document ID: dict } }
+    """
+    rng = random.Random(seed)
+    today = today or datetime.now()
+    serve_list = make_serves(rng, serves, items_per_serve)
+    names = make_names(rng, users)
+
+    # 月份（usage_count 用）
+    months = []
+    month = today.replace(day=1)
+    for _ in range(usage_months):
+        months.append(month.strftime("%Y.%m"))
+        month = (month - timedelta(days=1)).replace(day=1)
+
+    # 使用者與各崇拜、各服事項目的名單
+    documents = {"users": {}, "_config": {}, "_shift": {}}
+    pools = {serve["id"]: {item: [] for item in serve["items"]} for serve in serve_list}
+    bot_weights = [bots - index for index in range(bots)]
+    for name in names:
+        serve_types = {}
+        for serve in rng.sample(serve_list, min(rng.randint(*serves_per_user), len(serve_list))):
+            items = rng.sample(serve["items"], min(rng.randint(*items_per_user), len(serve["items"])))
+            serve_types[serve["id"]] = items
+            for item in items:
+                pools[serve["id"]][item].append(name)
+
+        linked = rng.random() < linked_ratio
+        alarm_type = [False] * 6
+        for day in rng.sample(range(6), rng.choice((1, 1, 1, 2, 2, 3))):
+            alarm_type[day] = True
+        user = {
+            "lineId": "U" + "".join(rng.choice("0123456789abcdef") for _ in range(32)) if linked else "",
+            "line_bot_id": rng.choices(range(1, bots + 1), bot_weights)[0] if linked else 0,
+            "login_token": random_id(rng, 16),
+            "alarm_type": alarm_type,
+            "alarm_days": [day for day, enabled in enumerate(alarm_type) if enabled],
+            "serve_types": serve_types,
+        }
+        if linked:
+            user["usage_count"] = make_usage_count(rng, months)
+        documents["users"][name] = user
+
+    documents["_config"]["serve-list"] = {
+        "serves": [{"id": serve["id"], "name": serve["name"], "emoji": serve["emoji"]} for serve in serve_list]
+    }
+
+    # 每週日的班表
+    first_sunday = sunday_on_or_after(today - timedelta(days=365 * years))
+    last_sunday = sunday_on_or_after(today) + timedelta(weeks=weeks_ahead)
+    week_count = (last_sunday - first_sunday).days // 7 + 1
+    dates = [(first_sunday + timedelta(weeks=week)).strftime("%Y.%m.%d") for week in range(week_count)]
+    today_key = today.strftime("%Y.%m.%d")
+
+    for serve in serve_list:
+        collection = documents[serve["id"]] = {
+            "_metadata": {
+                "serviceItems": serve["items"],
+                "updatedAt": datetime.fromtimestamp(today.timestamp() - rng.randint(0, 30 * 86400), tz=timezone.utc),
+            },
+        }
+        for date in dates:
+            schedule = {}
+            for item, pool in pools[serve["id"]].items():
+                if not pool:
+                    continue
+                size = 2 if item in TWO_PERSON_ITEMS and len(pool) > 1 else 1
+                schedule[item] = rng.sample(pool, size)
+            collection[date] = schedule
+
+        # 調班 / 代班記錄：過去的已處理，之後日期的部分仍在等待
+        for _ in range(round(shifts_per_week * week_count)):
+            apply_index = rng.randrange(week_count)
+            apply_date = dates[apply_index]
+            item = rng.choice([item for item in serve["items"] if item in collection[apply_date]] or [None])
+            if item is None:
+                continue
+            requester = rng.choice(collection[apply_date][item])
+            candidates = [name for name in pools[serve["id"]][item] if name != requester]
+            if not candidates:
+                continue
+            two_way = rng.random() < 0.6  # 調班（兩人交換日期），否則為代班
+            target_date = dates[min(apply_index + rng.randint(1, 4), week_count - 1)] if two_way else "none"
+            if apply_date >= today_key:
+                status = rng.choice(("等待", "成功", "拒絕"))
+            else:
+                status = "成功" if rng.random() < 0.8 else "拒絕"
+            documents["_shift"][random_id(rng)] = {
+                "狀態": status,
+                "種類": item,
+                "collection": serve["id"],
+                "申請人": requester,
+                "被申請人": rng.choice(candidates),
+                "申請日": apply_date,
+                "被申請日": target_date,
+            }
+    return documents
+
+
+def write_documents(db, documents):
+    """
+    寫入 generate_congregation 產生的資料
+    FakeFirestore 直接載入（不計讀寫、不加延遲）；其他 client（如模擬器）以每 500 筆一個 batch 寫入
+
+    Args:
+        db: FakeFirestore / MeteredFirestore / Firestore client
+
+    Returns:
+        int: 寫入的文件數
+    """
+    total = sum(len(collection_documents) for collection_documents in documents.values())
+    if hasattr(db, 'load'):
+        db.load(documents)
+        return total
+
+    batch = db.batch()
+    pending = 0
+    for collection_path, collection_documents in documents.items():
+        for document_id, data in collection_documents.items():
+            batch.set(db.collection(collection_path).document(document_id), data)
+            pending += 1
+            if pending >= BATCH_LIMIT:
+                batch.commit()
+                batch = db.batch()
+                pending = 0
+    if pending:
+        batch.commit()
+    return total
+
+
+def seed_congregation(db, **options):
+    """
+    產生並寫入資料，再建立索引（需先以 harness.env.load_line_bot 載入 main）
+
+    Args:
+        db: 要寫入的 client
+        **options: generate_congregation 的參數
+
+    Returns:
+        dict: generate_congregation 產生的資料
+    """
+    import build_indexes
+
+    documents = generate_congregation(**options)
+    write_documents(db, documents)
+    build_indexes.build_indexes(db)
+    return documents
+
+
+if __name__ == "__main__":
+    from env import emulator_client, load_line_bot
+    from fake_firestore import FakeFirestore
+    from line_stub import LineRecorder
+
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    serve_count = int(sys.argv[2]) if len(sys.argv) > 2 else 24
+    years = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    seed = int(sys.argv[4]) if len(sys.argv) > 4 else 0
+
+    if os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        db = emulator_client()
+        target = f"模擬器 {os.environ['FIRESTORE_EMULATOR_HOST']}"
+    else:
+        db = FakeFirestore()
+        target = "FakeFirestore"
+    load_line_bot(db, LineRecorder())
+
+    started = time.perf_counter()
+    documents = generate_congregation(seed=seed, users=user_count, serves=serve_count, years=years)
+    generated = time.perf_counter()
+    total = write_documents(db, documents)
+    written = time.perf_counter()
+    import build_indexes
+    indexes = build_indexes.build_indexes(db)
+    indexed = time.perf_counter()
+
+    print(f"{target}：{user_count} 人、{serve_count} 場崇拜、{years} 年，seed={seed}")
+    print(f"產生 {generated - started:.1f}s，寫入 {total} 份文件 {written - generated:.1f}s，"
+          f"建立索引 {indexed - written:.1f}s {indexes}")
+    schedule_documents = sum(len(documents[serve["id"]]) - 1 for serve in documents["_config"]["serve-list"]["serves"])
+    print(f"users {len(documents['users'])}，班表 {schedule_documents}，_shift {len(documents['_shift'])}")
@@ -0,0 +1,16 @@
+"""
+pytest harness：以 check_budgets 執行所有指令，任何一項超過 budgets.BUDGETS 的上限時失敗
+"""
+
+from bench_webhook import run_benchmark
+from budgets import BUDGETS
+from check_budgets import check_budgets
+from fake_firestore import FakeFirestore
+from metered_firestore import MeteredFirestore
+
+
+def test_every_command_within_budget():
+    # 兩回合：第一回合是冷快取，第二回合確認快取後沒有額外的讀寫
+    replay = run_benchmark(2, 0, 0, db=MeteredFirestore(FakeFirestore()))
+    problems = check_budgets(replay, BUDGETS)
+    assert not problems, "\n".join(problems)
@@ -0,0 +1,28 @@
+"""
+pytest harness：多位使用者事件交錯的 webhook 請求經過 EventScheduler 後，同一位使用者的事件依原本順序處理
+"""
+
+import time
+
+import bench_events
+
+USERS, EVENTS_PER_USER = 6, 5
+
+
+class LaterIsFaster(bench_events.RecordingDispatch):
+    """同一位使用者越後面的事件處理越快，並行處理同一位使用者的事件時一定會亂序"""
+
+    def __call__(self, event):
+        time.sleep(self.latency * (EVENTS_PER_USER - int(event.message.text)))
+        with self.lock:
+            self.processed.setdefault(event.source.user_id, []).append(int(event.message.text))
+
+
+def test_scheduler_keeps_per_user_order():
+    main = bench_events.main
+    body, signature = bench_events.build_payload(USERS, EVENTS_PER_USER)
+    events = main.parsers[1].parse(body, signature)
+
+    dispatch = LaterIsFaster(0.005)
+    main.EventScheduler(workers=main.EVENT_WORKERS, dispatch=dispatch).run(events)
+    assert bench_events.check(dispatch, USERS, EVENTS_PER_USER) == []
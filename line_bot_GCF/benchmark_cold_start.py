@@ -0,0 +1,68 @@
+"""
+lineWebhook 冷啟動時間分析
+python benchmark_cold_start.py [重複次數]
+
+每一項都在全新的 Python process 中量測（模擬 GCF 冷啟動），
+需在部署目錄執行（需要 chatBotConfig.py 與 serviceAccount.json）
+"""
+
+import statistics
+import subprocess
+import sys
+
+# (項目名稱, 事前準備（不計時）, 量測的程式碼)
+PHASES = [
+    ('import linebot', '', 'import linebot'),
+    ('import linebot.models', 'import linebot', 'import linebot.models'),
+    ('import firebase_admin.firestore', '', 'from firebase_admin import credentials, firestore'),
+    ('import week_alarm (Flex 模板)', '', 'import week_alarm'),
+    ('import main（總計）', '', 'import main'),
+    ('Firestore client 初始化', 'import main', 'main.db.client()'),
+    ('建立 LineBotApi', 'import main', 'main.get_line_bot_api(main.default_bot_id)'),
+]
+
+TIMER_TEMPLATE = """
+import time, warnings
+warnings.filterwarnings('ignore')
+{setup}
+started = time.perf_counter()
+{stmt}
+print(time.perf_counter() - started)
+"""
+
+
+def measure(setup, stmt):
+    """在新的 process 中執行 stmt 並回傳耗時（毫秒）"""
+    code = TIMER_TEMPLATE.format(setup=setup, stmt=stmt)
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+
+def run_benchmark(repeat=5):
+    """
+    量測每個冷啟動階段
+
+    Args:
+        repeat: 每個階段重複次數
+
+    Returns:
+        list: [(項目名稱, 中位數毫秒, 最小毫秒), ...]
+    """
+    report = []
+    for name, setup, stmt in PHASES:
+        try:
+            samples = [measure(setup, stmt) for _ in range(repeat)]
+        except RuntimeError as e:
+            print(f"{name} 量測失敗: {e}")
+            continue
+        report.append((name, statistics.median(samples), min(samples)))
+    return report
+
+
+if __name__ == "__main__":
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'項目':<36}{'中位數(ms)':>12}{'最小(ms)':>12}")
+    for name, median_ms, min_ms in run_benchmark(repeat):
+        print(f"{name:<36}{median_ms:>12.1f}{min_ms:>12.1f}")
@@ -0,0 +1,86 @@
+"""
+回填 / 重建使用者索引 collection
+python build_indexes.py
+
+從 users collection 重新產生：
+  _idx_line/{lineId}        → { userName }
+  _idx_token/{login_token}  → { userName }
+  _roster/{collection_id}   → { 服事項目: { userName: lineId } }
+並刪除已不存在於 users 的索引文件，同時補上 users 的 alarm_days 欄位
+"""
+
+# 匯入 main.py 時會一併完成 Firebase 初始化
+from main import db, LINE_INDEX, TOKEN_INDEX, ROSTER_INDEX, alarm_days_of
+
+BATCH_LIMIT = 500  # Firestore 單一 batch 最多 500 筆寫入
+
+
+def build_indexes(db):
+    """
+    依照 users collection 重建 lineId / login_token 索引與服事名冊，
+    並補上與 alarm_type 不一致的 alarm_days
+
+    Args:
+        db: Firestore client
+
+    Returns:
+        dict: { 索引 collection: 寫入筆數, "alarm_days": 補上的使用者數 }
+    """
+    expected = {LINE_INDEX: {}, TOKEN_INDEX: {}, ROSTER_INDEX: {}}
+    alarm_days_updates = {}
+    for user_doc in db.collection("users").get():
+        user_data = user_doc.to_dict()
+        alarm_days = alarm_days_of(user_data.get('alarm_type', []))
+        if user_data.get('alarm_days') != alarm_days:
+            alarm_days_updates[user_doc.reference] = alarm_days
+        line_id = user_data.get('lineId', '')
+        if line_id:
+            expected[LINE_INDEX][line_id] = {"userName": user_doc.id}
+            # 名冊只列已綁定 LINE 的同工
+            for collection_id, serve_list in user_data.get('serve_types', {}).items():
+                roster = expected[ROSTER_INDEX].setdefault(collection_id, {})
+                for serve_type in serve_list:
+                    roster.setdefault(serve_type, {})[user_doc.id] = line_id
+        if user_data.get('login_token'):
+            expected[TOKEN_INDEX][user_data['login_token']] = {"userName": user_doc.id}
+
+    batch = db.batch()
+    pending = 0
+
+    def flush_if_full():
+        nonlocal batch, pending
+        if pending >= BATCH_LIMIT:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+
+    for index_collection, entries in expected.items():
+        # 刪除過期的索引
+        for index_doc in db.collection(index_collection).get():
+            if index_doc.id not in entries:
+                batch.delete(index_doc.reference)
+                pending += 1
+                flush_if_full()
+
+        for key, data in entries.items():
+            batch.set(db.collection(index_collection).document(key), data)
+            pending += 1
+            flush_if_full()
+
+    for user_ref, alarm_days in alarm_days_updates.items():
+        batch.update(user_ref, {"alarm_days": alarm_days})
+        pending += 1
+        flush_if_full()
+
+    if pending:
+        batch.commit()
+
+    result = {index_collection: len(entries) for index_collection, entries in expected.items()}
+    result["alarm_days"] = len(alarm_days_updates)
+    return result
+
+
+if __name__ == "__main__":
+    result = build_indexes(db)
+    for index_collection, count in result.items():
+        print(f"{index_collection}: {count} 筆")
@@ -0,0 +1,30 @@
+"""
+快速回應模式的本地 worker
+python event_worker.py [輪詢間隔秒數]
+
+與 local_run.py（main.FAST_ACK = True）共用 EVENT_QUEUE_PATH 的 SQLite 佇列，
+持續取出 webhook 請求並處理；Ctrl+C 結束
+"""
+
+import sys
+import time
+
+import main
+
+
+def run_worker(poll_interval=0.2):
+    """持續處理佇列中的請求，佇列為空時等待 poll_interval 秒"""
+    print(f"event worker 啟動，佇列: {main.EVENT_QUEUE_PATH}")
+    while True:
+        processed = main.process_queued_events()
+        if processed:
+            print(f"[worker] processed={processed} remaining={len(main.get_event_queue())}")
+        else:
+            time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    try:
+        run_worker(float(sys.argv[1]) if len(sys.argv) > 1 else 0.2)
+    except KeyboardInterrupt:
+        pass
@@ -13,7 +13,8 @@ from main import lineWebhook
 app = Flask(__name__)
 
 @app.route("/", methods=['POST'])
-def callback():
+@app.route("/<int:bot_id>", methods=['POST'])
+def callback(bot_id=None):
     # 將 Flask 的 request 物件直接傳給你的 GCF 函式
     return lineWebhook(request)
 
@@ -5,7 +5,7 @@ LINE Bot 服事系統 - Google Cloud Function
 """
 
 from chatBotConfig import channel_secret, channel_access_token, line_bot_id
-from linebot import WebhookHandler, LineBotApi
+from linebot import WebhookParser, LineBotApi, SignatureValidator
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
     FollowEvent,
@@ -23,43 +23,435 @@ from linebot.models import (
     VideoSendMessage
 )
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextvars import ContextVar, copy_context
+from collections import OrderedDict, deque
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from week_alarm import alarm, menu
 
 # Firestore 初始化
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.api_core.exceptions import AlreadyExists
 
-cred = credentials.Certificate('serviceAccount.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
 
-# LINE Bot API 初始化 - 支援多台 LINE Bot
+class LazyFirestore:
+    """
+    第一次存取時才初始化 Firebase 與 Firestore client，縮短冷啟動的 import 時間
+    用法與 firestore.client() 相同（db.collection(...)、db.batch() ...）
+    """
+    
+    def __init__(self, credential_path='serviceAccount.json'):
+        self._credential_path = credential_path
+        self._client = None
+        self._lock = threading.Lock()
+    
+    def client(self):
+        """取得（必要時建立）實際的 Firestore client"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if not firebase_admin._apps:
+                        firebase_admin.initialize_app(credentials.Certificate(self._credential_path))
+                    self._client = firestore.client()
+        return self._client
+    
+    def set_client(self, client):
+        """直接指定 Firestore client（本地工具或模擬環境用）"""
+        self._client = client
+    
+    def __getattr__(self, name):
+        return getattr(self.client(), name)
+
+
+db = LazyFirestore()
+
+# LINE Bot API 初始化 - 單一部署服務所有 LINE Bot
 # line_bot_id 規則: 0=未連線, 1=第一台(索引 0), 2=第二台(索引 1), ...
-handlers = [WebhookHandler(secret) for secret in channel_secret]
-line_bot_apis = [LineBotApi(token) for token in channel_access_token]
+# 每個 webhook 請求依 URL 路徑或 destination 找到對應的 bot，再以該 bot 的 channel secret 驗證
+# 設定檔的 line_bot_id 只作為沒有事件時的預設 bot（0 時使用第一台）
+default_bot_id = line_bot_id if line_bot_id >= 1 else 1
+
+# 每台 bot 各一個 parser；事件處理函數以 add_event_handler 註冊，所有 bot 共用；LineBotApi 在第一次使用時才建立
+parsers = {bot_id: WebhookParser(secret) for bot_id, secret in enumerate(channel_secret, start=1)}
+_event_handlers = {}  # { (事件類別, 訊息類別 or None): 處理函數 }
+_signature_validators = {bot_id: SignatureValidator(secret) for bot_id, secret in enumerate(channel_secret, start=1)}
+_destination_bots = {}  # { destination（bot 的 user ID）: line_bot_id }，簽章驗證成功後記住
+_current_bot_id = ContextVar('current_bot_id', default=default_bot_id)
+_line_bot_apis = {}
+
+
+def current_bot_id():
+    """取得目前處理中的 webhook 請求對應的 line_bot_id"""
+    return _current_bot_id.get()
+
+
+def resolve_bot_id(path, body, signature):
+    """
+    找出 webhook 請求對應的 line_bot_id，並以該 bot 的 channel secret 驗證簽章
+    
+    依序使用：
+    1. URL 路徑最後一段的編號（如 .../lineWebhook/2）
+    2. body 的 destination（之前驗證成功時記住的對應）
+    3. 依序以每台 bot 的 secret 驗證（第一次收到某個 destination 時）
+    
+    Args:
+        path: 請求的 URL 路徑
+        body: 請求內容（文字）
+        signature: X-Line-Signature
+        
+    Returns:
+        int or None: line_bot_id，找不到或簽章無效時為 None
+    """
+    if not signature:
+        return None
+    
+    last_segment = (path or '').rstrip('/').rsplit('/', 1)[-1]
+    if last_segment.isdigit():
+        bot_id = int(last_segment)
+        if bot_id in _signature_validators and _signature_validators[bot_id].validate(body, signature):
+            return bot_id
+        return None
+    
+    try:
+        destination = json.loads(body).get('destination')
+    except (ValueError, AttributeError):
+        return None
+    
+    if destination in _destination_bots:
+        bot_id = _destination_bots[destination]
+        return bot_id if _signature_validators[bot_id].validate(body, signature) else None
+    
+    for bot_id, validator in _signature_validators.items():
+        if validator.validate(body, signature):
+            if destination:
+                _destination_bots[destination] = bot_id
+            return bot_id
+    return None
+
+
+def add_event_handler(event, message=None):
+    """
+    註冊事件處理函數（用法與 WebhookHandler.add 相同），所有 bot 共用
+    
+    Args:
+        event: LINE 事件類別
+        message: MessageEvent 的訊息類別
+    """
+    def decorator(func):
+        _event_handlers[(event, message)] = func
+        return func
+    return decorator
+
+
+def dispatch_event(event):
+    """
+    依事件類別（MessageEvent 再依訊息類別）呼叫註冊的處理函數，沒有對應時忽略
+    
+    Args:
+        event: LINE webhook 事件
+    """
+    func = None
+    if isinstance(event, MessageEvent):
+        func = _event_handlers.get((type(event), type(event.message)))
+    if func is None:
+        func = _event_handlers.get((type(event), None))
+    if func is not None:
+        func(event)
+
+
+def get_line_bot_api(bot_id):
+    """
+    取得 line_bot_id 對應的 LineBotApi（第一次使用時才建立）
+    
+    Args:
+        bot_id: line_bot_id (1, 2, ...)
+        
+    Returns:
+        LineBotApi: 對應的實例，bot_id 無效時返回 None
+    """
+    # line_bot_id - 1 = 陣列索引
+    array_index = bot_id - 1
+    if not 0 <= array_index < len(channel_access_token):
+        return None
+    
+    if bot_id not in _line_bot_apis:
+        _line_bot_apis[bot_id] = LineBotApi(channel_access_token[array_index])
+    return _line_bot_apis[bot_id]
+
+
+def set_line_bot_api(bot_id, api):
+    """直接指定某台 bot 使用的 LineBotApi（本地工具或模擬環境用）"""
+    _line_bot_apis[bot_id] = api
+
+
+# =====================================================
+# 事件範圍資料（每個 webhook 事件一份）
+# =====================================================
+
+class EventContext:
+    """
+    單一 webhook 事件的請求範圍資料
+    使用者資料只在第一次需要時查詢一次，之後所有處理函數共用
+    並記錄此事件的 Firestore 讀取次數
+    """
+    
+    def __init__(self, line_id, bot_id=None):
+        self.line_id = line_id
+        self.bot_id = bot_id or current_bot_id()  # 收到此事件的 line_bot_id，回覆使用同一台
+        self.reads = 0  # Firestore 計費讀取次數（查詢無結果也算 1 次）
+        self.queries = 0  # Firestore get() 呼叫次數
+        self._lock = threading.Lock()  # 並行讀取時保護計數器
+        self.pending_usage = {}  # { 使用者名稱: { 欄位路徑: 次數 } }，事件結束後一次寫入
+        self.pending_pushes = {}  # { line_bot_id: 推播次數 }，與使用量一起寫入
+        self.deferred = []  # 回覆後才執行的背景工作 [(func, args), ...]
+        self._user_loaded = False
+        self._user_name = None
+        self._user_data = None
+    
+    def load_user(self):
+        """
+        取得此事件使用者的 (使用者名稱, 使用者資料)，只會查詢一次
+        
+        Returns:
+            tuple: (使用者名稱, 使用者資料 dict) 或 (None, None)
+        """
+        if not self._user_loaded:
+            self._user_name, self._user_data = get_user_by_line_id(self.line_id)
+            self._user_loaded = True
+        return self._user_name, self._user_data
+    
+    def set_user(self, user_name, user_data):
+        """直接設定使用者資料（如登入後），避免再次查詢"""
+        self._user_name, self._user_data = user_name, user_data
+        self._user_loaded = True
+    
+    @property
+    def user_name(self):
+        return self.load_user()[0]
+    
+    @property
+    def user_data(self):
+        return self.load_user()[1]
+    
+    @property
+    def is_signed_in(self):
+        return self.user_data is not None
+    
+    @property
+    def user_loaded(self):
+        """此事件是否已經查詢過使用者（不會觸發查詢）"""
+        return self._user_loaded
+
+
+_current_event = ContextVar('current_event', default=None)
+
+
+def current_event():
+    """取得目前正在處理的 EventContext，不在事件中時返回 None"""
+    return _current_event.get()
+
+
+def firestore_get(target, transaction=None):
+    """
+    執行 Firestore 的 get()，並把讀取次數記到目前事件的 EventContext
+    
+    Args:
+        target: DocumentReference / CollectionReference / Query
+        transaction: 在此 transaction 中讀取，None 表示一般讀取
+        
+    Returns:
+        DocumentSnapshot 或 DocumentSnapshot 列表（與 target.get() 相同）
+    """
+    result = target.get(transaction=transaction) if transaction is not None else target.get()
+    ctx = current_event()
+    if ctx is not None:
+        with ctx._lock:
+            ctx.queries += 1
+            ctx.reads += max(len(result), 1) if isinstance(result, list) else 1
+    return result
+
+
+def firestore_get_all(refs, field_paths=None, transaction=None):
+    """
+    以單一 RPC (db.get_all) 讀取多個文件，並記錄讀取次數
+    
+    Args:
+        refs: DocumentReference 列表
+        field_paths: 只取回這些欄位（field mask），None 表示全部欄位
+        transaction: 在此 transaction 中讀取，None 表示一般讀取
+        
+    Returns:
+        dict: { 文件路徑 (如 "users/小明"): DocumentSnapshot, ... }
+    """
+    refs = list(refs)
+    if not refs:
+        return {}
+    
+    if field_paths is not None:
+        field_paths = [FieldPath(field).to_api_repr() for field in field_paths]
+    snapshots = {
+        doc.reference.path: doc
+        for doc in db.get_all(refs, field_paths=field_paths, transaction=transaction)
+    }
+    
+    ctx = current_event()
+    if ctx is not None:
+        with ctx._lock:
+            ctx.queries += 1
+            ctx.reads += len(refs)
+    return snapshots
+
+
+# 並行讀取用的執行緒池（與背景工作分開，避免互相佔用）
+FETCH_WORKERS = 8
+_fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+
+
+def run_concurrently(func, args_list):
+    """
+    同時執行多個 func(*args)（如每個崇拜各一次的 Firestore 查詢）
+    總延遲取決於最慢的一個，而不是全部相加
+    
+    Args:
+        func: 要執行的函數
+        args_list: 參數列表 [(arg1, ...), ...]
+        
+    Returns:
+        list: 依 args_list 順序的回傳值
+    """
+    if len(args_list) <= 1:
+        return [func(*args) for args in args_list]
+    
+    # copy_context 讓工作執行緒也能把讀取次數記到目前事件
+    futures = [_fetch_executor.submit(copy_context().run, func, *args) for args in args_list]
+    return [future.result() for future in futures]
+
+
+# =====================================================
+# 背景工作（回覆之後才執行的副作用）
+# =====================================================
+# GCF 在回傳 HTTP 回應後會凍結 instance，因此 lineWebhook 回傳前
+# 必須呼叫 drain_background_tasks() 等待所有背景工作完成
+
+BACKGROUND_WORKERS = 4
+BACKGROUND_DRAIN_TIMEOUT = 50  # 秒
+
+_background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background')
+_background_futures = []
+_background_lock = threading.Lock()
+
+
+def defer(func, *args):
+    """
+    將 func(*args) 排到回覆訊息之後執行（push message、通知、統計等）
+    不在 webhook 事件中時直接執行
+    
+    Args:
+        func: 要執行的函數
+        *args: 傳給 func 的參數
+    """
+    ctx = current_event()
+    if ctx is None:
+        func(*args)
+        return
+    ctx.deferred.append((func, args))
+
+
+def run_deferred(ctx):
+    """
+    依序執行單一事件暫存的背景工作，個別工作失敗不影響其他工作
+    最後寫入暫存的使用量統計
+    
+    Args:
+        ctx: EventContext
+        
+    Returns:
+        list: 失敗的工作 [(函數名稱, 例外), ...]
+    """
+    token = _current_event.set(ctx)
+    failures = []
+    try:
+        for func, args in ctx.deferred:
+            try:
+                func(*args)
+            except Exception as e:
+                failures.append((func.__name__, e))
+                print(f"[background] {func.__name__} 失敗: {e}")
+        flush_usage(ctx)
+    finally:
+        _current_event.reset(token)
+    
+    print(f"[background] tasks={len(ctx.deferred)} failed={len(failures)} total_reads={ctx.reads}")
+    ctx.deferred = []
+    return failures
+
+
+def start_background_tasks(ctx):
+    """把事件的背景工作交給執行緒池執行"""
+    if not ctx.deferred and not ctx.pending_usage:
+        return
+    future = _background_executor.submit(run_deferred, ctx)
+    with _background_lock:
+        _background_futures.append(future)
 
-# 預設的 handler (根據目前部署的 GCF 對應的 line_bot_id)
-# line_bot_id - 1 = 陣列索引
-handler = handlers[line_bot_id - 1] if line_bot_id >= 1 else handlers[0]
-line_bot_api = line_bot_apis[line_bot_id - 1] if line_bot_id >= 1 else line_bot_apis[0]
 
+def drain_background_tasks(timeout=BACKGROUND_DRAIN_TIMEOUT):
+    """
+    等待目前所有背景工作完成（在 lineWebhook 回傳前呼叫）
+    
+    Returns:
+        int: 逾時仍未完成的工作數
+    """
+    with _background_lock:
+        futures = list(_background_futures)
+        _background_futures.clear()
+    if not futures:
+        return 0
+    
+    _, not_done = wait(futures, timeout=timeout)
+    if not_done:
+        print(f"[background] {len(not_done)} 個背景工作逾時未完成")
+    return len(not_done)
 
 # =====================================================
 # 使用者相關功能
 # =====================================================
 
-def is_signed_in(line_id):
+# 索引 collection：以 document ID 直接查詢，取代對 users 的欄位查詢
+# _idx_line/{lineId}       → { userName }
+# _idx_token/{login_token} → { userName }
+# _roster/{collection_id}  → { 服事項目: { userName: lineId } }（只列已綁定 LINE 的同工）
+# 與 users 文件在同一個 batch 內寫入（見 build_indexes.py 回填既有資料）
+LINE_INDEX = "_idx_line"
+TOKEN_INDEX = "_idx_token"
+ROSTER_INDEX = "_roster"
+
+
+def lookup_index(index_collection, key):
     """
-    檢查使用者是否已經登入（是否已綁定 LINE ID）
+    從索引 collection 取得對應的使用者名稱
     
     Args:
-        line_id: LINE 使用者 ID
+        index_collection: LINE_INDEX 或 TOKEN_INDEX
+        key: lineId 或 login_token
         
     Returns:
-        bool: 是否已登入
+        str or None: 使用者名稱
     """
-    query = db.collection("users").where("lineId", "==", line_id).limit(1)
-    docs = query.get()
-    return len(docs) > 0 and docs[0].exists
+    if not key:
+        return None
+    doc = firestore_get(db.collection(index_collection).document(key))
+    if doc.exists:
+        return doc.to_dict().get('userName')
+    return None
 
 
 def get_user_by_line_id(line_id):
@@ -72,46 +464,129 @@ def get_user_by_line_id(line_id):
     Returns:
         tuple: (使用者名稱, 使用者資料 dict) 或 (None, None)
     """
-    docs = db.collection("users").where("lineId", "==", line_id).limit(1).get()
-    if len(docs) > 0 and docs[0].exists:
-        return docs[0].id, docs[0].to_dict()
+    user_name = lookup_index(LINE_INDEX, line_id)
+    if not user_name:
+        return None, None
+    
+    user_doc = firestore_get(db.collection("users").document(user_name))
+    if user_doc.exists:
+        user_data = user_doc.to_dict()
+        # 索引過期（使用者已換 LINE 帳號）時視為未登入
+        if user_data.get('lineId') == line_id:
+            return user_name, user_data
     return None, None
 
 
-def get_line_bot_api_for_user(user_name):
+def get_line_bot_api_for_user_data(user_data):
     """
-    根據用戶的 line_bot_id 取得正確的 LineBotApi
-    用於跨 Bot 發送 push message（調班/代班通知）
+    根據用戶資料中的 line_bot_id 取得正確的 LineBotApi
     
     Args:
-        user_name: 使用者名稱
+        user_data: 使用者資料 dict
         
     Returns:
-        LineBotApi: 正確的 LINE Bot API 實例，如果用戶未連線則返回 None
+        LineBotApi: 正確的 LINE Bot API 實例，如果未連線則返回 None
     """
-    if not user_name:
-        return None  # 沒有指定用戶
+    bot_id = user_data.get('line_bot_id', 0)
     
-    user_doc = db.collection("users").document(user_name).get()
-    if user_doc.exists:
-        user_data = user_doc.to_dict()
-        bot_id = user_data.get('line_bot_id', 0)
+    # line_bot_id = 0 表示未連線任何 Bot
+    if bot_id == 0:
+        return None
+    
+    return get_line_bot_api(bot_id)  # 無效的 bot_id 返回 None
+
+
+# 推播額度：_push_quota/{YYYY.MM} → { "1": 次數, "2": 次數, ... }（依 line_bot_id）
+PUSH_QUOTA = "_push_quota"
+PUSH_QUOTA_LIMIT = 200  # 每台 Bot 每月免費推播則數
+PUSH_QUOTA_WARN_RATIO = 0.8  # 超過此比例時，新登入的使用者會被建議改用其他 Bot
+
+
+def push_message(bot_id, to, messages):
+    """
+    所有 push message 都經過這裡，並記錄該 Bot 本月的推播次數
+    （reply_message 不佔推播額度，不需經過這裡）
+    
+    Args:
+        bot_id: 發送用的 line_bot_id
+        to: 收件者 LINE ID
+        messages: 訊息物件或訊息列表
         
-        # line_bot_id = 0 表示未連線任何 Bot
-        if bot_id == 0:
-            return None
+    Returns:
+        bool: 是否已發送（bot_id 無效時為 False）
+    """
+    line_bot_api = get_line_bot_api(bot_id)
+    if not line_bot_api:
+        return False
+    
+    line_bot_api.push_message(to, messages)
+    
+    ctx = current_event()
+    if ctx is not None:
+        with ctx._lock:
+            ctx.pending_pushes[bot_id] = ctx.pending_pushes.get(bot_id, 0) + 1
+    else:
+        try:
+            db.collection(PUSH_QUOTA).document(datetime.now().strftime("%Y.%m")).set(
+                {str(bot_id): firestore.Increment(1)}, merge=True
+            )
+        except Exception as e:
+            print(f"push quota error: {e}")
+    return True
+
+
+def get_push_quota_usage(month=None):
+    """
+    取得各 Bot 某月的推播次數
+    
+    Args:
+        month: 月份 (YYYY.MM)，None 表示本月
         
-        # line_bot_id - 1 = 陣列索引
-        array_index = bot_id - 1
-        if 0 <= array_index < len(line_bot_apis):
-            return line_bot_apis[array_index]
+    Returns:
+        dict: { line_bot_id: 次數 }，包含所有已設定的 Bot
+    """
+    month = month or datetime.now().strftime("%Y.%m")
+    quota_doc = firestore_get(db.collection(PUSH_QUOTA).document(month))
+    counts = quota_doc.to_dict() if quota_doc.exists else {}
+    return {
+        bot_id: counts.get(str(bot_id), 0)
+        for bot_id in range(1, len(channel_access_token) + 1)
+    }
+
+
+def suggest_push_bot(bot_id):
+    """
+    新登入的使用者應使用哪台 Bot：目前的 Bot 推播額度快用完，且有其他 Bot 較有餘裕時，回傳剩餘額度最多的 Bot
+    （LINE 只能推播給已加入好友的使用者，因此只能建議使用者改加入該 Bot 後重新登入）
     
-    return None  # 用戶不存在或未連線
+    Args:
+        bot_id: 使用者目前登入的 line_bot_id
+        
+    Returns:
+        int or None: 建議改用的 line_bot_id，不需要改時為 None
+    """
+    usage = get_push_quota_usage()
+    best_bot_id = min(usage, key=lambda candidate: (usage[candidate], candidate))
+    if best_bot_id == bot_id or usage.get(bot_id, 0) < PUSH_QUOTA_LIMIT * PUSH_QUOTA_WARN_RATIO:
+        return None
+    if usage[best_bot_id] >= usage.get(bot_id, 0):
+        return None
+    return best_bot_id
+
+
+def usage_field_path(action_type):
+    """
+    取得使用量計數的欄位路徑，如 usage_count.`2026.01`.`換班`
+    月份含有 '.'，需用 FieldPath 轉義以保持 { "YYYY.MM": {...} } 的結構
+    """
+    month_key = datetime.now().strftime("%Y.%m")
+    return FieldPath('usage_count', month_key, action_type).to_api_repr()
 
 
 def log_usage(user_name, action_type):
     """
     記錄使用者的使用量統計
+    在 webhook 事件中只先暫存，回覆後由 flush_usage 一次寫入
     
     Args:
         user_name: 使用者名稱
@@ -120,32 +595,52 @@ def log_usage(user_name, action_type):
     if not user_name:
         return
     
+    field = usage_field_path(action_type)
+    ctx = current_event()
+    if ctx is not None:
+        counts = ctx.pending_usage.setdefault(user_name, {})
+        counts[field] = counts.get(field, 0) + 1
+        return
+    
     try:
-        # 取得當前年月
-        month_key = datetime.now().strftime("%Y.%m")
-        
-        # 使用 Firestore 的原子操作增加計數
-        user_ref = db.collection("users").document(user_name)
-        user_doc = user_ref.get()
-        
-        if user_doc.exists:
-            user_data = user_doc.to_dict()
-            usage_count = user_data.get('usage_count', {})
-            
-            if month_key not in usage_count:
-                usage_count[month_key] = {}
-            
-            if action_type not in usage_count[month_key]:
-                usage_count[month_key][action_type] = 0
-            
-            usage_count[month_key][action_type] += 1
-            
-            user_ref.update({'usage_count': usage_count})
+        # 不在事件中，直接以原子操作增加計數
+        db.collection("users").document(user_name).update({field: firestore.Increment(1)})
+    except Exception as e:
+        print(f"log_usage error: {e}")
+
+
+def flush_usage(ctx):
+    """
+    把事件中暫存的使用量計數與推播次數以單一 batch 寫入（只寫不讀）
+    
+    Args:
+        ctx: EventContext
+    """
+    if not ctx.pending_usage and not ctx.pending_pushes:
+        return
+    
+    try:
+        batch = db.batch()
+        for user_name, counts in ctx.pending_usage.items():
+            batch.update(
+                db.collection("users").document(user_name),
+                {field: firestore.Increment(count) for field, count in counts.items()}
+            )
+        if ctx.pending_pushes:
+            batch.set(
+                db.collection(PUSH_QUOTA).document(datetime.now().strftime("%Y.%m")),
+                {str(bot_id): firestore.Increment(count) for bot_id, count in ctx.pending_pushes.items()},
+                merge=True
+            )
+        batch.commit()
     except Exception as e:
         print(f"log_usage error: {e}")
+    finally:
+        ctx.pending_usage = {}
+        ctx.pending_pushes = {}
 
 
-def sign_in_with_token(login_token, line_id):
+def sign_in_with_token(login_token, line_id, bot_id):
     """
     使用邀請碼登入
     支援用戶換 LINE 帳號的情況，可以覆蓋舊的 LINE ID
@@ -153,48 +648,100 @@ def sign_in_with_token(login_token, line_id):
     Args:
         login_token: 16位隨機邀請碼
         line_id: LINE 使用者 ID
+        bot_id: 使用者登入時使用的 line_bot_id
         
     Returns:
         str or None: 登入成功返回使用者名稱，失敗返回 None
     """
-    # 查詢是否有符合的邀請碼
-    docs = db.collection("users").where("login_token", "==", login_token).limit(1).get()
+    # 從邀請碼索引找到使用者
+    user_name = lookup_index(TOKEN_INDEX, login_token)
+    if not user_name:
+        return None
     
-    if len(docs) > 0 and docs[0].exists:
-        user_name = docs[0].id
-        user_data = docs[0].to_dict()
-        old_line_id = user_data.get('lineId', '')
-        
-        # 更新 LINE ID 和 Line Bot ID
-        update_data = {
-            "lineId": line_id,
-            "line_bot_id": line_bot_id,  # 更新為目前登入的 bot
-        }
-        
-        # 只有首次登入才設定預設提醒
-        if old_line_id == '':
-            update_data["alarm_type"] = [True, False, False, False, False, False]  # 預設週一提醒
-        
-        db.collection("users").document(user_name).update(update_data)
-        return user_name
-    return None
+    user_doc = firestore_get(db.collection("users").document(user_name))
+    if not user_doc.exists:
+        return None
+    
+    user_data = user_doc.to_dict()
+    if user_data.get('login_token') != login_token:
+        return None  # 索引過期（邀請碼已重新產生）
+    old_line_id = user_data.get('lineId', '')
+    
+    # 更新 LINE ID 和 Line Bot ID
+    update_data = {
+        "lineId": line_id,
+        "line_bot_id": bot_id,  # 更新為目前登入的 bot
+    }
+    
+    # 只有首次登入才設定預設提醒
+    if old_line_id == '':
+        update_data["alarm_type"] = [True, False, False, False, False, False]  # 預設週一提醒
+        update_data["alarm_days"] = alarm_days_of(update_data["alarm_type"])
+    
+    # 使用者文件與 lineId 索引一起寫入
+    batch = db.batch()
+    batch.update(db.collection("users").document(user_name), update_data)
+    if old_line_id and old_line_id != line_id:
+        batch.delete(db.collection(LINE_INDEX).document(old_line_id))
+    batch.set(db.collection(LINE_INDEX).document(line_id), {"userName": user_name})
+    for collection_id, serve_list in user_data.get('serve_types', {}).items():
+        if serve_list:
+            batch.set(
+                db.collection(ROSTER_INDEX).document(collection_id),
+                {serve_type: {user_name: line_id} for serve_type in serve_list},
+                merge=True
+            )
+    batch.commit()
+    
+    reminder_fields = {"lineId": line_id, "line_bot_id": bot_id}
+    if "alarm_type" in update_data:
+        reminder_fields["alarm_days"] = update_data["alarm_days"]
+    defer(sync_user_reminders, user_name, reminder_fields)
+    return user_name
 
 
 # =====================================================
 # 崇拜與服事項目相關功能
 # =====================================================
 
+# 崇拜清單快取（同一個 instance 內共用，避免每次呼叫都讀取 _config/serve-list）
+# _config/serve-list 只由 schedule-app 修改，bot 這邊沒有寫入的路徑，修改後最多 SERVE_LIST_TTL 秒才會生效
+SERVE_LIST_TTL = 300  # 秒
+# (崇拜清單, { collection_id: 崇拜名稱 }, 到期時間)，整組一次替換，清單與名稱一定來自同一次讀取
+_serve_list_cache = (None, {}, 0.0)
+
+
+def load_serve_list():
+    """
+    從 _config/serve-list 取得崇拜清單與名稱對照，結果會快取 SERVE_LIST_TTL 秒
+    
+    Returns:
+        tuple: (崇拜清單 [{ id, name, emoji }, ...], { collection_id: "🎸 青年崇拜" })
+    """
+    global _serve_list_cache
+    serves, names, expires_at = _serve_list_cache
+    now = time.monotonic()
+    if serves is not None and now < expires_at:
+        return serves, names
+    
+    doc = firestore_get(db.collection("_config").document("serve-list"))
+    serves = doc.to_dict().get('serves', []) if doc.exists else []
+    names = {
+        serve.get('id'): f"{serve.get('emoji', '')} {serve.get('name', serve.get('id'))}"
+        for serve in serves
+    }
+    _serve_list_cache = (serves, names, now + SERVE_LIST_TTL)
+    return serves, names
+
+
 def get_serve_list():
     """
-    從 _config/serve-list 取得所有崇拜清單
+    取得所有崇拜清單（快取 SERVE_LIST_TTL 秒）
     
     Returns:
         list: 崇拜清單 [{ id, name, emoji }, ...]
     """
-    doc = db.collection("_config").document("serve-list").get()
-    if doc.exists:
-        return doc.to_dict().get('serves', [])
-    return []
+    return load_serve_list()[0]
 
 
 def get_serve_name_by_id(collection_id):
@@ -207,11 +754,7 @@ def get_serve_name_by_id(collection_id):
     Returns:
         str: 崇拜名稱（含 emoji），如 "🎸 青年崇拜"
     """
-    serves = get_serve_list()
-    for serve in serves:
-        if serve.get('id') == collection_id:
-            return f"{serve.get('emoji', '')} {serve.get('name', collection_id)}"
-    return collection_id
+    return load_serve_list()[1].get(collection_id, collection_id)
 
 
 def get_service_items(collection_id):
@@ -224,7 +767,7 @@ def get_service_items(collection_id):
     Returns:
         list: 服事項目列表
     """
-    doc = db.collection(collection_id).document("_metadata").get()
+    doc = firestore_get(db.collection(collection_id).document("_metadata"))
     if doc.exists:
         return doc.to_dict().get('serviceItems', [])
     return []
@@ -243,23 +786,38 @@ def get_user_serve_collections(user_data):
     return user_data.get('serve_types', {})
 
 
+# 班表快取（同一個 instance 內共用）
+# { collection_id: { 'version': _metadata.updatedAt, 'today': 'YYYY.MM.DD', 'schedule': {...} } }
+# schedule-app 與調班在修改班表時會更新 _metadata.updatedAt，版本相同時就不需要重新讀取 26 份文件
+_schedule_cache = {}
+
+
 def get_collection_schedule(collection_id):
     """
     取得崇拜 collection 中今天及之後的所有日期資料
+    先讀取 _metadata 的版本戳記，與快取相同時直接使用快取
     
     Args:
         collection_id: 崇拜的 collection ID
         
     Returns:
-        dict: { 日期: { 服事項目: [人員列表], ... }, ... }
+        dict: { 日期: { 服事項目: [人員列表], ... }, ... }（請勿修改回傳值）
     """
-    schedule = {}
     today = datetime.now().strftime("%Y.%m.%d")
     
+    metadata_doc = firestore_get(db.collection(collection_id).document("_metadata"))
+    version = metadata_doc.to_dict().get('updatedAt') if metadata_doc.exists else None
+    
+    cached = _schedule_cache.get(collection_id)
+    if version is not None and cached and cached['version'] == version and cached['today'] == today:
+        return cached['schedule']
+    
+    schedule = {}
+    
     # 使用 document ID 篩選今天及之後的文件（最多半年份）
-    docs = db.collection(collection_id) \
-        .where("__name__", ">=", db.collection(collection_id).document(today)) \
-        .limit(26).get()
+    docs = firestore_get(db.collection(collection_id)
+        .where("__name__", ">=", db.collection(collection_id).document(today))
+        .limit(26))
     
     for doc in docs:
         # 跳過 _metadata 文件
@@ -268,9 +826,28 @@ def get_collection_schedule(collection_id):
         
         schedule[doc.id] = doc.to_dict()
     
+    # 沒有版本戳記的舊資料不快取
+    if version is not None:
+        _schedule_cache[collection_id] = {'version': version, 'today': today, 'schedule': schedule}
+    
     return schedule
 
 
+def get_collection_schedules(collection_ids):
+    """
+    同時取得多個崇拜今天及之後的班表
+    
+    Args:
+        collection_ids: 崇拜 collection ID 列表
+        
+    Returns:
+        dict: { collection_id: get_collection_schedule 的回傳值, ... }
+    """
+    collection_ids = list(collection_ids)
+    schedules = run_concurrently(get_collection_schedule, [(cid,) for cid in collection_ids])
+    return dict(zip(collection_ids, schedules))
+
+
 def get_user_serve_dates_from_schedule(user_name, schedule, serve_type):
     """
     從班表資料中篩選使用者在指定服事項目的所有日期
@@ -296,18 +873,18 @@ def get_user_serve_dates_from_schedule(user_name, schedule, serve_type):
 # 調班/代班功能
 # =====================================================
 
-def can_shift(line_id, mode):
+def can_shift(ctx, mode):
     """
     檢查是否可以調班/代班，並顯示選擇崇拜的選單
     
     Args:
-        line_id: LINE 使用者 ID
+        ctx: 此事件的 EventContext
         mode: 'S' (調班) 或 'G' (代班)
         
     Returns:
         LINE message 物件
     """
-    user_name, user_data = get_user_by_line_id(line_id)
+    user_name, user_data = ctx.load_user()
     if not user_data:
         return TextSendMessage(text="找不到使用者資料")
     
@@ -316,11 +893,13 @@ def can_shift(line_id, mode):
     if not serve_types:
         return TextSendMessage(text="目前沒有服事喔~")
     
+    # 每個崇拜只查詢一次 Firestore，且所有崇拜同時查詢
+    schedules = get_collection_schedules(serve_types.keys())
+    
     # 收集所有有服事的崇拜和服事項目
     all_serves = []
     for collection_id, serve_list in serve_types.items():
-        # 每個崇拜只查詢一次 Firestore
-        schedule = get_collection_schedule(collection_id)
+        schedule = schedules[collection_id]
         
         for serve_type in serve_list:
             # 從現有的 schedule 中篩選服事日期
@@ -394,12 +973,12 @@ def build_serve_selection_columns(serves, mode):
     )]
 
 
-def select_shift_date(line_id, mode, collection_id, serve_type):
+def select_shift_date(ctx, mode, collection_id, serve_type):
     """
     顯示選擇調班日期的選單
     
     Args:
-        line_id: LINE 使用者 ID
+        ctx: 此事件的 EventContext
         mode: 'S' (調班) 或 'G' (代班)
         collection_id: 崇拜 collection ID
         serve_type: 服事種類
@@ -407,7 +986,7 @@ def select_shift_date(line_id, mode, collection_id, serve_type):
     Returns:
         LINE message 物件
     """
-    user_name, user_data = get_user_by_line_id(line_id)
+    user_name, user_data = ctx.load_user()
     if not user_data:
         return TextSendMessage(text="找不到使用者資料")
     
@@ -472,42 +1051,35 @@ def find_shift_candidates(collection_id, serve_type, change_date, requester_name
     actions = []
     
     if mode == 'G':
-        # 代班模式：找所有有這個服事的人
-        users_query = db.collection("users").get()
-        for user_doc in users_query:
-            if user_doc.id == requester_name:
+        # 代班模式：從名冊索引找所有有這個服事且已綁定 LINE 的人
+        roster_doc = firestore_get(db.collection(ROSTER_INDEX).document(collection_id))
+        members = roster_doc.to_dict().get(serve_type, {}) if roster_doc.exists else {}
+        for member_name in sorted(members):
+            if member_name == requester_name or not members[member_name]:
                 continue
-            user_data = user_doc.to_dict()
-            serve_types = user_data.get('serve_types', {}).get(collection_id, [])
-            if serve_type in serve_types and user_data.get('lineId', ''):
-                actions.append(PostbackTemplateAction(
-                    label=user_doc.id,
-                    text=f"請 {user_doc.id} 代班",
-                    data=f"G#{user_doc.id}|{change_date}|{collection_id}|{serve_type}|{requester_name}"
+            actions.append(PostbackTemplateAction(
+                label=member_name,
+                text=f"請 {member_name} 代班",
+                data=f"G#{member_name}|{change_date}|{collection_id}|{serve_type}|{requester_name}"
+            ))
+            if len(actions) == 3:
+                columns.append(CarouselColumn(
+                    title='請誰代班?',
+                    text='請「一定要」與該同工先私訊溝通好',
+                    actions=actions
                 ))
-                if len(actions) == 3:
-                    columns.append(CarouselColumn(
-                        title='請誰代班?',
-                        text='請「一定要」與該同工先私訊溝通好',
-                        actions=actions
-                    ))
-                    actions = []
+                actions = []
     else:
-        # 調班模式：找該服事其他日期的人
-        today = datetime.now().strftime("%Y.%m.%d")
-        # 使用 document ID 篩選今天及之後的文件
-        docs = db.collection(collection_id) \
-            .where("__name__", ">=", db.collection(collection_id).document(today)) \
-            .limit(26).get()
-        for doc in docs:
-            if doc.id == '_metadata' or doc.id == change_date:
+        # 調班模式：找該服事其他日期的人（今天及之後的班表，可使用快取）
+        schedule = get_collection_schedule(collection_id)
+        for date, doc_data in schedule.items():
+            if date == change_date:
                 continue
-            doc_data = doc.to_dict()
             persons_list = doc_data.get(serve_type, [])
             
             # 檢查申請人是否不在這天的服事中
             if requester_name not in persons_list and len(persons_list) > 0:
-                date_str = doc.id.replace('.', '/')
+                date_str = date.replace('.', '/')
                 persons_display = '/'.join(persons_list)  # 顯示用
                 # 多人用 B#，單人用 B&
                 data_prefix = 'B#' if len(persons_list) > 1 else 'B&'
@@ -543,11 +1115,12 @@ def find_shift_candidates(collection_id, serve_type, change_date, requester_name
     return columns
 
 
-def confirm_shift_request(data_parts, mode):
+def confirm_shift_request(ctx, data_parts, mode):
     """
     確認調班/代班申請
     
     Args:
+        ctx: EventContext（已讀取的申請人資料會沿用）
         data_parts: 解析後的資料
         mode: 'S' (調班) 或 'G' (代班)
         
@@ -569,7 +1142,9 @@ def confirm_shift_request(data_parts, mode):
         confirm_text = f"確定要用 {apply_date[5:].replace('.', '/')} 的 {serve_type}\n跟 {respondent} 換 {target_date[5:]} 的嗎?\n({collection_name})"
         data = f"C&{'|'.join(data_parts)}"
         mode_title = '調班'
-        remind_msg = remind_same_week_serve(requester, target_date.replace('/', '.'), collection_id)
+        # 此事件已經查詢過申請人時沿用，否則只以名稱讀取 serve_types（比以 lineId 查詢少一次讀取）
+        user_data = ctx.user_data if ctx.user_loaded and ctx.user_name == requester else None
+        remind_msg = remind_same_week_serve(requester, target_date.replace('/', '.'), collection_id, user_data)
     
     reply = TemplateSendMessage(
         alt_text=f'確定要{mode_title}嗎?',
@@ -588,6 +1163,7 @@ def confirm_shift_request(data_parts, mode):
 def send_shift_request(data_parts, mode):
     """
     發送調班/代班請求給對方
+    回覆前只讀取對方的使用者資料，其餘（建立記錄、推播）在回覆後執行
     
     Args:
         data_parts: 解析後的資料
@@ -599,52 +1175,67 @@ def send_shift_request(data_parts, mode):
     if mode == 'G':
         # 代班: [被申請人, 申請日, collection_id, 服事種類, 申請人]
         respondent, apply_date, collection_id, serve_type, requester = data_parts
-        receiver_doc = db.collection("users").document(respondent).get()
-        if not receiver_doc.exists:
-            return TextSendMessage(text="該用戶不存在！")
-        receiver_id = receiver_doc.to_dict().get('lineId', '')
-        
-        shift_record = {
-            "狀態": '等待',
-            "種類": serve_type,
-            "collection": collection_id,
-            "申請人": requester,
-            "被申請人": respondent,
-            "申請日": apply_date,
-            "被申請日": 'none'
-        }
+        target_date = 'none'
         collection_name = get_serve_name_by_id(collection_id)
         request_text = f"{requester} 想要請你幫忙代班\n{apply_date[5:].replace('.', '/')} 的 {serve_type}\n({collection_name})\n是否同意代班?"
-        remind_msg = None
     else:
         # 調班: [被申請日, 被申請人, 申請日, collection_id, 服事種類, 申請人]
         target_date, respondent, apply_date, collection_id, serve_type, requester = data_parts
-        receiver_doc = db.collection("users").document(respondent).get()
-        if not receiver_doc.exists:
-            return TextSendMessage(text="該用戶不存在！")
-        receiver_id = receiver_doc.to_dict().get('lineId', '')
-        
-        shift_record = {
-            "狀態": '等待',
-            "種類": serve_type,
-            "collection": collection_id,
-            "申請人": requester,
-            "被申請人": respondent,
-            "申請日": apply_date,
-            "被申請日": target_date.replace('/', '.')
-        }
+        target_date = target_date.replace('/', '.')
         collection_name = get_serve_name_by_id(collection_id)
-        request_text = f"{requester} 想要用 {apply_date[5:].replace('.', '/')} 的 {serve_type}\n跟您換 {target_date[5:]}\n({collection_name})\n是否同意調班?"
-        remind_msg = remind_same_week_serve(respondent, apply_date, collection_id)
+        request_text = f"{requester} 想要用 {apply_date[5:].replace('.', '/')} 的 {serve_type}\n跟您換 {target_date[5:].replace('.', '/')}\n({collection_name})\n是否同意調班?"
+    
+    receiver_doc = firestore_get(db.collection("users").document(respondent))
+    if not receiver_doc.exists:
+        return TextSendMessage(text="該用戶不存在！")
+    receiver_data = receiver_doc.to_dict()
+    receiver_id = receiver_data.get('lineId', '')
     
     if not receiver_id:
         return TextSendMessage(text="該用戶還沒有註冊喔！快把系統分享給他吧！")
     
+    # 使用對方的 line_bot_id 發送（跨 Bot）
+    if not get_line_bot_api_for_user_data(receiver_data):
+        return TextSendMessage(text="該用戶尚未連線 LINE Bot，無法發送請求")
+    
+    shift_record = {
+        "狀態": '等待',
+        "種類": serve_type,
+        "collection": collection_id,
+        "申請人": requester,
+        "被申請人": respondent,
+        "申請日": apply_date,
+        "被申請日": target_date
+    }
+    
+    # 先在本地產生記錄 ID（不需要 round trip），實際寫入在回覆後執行
+    case_ref = db.collection("_shift").document()
+    
+    # 記錄收到調班/代班請求
+    log_usage(respondent, '調班/代班請求')
+    
+    defer(push_shift_request, receiver_data.get('line_bot_id', 0), receiver_id, receiver_data, case_ref, shift_record, request_text)
+    
+    return TextSendMessage(text="已詢問對方，確定後會再通知您")
+
+
+def push_shift_request(receiver_bot_id, receiver_id, receiver_data, case_ref, shift_record, request_text):
+    """
+    儲存調班記錄並推播請求給對方（在回覆後的背景工作中執行）
+    
+    Args:
+        receiver_bot_id: 對方的 line_bot_id
+        receiver_id: 對方的 LINE ID
+        receiver_data: 對方的使用者資料
+        case_ref: 調班記錄的 DocumentReference
+        shift_record: 調班記錄
+        request_text: 請求文字
+    """
     # 儲存調班記錄
-    _, case_ref = db.collection("_shift").add(shift_record)
+    case_ref.set(shift_record)
     
     # 發送請求給對方
-    send_message = TemplateSendMessage(
+    messages = [TemplateSendMessage(
         alt_text='要調班/代班嗎?',
         template=ConfirmTemplate(
             text=request_text[:240],
@@ -653,22 +1244,17 @@ def send_shift_request(data_parts, mode):
                 PostbackTemplateAction(label='否', text='否', data=f'E&{case_ref.id}')
             ]
         )
-    )
-    
-    # 記錄收到調班/代班請求
-    log_usage(respondent, '調班/代班請求')
-    
-    # 使用對方的 line_bot_id 取得正確的 LineBotApi
-    receiver_bot_api = get_line_bot_api_for_user(respondent)
-    if not receiver_bot_api:
-        return TextSendMessage(text="該用戶尚未連線 LINE Bot，無法發送請求")
+    )]
     
-    if remind_msg:
-        receiver_bot_api.push_message(receiver_id, [send_message, TextSendMessage(text=remind_msg)])
-    else:
-        receiver_bot_api.push_message(receiver_id, send_message)
+    if shift_record['被申請日'] != 'none':
+        # 調班時提醒對方換班後那週的其他服事
+        remind_msg = remind_same_week_serve(
+            shift_record['被申請人'], shift_record['申請日'], shift_record['collection'], receiver_data
+        )
+        if remind_msg:
+            messages.append(TextSendMessage(text=remind_msg))
     
-    return TextSendMessage(text="已詢問對方，確定後會再通知您")
+    push_message(receiver_bot_id, receiver_id, messages if len(messages) > 1 else messages[0])
 
 
 def handle_shift_confirm(case_id):
@@ -681,7 +1267,7 @@ def handle_shift_confirm(case_id):
     Returns:
         LINE message 物件
     """
-    doc = db.collection("_shift").document(case_id).get()
+    doc = firestore_get(db.collection("_shift").document(case_id))
     if not doc.exists:
         return TextSendMessage(text="找不到這筆調班記錄")
     
@@ -694,7 +1280,11 @@ def handle_shift_confirm(case_id):
             template=ButtonsTemplate(
                 title=f'確定要{mode_text}嗎?',
                 text=f'不確定可以跳過，回到「是否同意{mode_text}」',
-                actions=[PostbackTemplateAction(label='確定', text='確定', data=f'F&{case_id}')]
+                # 一併帶入 collection 與日期，讓 F& 可以在同一次 get_all 讀取班表
+                actions=[PostbackTemplateAction(
+                    label='確定', text='確定',
+                    data=f"F&{case_id}|{data.get('collection', 'service')}|{data['申請日']}|{data['被申請日']}"
+                )]
             )
         )
     elif data["狀態"] == '拒絕':
@@ -703,6 +1293,99 @@ def handle_shift_confirm(case_id):
         return TextSendMessage(text=f"已成功{mode_text}過了")
 
 
+@firestore.transactional
+def transition_shift(transaction, case_id, accept, hint=None):
+    """
+    在 transaction 中進行調班記錄的狀態轉換（等待 → 成功 / 拒絕）
+    一次讀取調班記錄與相關班表、檢查條件，再一起寫入
+    重複點擊時會讀到已更新的狀態，因此不會重複執行
+    
+    Args:
+        transaction: Firestore transaction
+        case_id: 調班記錄 ID
+        accept: True 為執行調班/代班 (F&)，False 為拒絕 (E&)
+        hint: (collection_id, 申請日, 被申請日)，可與調班記錄在同一次讀取取得班表
+        
+    Returns:
+        tuple: (結果, 調班記錄 dict 或 None)
+            結果: 'not_found' / 'already_rejected' / 'already_done' / 'rejected'
+                  / 'no_apply_doc' / 'no_target_doc' / 'requester_moved' / 'respondent_moved' / 'success'
+    """
+    case_ref = db.collection("_shift").document(case_id)
+    refs = [case_ref]
+    if accept and hint:
+        hint_collection, hint_apply_date, hint_target_date = hint
+        refs.append(db.collection(hint_collection).document(hint_apply_date))
+        if hint_target_date != 'none':
+            refs.append(db.collection(hint_collection).document(hint_target_date))
+    
+    snapshots = firestore_get_all(refs, transaction=transaction)
+    case_doc = snapshots.get(case_ref.path)
+    if not case_doc or not case_doc.exists:
+        return 'not_found', None
+    
+    data = case_doc.to_dict()
+    if data["狀態"] == '拒絕':
+        return 'already_rejected', data
+    if data["狀態"] != '等待':
+        return 'already_done', data
+    
+    if not accept:
+        transaction.update(case_ref, {"狀態": '拒絕'})
+        return 'rejected', data
+    
+    collection_id = data.get('collection', 'service')  # 相容舊資料
+    serve_type = data['種類']
+    today = datetime.now().strftime("%Y.%m.%d")
+    
+    apply_ref = db.collection(collection_id).document(data['申請日'])
+    target_ref = db.collection(collection_id).document(data['被申請日']) if data['被申請日'] != 'none' else None
+    
+    # 舊的 F& 按鈕沒有 hint，或 hint 與記錄不符時，補讀班表
+    missing = [ref for ref in (apply_ref, target_ref) if ref is not None and ref.path not in snapshots]
+    if missing:
+        snapshots.update(firestore_get_all(missing, transaction=transaction))
+    
+    apply_doc = snapshots[apply_ref.path]
+    if not apply_doc.exists:
+        return 'no_apply_doc', data
+    apply_persons = apply_doc.to_dict().get(serve_type, [])
+    
+    # 檢查申請人是否還在申請日的服事中（直接檢查陣列）
+    if data['申請人'] not in apply_persons or data['申請日'] < today:
+        transaction.update(case_ref, {"狀態": '拒絕'})
+        return 'requester_moved', data
+    
+    new_apply = [data['被申請人'] if p == data['申請人'] else p for p in apply_persons]
+    
+    if target_ref is not None:
+        # 調班模式
+        target_doc = snapshots[target_ref.path]
+        if not target_doc.exists:
+            return 'no_target_doc', data
+        target_persons = target_doc.to_dict().get(serve_type, [])
+        
+        # 檢查被申請人是否還在被申請日的服事中（直接檢查陣列）
+        if data['被申請人'] not in target_persons or data['被申請日'] < today:
+            transaction.update(case_ref, {"狀態": '拒絕'})
+            return 'respondent_moved', data
+        
+        new_target = [data['申請人'] if p == data['被申請人'] else p for p in target_persons]
+        transaction.update(target_ref, {serve_type: new_target})
+    
+    transaction.update(apply_ref, {serve_type: new_apply})
+    transaction.update(case_ref, {"狀態": '成功'})
+    # 清除預先產生的當週班表，下次查詢時重新產生
+    transaction.delete(db.collection(CURRENT_WEEK).document(collection_id))
+    # 更新班表版本戳記，讓各 instance 的班表快取失效
+    transaction.set(
+        db.collection(collection_id).document("_metadata"),
+        {"updatedAt": firestore.SERVER_TIMESTAMP},
+        merge=True
+    )
+    return 'success', data
+
+
 def handle_shift_reject(case_id):
     """
     處理被申請人拒絕調班/代班
@@ -713,181 +1396,260 @@ def handle_shift_reject(case_id):
     Returns:
         LINE message 物件
     """
-    doc = db.collection("_shift").document(case_id).get()
-    if not doc.exists:
-        return TextSendMessage(text="找不到這筆調班記錄")
+    result, data = transition_shift(db.transaction(), case_id, False)
     
-    data = doc.to_dict()
-    
-    if data["狀態"] == '等待':
-        db.collection("_shift").document(case_id).update({"狀態": '拒絕'})
-        
-        # 通知申請人
-        requester_doc = db.collection("users").document(data['申請人']).get()
-        if requester_doc.exists:
-            requester_id = requester_doc.to_dict().get('lineId', '')
-            collection_name = get_serve_name_by_id(data.get('collection', ''))
-            
-            if data['被申請日'] == 'none':
-                notify_text = f"之前申請請 {data['被申請人']}\n代班 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n({collection_name})\n被對方「拒絕」\n請先跟對方私訊溝通好再申請，謝謝"
-            else:
-                notify_text = f"之前申請用 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n與 {data['被申請人']} 調班 {data['被申請日'][5:].replace('.', '/')}\n({collection_name})\n被對方「拒絕」\n請先跟對方私訊溝通好再申請，謝謝"
-            
-            if requester_id:
-                # 記錄調班/代班失敗通知
-                log_usage(data['申請人'], '調班/代班失敗通知')
-                # 使用申請人的 line_bot_id 取得正確的 LineBotApi
-                requester_bot_api = get_line_bot_api_for_user(data['申請人'])
-                if requester_bot_api:
-                    requester_bot_api.push_message(requester_id, TextSendMessage(text=notify_text))
-        
-        return TextSendMessage(text="已拒絕申請")
-    elif data["狀態"] == '拒絕':
+    if result == 'not_found':
+        return TextSendMessage(text="找不到這筆調班記錄")
+    if result == 'already_rejected':
         return TextSendMessage(text="已拒絕申請過了")
-    else:
+    if result == 'already_done':
         return TextSendMessage(text="已經調班/代班後不能更改")
+    
+    # 通知申請人（回覆後執行）
+    collection_name = get_serve_name_by_id(data.get('collection', ''))
+    if data['被申請日'] == 'none':
+        notify_text = f"之前申請請 {data['被申請人']}\n代班 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n({collection_name})\n被對方「拒絕」\n請先跟對方私訊溝通好再申請，謝謝"
+    else:
+        notify_text = f"之前申請用 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n與 {data['被申請人']} 調班 {data['被申請日'][5:].replace('.', '/')}\n({collection_name})\n被對方「拒絕」\n請先跟對方私訊溝通好再申請，謝謝"
+    defer(notify_requester, data['申請人'], notify_text, '調班/代班失敗通知')
+    
+    return TextSendMessage(text="已拒絕申請")
 
 
-def execute_shift(case_id):
+def execute_shift(case_id, hint=None):
     """
     執行調班/代班
     
     Args:
         case_id: 調班記錄 ID
+        hint: (collection_id, 申請日, 被申請日)，由 F& 按鈕帶入，舊按鈕為 None
         
     Returns:
         LINE message 物件
     """
-    doc = db.collection("_shift").document(case_id).get()
-    if not doc.exists:
-        return TextSendMessage(text="找不到這筆調班記錄")
+    result, data = transition_shift(db.transaction(), case_id, True, hint)
     
-    data = doc.to_dict()
-    
-    if data["狀態"] != '等待':
-        if data["狀態"] == '拒絕':
-            return TextSendMessage(text="已拒絕後不能更改")
+    if result == 'not_found':
+        return TextSendMessage(text="找不到這筆調班記錄")
+    if result == 'already_rejected':
+        return TextSendMessage(text="已拒絕後不能更改")
+    if result == 'already_done':
         return TextSendMessage(text="已成功調班過了")
+    if result == 'no_apply_doc':
+        return TextSendMessage(text="找不到申請日的服事資料")
+    if result == 'no_target_doc':
+        return TextSendMessage(text="找不到被申請日的服事資料")
+    if result == 'requester_moved':
+        notify_requester_failure(data, "因時間已過或你已經跟第三人調班了")
+        return TextSendMessage(text="你或對方已經跟第三人調班/代班了，此調班失敗")
+    if result == 'respondent_moved':
+        notify_requester_failure(data, "因對方已經跟第三人調班了")
+        return TextSendMessage(text="你或對方已經跟第三人調班/代班了，此調班失敗")
     
-    collection_id = data.get('collection', 'service')  # 相容舊資料
-    serve_type = data['種類']
-    today = datetime.now().strftime("%Y.%m.%d")
+    # 通知申請人成功，並更新受影響日期的提醒 outbox
+    notify_requester_success(data)
+    dates = [data['申請日']] + ([data['被申請日']] if data['被申請日'] != 'none' else [])
+    defer(refresh_reminder_entries, dates, [data['申請人'], data['被申請人']])
     
-    # 檢查並執行調班
-    apply_doc = db.collection(collection_id).document(data['申請日']).get()
-    if not apply_doc.exists:
-        return TextSendMessage(text="找不到申請日的服事資料")
+    return TextSendMessage(text="已成功調班/代班")
+
+
+def notify_requester(requester, notify_text, usage_type):
+    """
+    通知申請人（在回覆後的背景工作中執行）
+    申請人開啟收件匣（users.inbox_notices）時放進收件匣，否則使用申請人的 line_bot_id 推播
     
-    apply_data = apply_doc.to_dict()
-    apply_persons = apply_data.get(serve_type, [])
+    Args:
+        requester: 申請人名稱
+        notify_text: 通知文字
+        usage_type: 使用量統計的類型（只在實際推播時記錄，放進收件匣時記為「{類型}（收件匣）」）
+    """
+    requester_doc = firestore_get(db.collection("users").document(requester))
+    if not requester_doc.exists:
+        return
     
-    # 檢查申請人是否還在申請日的服事中（直接檢查陣列）
-    if data['申請人'] not in apply_persons or data['申請日'] < today:
-        db.collection("_shift").document(case_id).update({"狀態": '拒絕'})
-        notify_requester_failure(data, "因時間已過或你已經跟第三人調班了")
-        return TextSendMessage(text="你或對方已經跟第三人調班/代班了，此調班失敗")
+    requester_data = requester_doc.to_dict()
+    requester_id = requester_data.get('lineId', '')
+    if requester_id:
+        if INBOX_DEADLINE and requester_data.get('inbox_notices'):
+            # 不急的通知先放進收件匣，等申請人下次傳訊息時隨回覆送出
+            # push_quota_report 把原本的類型算成推播，收件匣另外記錄；逾期推播由 week_clock_alarm 記錄
+            log_usage(requester, f"{usage_type}{INBOX_USAGE_SUFFIX}")
+            queue_notice(requester, notify_text)
+        else:
+            log_usage(requester, usage_type)
+            push_message(requester_data.get('line_bot_id', 0), requester_id, TextSendMessage(text=notify_text))
+
+
+# =====================================================
+# 通知收件匣
+# =====================================================
+# _inbox/{userName} → { notices: [{ text, queuedAt }], deadline: 最早的期限 (epoch 秒) }
+# users/{userName}.inbox_pending 為待送通知數，使用者傳訊息時才需要讀取收件匣
+# 只有 users/{userName}.inbox_notices 為 true 的使用者使用收件匣，其他人的通知仍直接推播
+# 通知隨下一次回覆免費送出；超過期限仍未送出的由 week_clock_alarm 改用推播
+INBOX = "_inbox"
+INBOX_DEADLINE = 6 * 60 * 60  # 通知最多在收件匣等待的秒數，0 表示所有人都停用（直接推播）
+REPLY_MESSAGE_LIMIT = 5  # LINE 單次回覆最多 5 則訊息
+INBOX_USAGE_SUFFIX = "（收件匣）"  # 放進收件匣的通知在使用量統計中的類型後綴（不算推播）
+
+
+def queue_notice(user_name, notify_text):
+    """
+    把通知放進使用者的收件匣
     
-    if data['被申請日'] != 'none':
-        # 調班模式
-        target_doc = db.collection(collection_id).document(data['被申請日']).get()
-        if not target_doc.exists:
-            return TextSendMessage(text="找不到被申請日的服事資料")
-        
-        target_data = target_doc.to_dict()
-        target_persons = target_data.get(serve_type, [])
-        
-        # 檢查被申請人是否還在被申請日的服事中（直接檢查陣列）
-        if data['被申請人'] not in target_persons or data['被申請日'] < today:
-            db.collection("_shift").document(case_id).update({"狀態": '拒絕'})
-            notify_requester_failure(data, "因對方已經跟第三人調班了")
-            return TextSendMessage(text="你或對方已經跟第三人調班/代班了，此調班失敗")
-        
-        # 執行調班
-        new_apply = [data['被申請人'] if p == data['申請人'] else p for p in apply_persons]
-        new_target = [data['申請人'] if p == data['被申請人'] else p for p in target_persons]
+    Args:
+        user_name: 使用者名稱
+        notify_text: 通知文字
+    """
+    now = time.time()
+    batch = db.batch()
+    batch.set(db.collection(INBOX).document(user_name), {
+        "notices": firestore.ArrayUnion([{"text": notify_text, "queuedAt": now}]),
+        "deadline": firestore.Minimum(now + INBOX_DEADLINE),
+    }, merge=True)
+    batch.update(db.collection("users").document(user_name), {"inbox_pending": firestore.Increment(1)})
+    batch.commit()
+
+
+@firestore.transactional
+def claim_notices(transaction, user_name, limit):
+    """
+    從收件匣取出最多 limit 則通知（在 transaction 中，避免與逾期推播重複送出）
+    
+    Args:
+        transaction: Firestore transaction
+        user_name: 使用者名稱
+        limit: 最多取出幾則
         
-        db.collection(collection_id).document(data['申請日']).update({serve_type: new_apply})
-        db.collection(collection_id).document(data['被申請日']).update({serve_type: new_target})
-    else:
-        # 代班模式
-        new_apply = [data['被申請人'] if p == data['申請人'] else p for p in apply_persons]
-        db.collection(collection_id).document(data['申請日']).update({serve_type: new_apply})
+    Returns:
+        list: 通知列表 [{ text, queuedAt }, ...]（依加入順序）
+    """
+    inbox_ref = db.collection(INBOX).document(user_name)
+    user_ref = db.collection("users").document(user_name)
+    inbox_doc = firestore_get_all([inbox_ref], transaction=transaction)[inbox_ref.path]
     
-    # 更新狀態
-    db.collection("_shift").document(case_id).update({"狀態": '成功'})
+    notices = sorted(inbox_doc.to_dict().get('notices', []), key=lambda notice: notice.get('queuedAt', 0)) \
+        if inbox_doc.exists else []
+    taken, remaining = notices[:limit], notices[limit:]
     
-    # 通知申請人成功
-    notify_requester_success(data)
+    if remaining:
+        # 期限改為剩下通知中最早的一則，不沿用已送出通知的期限
+        deadline = min(notice.get('queuedAt', 0) for notice in remaining) + INBOX_DEADLINE
+        transaction.update(inbox_ref, {"notices": remaining, "deadline": deadline})
+    elif inbox_doc.exists:
+        transaction.delete(inbox_ref)
+    transaction.update(user_ref, {"inbox_pending": len(remaining) if remaining else firestore.DELETE_FIELD})
+    return taken
+
+
+def restore_notices(user_name, notices):
+    """
+    回覆失敗時把取出的通知放回收件匣（保留原本的 queuedAt 與期限）
     
-    return TextSendMessage(text="已成功調班/代班")
+    Args:
+        user_name: 使用者名稱
+        notices: claim_notices 取出的通知列表
+    """
+    batch = db.batch()
+    batch.set(db.collection(INBOX).document(user_name), {
+        "notices": firestore.ArrayUnion(notices),
+        "deadline": firestore.Minimum(min(notice.get('queuedAt', 0) for notice in notices) + INBOX_DEADLINE),
+    }, merge=True)
+    batch.update(db.collection("users").document(user_name), {"inbox_pending": firestore.Increment(len(notices))})
+    batch.commit()
+
+
+def reply_with_notices(event, ctx, messages):
+    """
+    回覆訊息，並在還有空間時附上使用者收件匣中的通知（回覆不佔推播額度）
+    只在此事件已查詢過使用者時檢查，不會為了收件匣多讀一次使用者資料
+    
+    Args:
+        event: LINE webhook 事件
+        ctx: 此事件的 EventContext
+        messages: 訊息物件或訊息列表
+    """
+    messages = list(messages) if isinstance(messages, (list, tuple)) else [messages]
+    notices = []
+    
+    if ctx.user_loaded and ctx.user_data and ctx.user_data.get('inbox_pending') \
+            and len(messages) < REPLY_MESSAGE_LIMIT:
+        try:
+            notices = claim_notices(db.transaction(), ctx.user_name, REPLY_MESSAGE_LIMIT - len(messages))
+            messages += [TextSendMessage(text=notice['text']) for notice in notices]
+        except Exception as e:
+            print(f"inbox error: {e}")
+    
+    try:
+        get_line_bot_api(ctx.bot_id).reply_message(event.reply_token, messages)
+    except Exception:
+        # reply token 失效或 API 錯誤：通知沒有送出，放回收件匣
+        if notices:
+            try:
+                restore_notices(ctx.user_name, notices)
+            except Exception as e:
+                print(f"inbox restore error: {e}")
+        raise
 
 
 def notify_requester_success(data):
     """通知申請人調班成功"""
-    requester_doc = db.collection("users").document(data['申請人']).get()
-    if requester_doc.exists:
-        requester_id = requester_doc.to_dict().get('lineId', '')
-        collection_name = get_serve_name_by_id(data.get('collection', ''))
-        
-        if data['被申請日'] == 'none':
-            notify_text = f"之前申請請 {data['被申請人']} 代班\n{data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n({collection_name})\n「已成功代班」"
-        else:
-            notify_text = f"之前申請用 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n與 {data['被申請人']} 調班 {data['被申請日'][5:].replace('.', '/')}\n({collection_name})\n「已成功調班」"
-        
-        if requester_id:
-            # 記錄調班/代班成功通知
-            log_usage(data['申請人'], '調班/代班成功通知')
-            # 使用申請人的 line_bot_id 取得正確的 LineBotApi
-            requester_bot_api = get_line_bot_api_for_user(data['申請人'])
-            if requester_bot_api:
-                requester_bot_api.push_message(requester_id, TextSendMessage(text=notify_text))
+    collection_name = get_serve_name_by_id(data.get('collection', ''))
+    
+    if data['被申請日'] == 'none':
+        notify_text = f"之前申請請 {data['被申請人']} 代班\n{data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n({collection_name})\n「已成功代班」"
+    else:
+        notify_text = f"之前申請用 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n與 {data['被申請人']} 調班 {data['被申請日'][5:].replace('.', '/')}\n({collection_name})\n「已成功調班」"
+    
+    defer(notify_requester, data['申請人'], notify_text, '調班/代班成功通知')
 
 
 def notify_requester_failure(data, reason):
     """通知申請人調班失敗"""
-    requester_doc = db.collection("users").document(data['申請人']).get()
-    if requester_doc.exists:
-        requester_id = requester_doc.to_dict().get('lineId', '')
-        collection_name = get_serve_name_by_id(data.get('collection', ''))
-        
-        if data['被申請日'] == 'none':
-            notify_text = f"之前申請請 {data['被申請人']} 代班\n{data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n({collection_name})\n{reason}\n「代班失敗」"
-        else:
-            notify_text = f"之前申請用 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n與 {data['被申請人']} 調班 {data['被申請日'][5:].replace('.', '/')}\n({collection_name})\n{reason}\n「調班失敗」"
-        
-        if requester_id:
-            # 記錄調班/代班失敗通知
-            log_usage(data['申請人'], '調班/代班失敗通知')
-            # 使用申請人的 line_bot_id 取得正確的 LineBotApi
-            requester_bot_api = get_line_bot_api_for_user(data['申請人'])
-            if requester_bot_api:
-                requester_bot_api.push_message(requester_id, TextSendMessage(text=notify_text))
+    collection_name = get_serve_name_by_id(data.get('collection', ''))
+    
+    if data['被申請日'] == 'none':
+        notify_text = f"之前申請請 {data['被申請人']} 代班\n{data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n({collection_name})\n{reason}\n「代班失敗」"
+    else:
+        notify_text = f"之前申請用 {data['申請日'][5:].replace('.', '/')} 的 {data['種類']}\n與 {data['被申請人']} 調班 {data['被申請日'][5:].replace('.', '/')}\n({collection_name})\n{reason}\n「調班失敗」"
+    
+    defer(notify_requester, data['申請人'], notify_text, '調班/代班失敗通知')
 
 
-def remind_same_week_serve(user_name, date, exclude_collection=None):
+def remind_same_week_serve(user_name, date, exclude_collection=None, user_data=None):
     """
     提醒使用者該週還有其他服事
+    只讀取使用者參與的崇拜該日期的文件，且只取回他的服事項目欄位
     
     Args:
         user_name: 使用者名稱
         date: 日期 (格式: YYYY.MM.DD)
         exclude_collection: 要排除的 collection ID
+        user_data: 已取得的使用者資料，None 時從 Firestore 讀取（只取 serve_types）
         
     Returns:
         str or None: 提醒訊息，如果沒有則返回 None
     """
-    user_doc = db.collection("users").document(user_name).get()
-    if not user_doc.exists:
-        return None
+    if user_data is None:
+        user_ref = db.collection("users").document(user_name)
+        user_doc = firestore_get_all([user_ref], ['serve_types']).get(user_ref.path)
+        if not user_doc or not user_doc.exists:
+            return None
+        user_data = user_doc.to_dict()
+    
+    serve_types = user_data.get('serve_types', {})
+    field_paths = sorted({serve for serves in serve_types.values() for serve in serves})
+    snapshots = firestore_get_all(
+        [db.collection(collection_id).document(date) for collection_id in serve_types],
+        field_paths
+    )
     
-    user_data = user_doc.to_dict()
     remind_list = []
     
-    serve_types = user_data.get('serve_types', {})
     for collection_id, serves in serve_types.items():
-        # 直接取得該日期的文件
-        doc = db.collection(collection_id).document(date).get()
-        if not doc.exists:
+        doc = snapshots.get(db.collection(collection_id).document(date).path)
+        if not doc or not doc.exists:
             continue
         
         doc_data = doc.to_dict()
@@ -945,18 +1707,32 @@ def handle_two_person_shift(data_parts):
 # 提醒設定功能
 # =====================================================
 
-def change_reminder_day(command, line_id):
+def alarm_days_of(alarm_type):
+    """
+    將 alarm_type 轉成 alarm_days
+    會複製到提醒 outbox（_reminders）的收件者資料中，提醒程式以此篩選當天要提醒的使用者
+    
+    Args:
+        alarm_type: [週一, ..., 週六] 布林陣列
+        
+    Returns:
+        list: 要提醒的星期（datetime.weekday()，週一=0）
+    """
+    return [day for day, enabled in enumerate(alarm_type) if enabled]
+
+
+def change_reminder_day(command, ctx):
     """
     更改服事提醒日期設定
     
     Args:
         command: 指令 (格式: C*{1-6}{t/f})
-        line_id: LINE 使用者 ID
+        ctx: 此事件的 EventContext
         
     Returns:
         LINE message 物件
     """
-    user_name, user_data = get_user_by_line_id(line_id)
+    user_name, user_data = ctx.load_user()
     if not user_data:
         return TextSendMessage(text="找不到使用者資料")
     
@@ -964,7 +1740,12 @@ def change_reminder_day(command, line_id):
     day_index = int(command[2:3]) - 1
     settings[day_index] = command[3:4] == 't'
     
-    db.collection("users").document(user_name).update({"alarm_type": settings})
+    alarm_days = alarm_days_of(settings)
+    db.collection("users").document(user_name).update({
+        "alarm_type": settings,
+        "alarm_days": alarm_days
+    })
+    defer(sync_user_reminders, user_name, {"alarm_days": alarm_days})
     
     days = ['週一', '週二', '週三', '週四', '週五', '週六']
     active_days = [days[i] for i, v in enumerate(settings) if v]
@@ -977,17 +1758,123 @@ def change_reminder_day(command, line_id):
     return TextSendMessage(text=return_msg)
 
 
+# =====================================================
+# 服事提醒 outbox
+# =====================================================
+# _reminders/{YYYY.MM.DD} → { recipients: { userName: { lineId, line_bot_id, alarm_days, serves } } }
+# 由 week_clock_alarm 在缺少時整份產生；這裡只負責局部更新：
+#   - 調班成功：重新計算雙方在該日期的服事
+#   - 設定提醒 / 登入：更新之後各日期中該使用者的 alarm_days、lineId、line_bot_id
+# schedule-app 修改班表時會刪除該日期的 outbox，由提醒程式重新產生
+REMINDERS = "_reminders"
+
+
+def get_user_reminder_serves(user_name, date, schedule_docs):
+    """
+    整理使用者某日期在所有崇拜的服事（格式與 week_clock_alarm 相同）
+    
+    Args:
+        user_name: 使用者名稱
+        date: 日期 (YYYY.MM.DD)
+        schedule_docs: firestore_get_all 取得的班表 { 文件路徑: DocumentSnapshot }
+        
+    Returns:
+        list: ["🎸 青年崇拜-主領", ...]
+    """
+    serves = []
+    for serve_info in get_serve_list():
+        collection_id = serve_info.get('id')
+        schedule_doc = schedule_docs.get(db.collection(collection_id).document(date).path)
+        if not schedule_doc or not schedule_doc.exists:
+            continue
+        display_name = get_serve_name_by_id(collection_id).strip()
+        for serve_type, persons in schedule_doc.to_dict().items():
+            if isinstance(persons, list) and user_name in persons:
+                serves.append(f"{display_name}-{serve_type}")
+    return serves
+
+
+def refresh_reminder_entries(dates, user_names):
+    """
+    重新計算 outbox 中指定使用者在指定日期的提醒項目（調班成功後呼叫）
+    尚未產生 outbox 的日期不處理，提醒程式產生時自然會是最新的班表
+    
+    Args:
+        dates: 日期列表 (YYYY.MM.DD)
+        user_names: 使用者名稱列表
+    """
+    outbox_docs = firestore_get_all([db.collection(REMINDERS).document(date) for date in dates])
+    dates = [date for date in dates if outbox_docs[db.collection(REMINDERS).document(date).path].exists]
+    if not dates:
+        return
+    
+    schedule_docs = firestore_get_all([
+        db.collection(serve_info.get('id')).document(date)
+        for serve_info in get_serve_list() for date in dates
+    ])
+    user_docs = firestore_get_all(
+        [db.collection("users").document(user_name) for user_name in user_names],
+        ['lineId', 'line_bot_id', 'alarm_days']
+    )
+    
+    batch = db.batch()
+    for date in dates:
+        updates = {}
+        for user_name in user_names:
+            field = FieldPath('recipients', user_name).to_api_repr()
+            user_doc = user_docs[db.collection("users").document(user_name).path]
+            serves = get_user_reminder_serves(user_name, date, schedule_docs)
+            if user_doc.exists and serves:
+                user_data = user_doc.to_dict()
+                updates[field] = {
+                    "lineId": user_data.get('lineId', ''),
+                    "line_bot_id": user_data.get('line_bot_id', 0),
+                    "alarm_days": user_data.get('alarm_days', []),
+                    "serves": serves,
+                }
+            else:
+                updates[field] = firestore.DELETE_FIELD
+        batch.update(db.collection(REMINDERS).document(date), updates)
+    batch.commit()
+
+
+def sync_user_reminders(user_name, fields):
+    """
+    更新今天之後所有 outbox 中該使用者的欄位（提醒設定、LINE 綁定變更時呼叫）
+    
+    Args:
+        user_name: 使用者名稱
+        fields: 要更新的欄位，如 { "alarm_days": [0, 3] }
+    """
+    today = datetime.now().strftime("%Y.%m.%d")
+    outbox_docs = firestore_get(db.collection(REMINDERS)
+        .where("__name__", ">=", db.collection(REMINDERS).document(today)))
+    
+    batch = db.batch()
+    pending = 0
+    for outbox_doc in outbox_docs:
+        if user_name not in (outbox_doc.to_dict().get('recipients') or {}):
+            continue
+        batch.update(outbox_doc.reference, {
+            FieldPath('recipients', user_name, field).to_api_repr(): value
+            for field, value in fields.items()
+        })
+        pending += 1
+    if pending:
+        batch.commit()
+
+
 # =====================================================
 # 班表查詢功能
 # =====================================================
 
-def get_week_schedule_text(line_id, collection_id=None):
+def get_week_schedule_text(ctx, collection_id=None):
     """
     取得當週班表文字
     若用戶有多個崇拜的服事，則顯示選擇選單
     
     Args:
-        line_id: LINE 使用者 ID
+        ctx: 此事件的 EventContext
         collection_id: 崇拜 collection ID，若為 None 則自動判斷
         
     Returns:
@@ -998,7 +1885,7 @@ def get_week_schedule_text(line_id, collection_id=None):
         return build_schedule_message(collection_id)
     
     # 取得使用者資料，判斷參與幾個崇拜
-    user_name, user_data = get_user_by_line_id(line_id)
+    user_name, user_data = ctx.load_user()
     if not user_data:
         # 未登入的用戶，顯示第一個崇拜
         serves = get_serve_list()
@@ -1072,66 +1959,107 @@ def build_schedule_selection_menu(collection_ids):
     )
 
 
-def build_schedule_message(collection_id):
+# 當週班表的預先產生結果：_current_week/{collection_id} → { date, body, checkedOn }
+# 修改班表或服事項目時會刪除此文件，過了該週日後也會自動重新產生
+# 沒有未來的班表時 date 是最新一筆（已過去）的日期，checkedOn 記錄檢查的日期，同一天內不再重新產生
+CURRENT_WEEK = "_current_week"
+
+
+@firestore.transactional
+def refresh_current_week(transaction, collection_id):
     """
-    建立單一崇拜的班表訊息
+    重新產生並儲存崇拜的當週班表內容
+    在 transaction 中讀取 _metadata 與班表再寫入：調班與 schedule-app 修改班表時會寫入 _metadata.updatedAt
+    並刪除 _current_week，兩者同時發生時這裡會重試，不會把修改前的班表寫回去
     
     Args:
+        transaction: Firestore transaction
         collection_id: 崇拜 collection ID
         
     Returns:
-        LINE TextSendMessage 物件
+        tuple: ({ date, body }, None) 或 (None, 錯誤訊息)
     """
     # 取得服事項目順序
-    service_items = get_service_items(collection_id)
+    metadata_doc = firestore_get(db.collection(collection_id).document("_metadata"), transaction)
+    service_items = metadata_doc.to_dict().get('serviceItems', []) if metadata_doc.exists else []
     if not service_items:
-        return TextSendMessage(text="找不到服事項目資料")
+        return None, "找不到服事項目資料"
     
-    # 取得當週班表
+    # 取得今天及之後的第一筆班表（_metadata 排在日期之後，所以多取一筆）
     today = datetime.now().strftime("%Y.%m.%d")
-    docs = db.collection(collection_id).order_by("__name__").limit(5).get()
-    
-    schedule_doc = None
-    for doc in docs:
-        if doc.id != '_metadata' and doc.id >= today:
-            schedule_doc = doc
-            break
-    
+    collection_ref = db.collection(collection_id)
+    docs = firestore_get(collection_ref
+        .where("__name__", ">=", collection_ref.document(today))
+        .order_by("__name__")
+        .limit(2), transaction)
+    schedule_doc = next((doc for doc in docs if doc.id != '_metadata'), None)
+    
+    checked_on = None
     if not schedule_doc:
-        # 取最新的一筆
-        for doc in docs:
-            if doc.id != '_metadata':
-                schedule_doc = doc
-                break
+        # 沒有未來的班表，取最新的一筆，並記錄今天已經檢查過
+        checked_on = today
+        docs = firestore_get(collection_ref
+            .where("__name__", "<", collection_ref.document(today))
+            .order_by("__name__", direction=firestore.Query.DESCENDING)
+            .limit(1), transaction)
+        schedule_doc = docs[0] if docs else None
     
     if not schedule_doc:
-        return TextSendMessage(text="找不到班表資料")
+        return None, "找不到班表資料"
     
     data = schedule_doc.to_dict()
-    collection_name = get_serve_name_by_id(collection_id)
-    
-    text = f"{collection_name}\n{schedule_doc.id.replace('.', '/')} 的服事\n\n"
-    
+    body = ""
     for item in service_items:
         persons = data.get(item, [])
         if isinstance(persons, list):
             persons = '/'.join(persons) if persons else '-'
-        text += f"{item}：{persons}\n"
+        body += f"{item}：{persons}\n"
+    
+    current = {"date": schedule_doc.id, "body": body}
+    if checked_on:
+        current["checkedOn"] = checked_on
+    transaction.set(db.collection(CURRENT_WEEK).document(collection_id), current)
+    return current, None
+
+
+def build_schedule_message(collection_id):
+    """
+    建立單一崇拜的班表訊息
+    優先使用預先產生的 _current_week，只需讀取一份文件
+    
+    Args:
+        collection_id: 崇拜 collection ID
+        
+    Returns:
+        LINE TextSendMessage 物件
+    """
+    today = datetime.now().strftime("%Y.%m.%d")
+    current_doc = firestore_get(db.collection(CURRENT_WEEK).document(collection_id))
+    current = current_doc.to_dict() if current_doc.exists else None
+    
+    if not current or (current.get('date', '') < today and current.get('checkedOn') != today):
+        # 尚未產生、已被修改班表清除，或已過了該週日（今天已確認沒有未來班表時不再重新產生）
+        current, error = refresh_current_week(db.transaction(), collection_id)
+        if error:
+            return TextSendMessage(text=error)
+    
+    collection_name = get_serve_name_by_id(collection_id)
+    text = f"{collection_name}\n{current['date'].replace('.', '/')} 的服事\n\n{current['body']}"
     
     return TextSendMessage(text=text.strip())
 
 
-def get_full_schedule_link(line_id):
+def get_full_schedule_link(ctx):
     """
     取得完整班表連結
     
     Args:
-        line_id: LINE 使用者 ID
+        ctx: 此事件的 EventContext
         
     Returns:
         LINE message 物件
     """
-    user_name, _ = get_user_by_line_id(line_id)
+    user_name = ctx.user_name
     if user_name:
         return TextSendMessage(
             text=f"請點選連結（這是永久連結，可以用 Google Chrome 開）\nhttps://bol-line-bot-3.web.app/?user={user_name}"
@@ -1149,16 +2077,483 @@ introMessage = TextSendMessage(text='介紹影片：\nhttps://youtu.be/xrBvmTZbi
 errorMessage = TextSendMessage(text='哦，這超出我的能力範圍......')
 
 
-def alarmMessage():
-    """取得提醒設定 Flex Message"""
-    from week_alarm import alarm
-    return FlexSendMessage(alt_text='提醒設定', contents=alarm)
+alarmMessage = FlexSendMessage(alt_text='提醒設定', contents=alarm)
+menuMessage = FlexSendMessage(alt_text='目錄', contents=menu)
+
+
+# =====================================================
+# 事件排程（同一位使用者依序、不同使用者並行）
+# =====================================================
+# LINE 可能把多個事件放在同一個 webhook 請求中；依序處理時，
+# 不同使用者的事件會互相等待 Firestore 與 LINE API 的往返
+
+EVENT_WORKERS = 8
+
+
+class EventScheduler:
+    """
+    把同一個 webhook 請求中的事件依來源分組：
+    同一個 source（使用者 / 群組）的事件依原本順序處理，不同來源的事件在執行緒池中並行
+    """
+    
+    def __init__(self, workers=EVENT_WORKERS, dispatch=dispatch_event):
+        """
+        Args:
+            workers: 同時處理的來源數，1 表示全部依序處理
+            dispatch: 處理單一事件的函數
+        """
+        self.workers = workers
+        self.dispatch = dispatch
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='event') if workers > 1 else None
+    
+    @staticmethod
+    def source_key(event, index):
+        """事件的排序單位：使用者 / 群組 / 聊天室 ID，沒有來源時每個事件各自一組"""
+        source = getattr(event, 'source', None)
+        for attr in ('user_id', 'group_id', 'room_id'):
+            source_id = getattr(source, attr, None)
+            if source_id:
+                return source_id
+        return f"#{index}"
+    
+    def group_events(self, events):
+        """
+        依來源分組並保留各組內的順序
+        
+        Returns:
+            list: [[event, ...], ...]，依各來源第一個事件出現的順序
+        """
+        groups = {}
+        for index, event in enumerate(events):
+            groups.setdefault(self.source_key(event, index), []).append(event)
+        return list(groups.values())
+    
+    def run_group(self, events):
+        """
+        依序處理同一來源的事件，單一事件失敗不影響後面的事件
+        
+        Returns:
+            int: 失敗的事件數
+        """
+        failed = 0
+        for event in events:
+            try:
+                self.dispatch(event)
+            except Exception as e:
+                failed += 1
+                print(f"[event] {type(event).__name__} 處理失敗: {e}")
+        return failed
+    
+    def run(self, events):
+        """
+        處理所有事件，等全部完成後才返回
+        
+        Args:
+            events: LINE webhook 事件列表
+            
+        Returns:
+            int: 失敗的事件數
+        """
+        groups = self.group_events(events)
+        if self.executor is None or len(groups) <= 1:
+            return sum(self.run_group(group) for group in groups)
+        
+        # copy_context 讓工作執行緒沿用此請求的 bot 設定
+        futures = [self.executor.submit(copy_context().run, self.run_group, group) for group in groups]
+        return sum(future.result() for future in futures)
+
+
+event_scheduler = EventScheduler()
+
+
+# =====================================================
+# Webhook 事件去重
+# =====================================================
+# 回應太慢時 LINE 會重送事件（deliveryContext.isRedelivery = true，webhookEventId 不變），
+# 重複處理會再建立一次 _shift 並再推播一次，因此處理前先依 webhookEventId 去重：
+#   1. instance 內的 LRU（同一個 instance 收到的重送不需要任何 RPC）
+#   2. _webhook_events/{webhookEventId} → { expireAt }（跨 instance；需在 expireAt 欄位設定 Firestore TTL 政策）
+# 只有重複處理會造成影響的事件（SIDE_EFFECT_POSTBACKS 與邀請碼登入）才寫入 Firestore 記錄，
+# 其他事件（選單、查詢）重複處理只是多回覆一次，只用 LRU 去重，不增加寫入
+# 第一次送達的事件在背景寫入記錄；重送的事件以 create() 同步寫入，已存在表示處理過，直接丟棄
+# 丟棄的次數累加到 _webhook_stats/{YYYY.MM.DD}.dropped
+
+WEBHOOK_EVENTS = "_webhook_events"
+WEBHOOK_STATS = "_webhook_stats"
+WEBHOOK_EVENT_TTL = timedelta(days=3)  # LINE 重送的期限遠小於此
+WEBHOOK_EVENT_LRU_SIZE = 2048
+# 會寫入 _shift / 班表 / 使用者設定或推播的 postback：發送調班/代班請求、拒絕、執行調班、更改提醒設定
+SIDE_EFFECT_POSTBACKS = ('C&', 'G&', 'E&', 'F&', 'C*')
+
+_seen_event_ids = OrderedDict()
+_seen_event_lock = threading.Lock()
+_dropped_event_count = 0
+
+
+def remember_event_id(event_id):
+    """
+    把 webhookEventId 加入 LRU
+    
+    Returns:
+        bool: 之前已經在 LRU 中時為 True
+    """
+    with _seen_event_lock:
+        if event_id in _seen_event_ids:
+            _seen_event_ids.move_to_end(event_id)
+            return True
+        _seen_event_ids[event_id] = True
+        if len(_seen_event_ids) > WEBHOOK_EVENT_LRU_SIZE:
+            _seen_event_ids.popitem(last=False)
+        return False
+
+
+def record_event_id(event_id):
+    """
+    在 Firestore 建立事件記錄
+    
+    Returns:
+        bool: 記錄已存在（事件處理過）時為 True
+    """
+    try:
+        db.collection(WEBHOOK_EVENTS).document(event_id).create({
+            "expireAt": datetime.now() + WEBHOOK_EVENT_TTL,
+        })
+        return False
+    except AlreadyExists:
+        return True
+
+
+def has_side_effects(event):
+    """
+    事件重複處理時是否會重複寫入或推播（需要跨 instance 去重）
+    
+    Args:
+        event: LINE webhook 事件
+        
+    Returns:
+        bool: SIDE_EFFECT_POSTBACKS 的 postback 或邀請碼登入的訊息時為 True
+    """
+    if isinstance(event, PostbackEvent):
+        return event.postback.data[:2] in SIDE_EFFECT_POSTBACKS
+    if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+        # 與 handle_message 判斷邀請碼的條件相同
+        command = event.message.text.strip()
+        return len(command) == 16 and command.isalnum()
+    return False
+
+
+def is_duplicate_event(event):
+    """
+    判斷事件是否已經處理過，並記錄此事件
+    
+    Args:
+        event: LINE webhook 事件
+        
+    Returns:
+        bool: 已處理過（應丟棄）時為 True
+    """
+    event_id = getattr(event, 'webhook_event_id', None)
+    if not event_id:
+        return False
+    if remember_event_id(event_id):
+        return True
+    if not has_side_effects(event):
+        return False
+    
+    delivery_context = getattr(event, 'delivery_context', None)
+    if getattr(delivery_context, 'is_redelivery', False):
+        # 重送：可能已由其他 instance 處理過，必須先確認
+        try:
+            return record_event_id(event_id)
+        except Exception as e:
+            print(f"[dedup] 事件記錄失敗: {e}")
+            return False
+    
+    # 第一次送達：不必等待，在背景寫入記錄供之後的重送比對
+    future = _background_executor.submit(record_event_id, event_id)
+    with _background_lock:
+        _background_futures.append(future)
+    return False
+
+
+def drop_duplicate_events(events):
+    """
+    移除已經處理過的事件，並累加丟棄次數
+    
+    Args:
+        events: LINE webhook 事件列表
+        
+    Returns:
+        list: 尚未處理過的事件
+    """
+    global _dropped_event_count
+    fresh = [event for event in events if not is_duplicate_event(event)]
+    dropped = len(events) - len(fresh)
+    if dropped:
+        with _seen_event_lock:
+            _dropped_event_count += dropped
+        print(f"[dedup] dropped={dropped} total={_dropped_event_count}")
+        # 統計不影響處理，在背景寫入，重送大量湧入時不拖慢 webhook
+        future = _background_executor.submit(record_dropped_events, dropped)
+        with _background_lock:
+            _background_futures.append(future)
+    return fresh
+
+
+def record_dropped_events(dropped):
+    """把丟棄的重複事件數累加到 _webhook_stats/{今天}"""
+    try:
+        db.collection(WEBHOOK_STATS).document(datetime.now().strftime("%Y.%m.%d")).set(
+            {"dropped": firestore.Increment(dropped)}, merge=True
+        )
+    except Exception as e:
+        print(f"[dedup] 統計寫入失敗: {e}")
+
+
+def get_dropped_event_count():
+    """此 instance 啟動後丟棄的重複事件數（各日總數見 _webhook_stats）"""
+    return _dropped_event_count
+
+
+# =====================================================
+# 快速回應模式（先排入佇列，再由 worker 處理）
+# =====================================================
+# FAST_ACK = True 時，lineWebhook 驗證簽章後只把原始請求放進佇列就回應，
+# 不必等 Firestore 與 LINE API，由 worker（eventWorker 或 event_worker.py）取出處理
+# （仍使用事件的 reply token 回覆，需在 token 失效前處理）
+#
+# 內建的 SQLiteEventQueue / MemoryEventQueue 只存在 instance 本機（instance_local = True），
+# 其他 instance 與其他 function 看不到，instance 回收時也會消失，而 LINE 已收到 200 不會重送，
+# 所以部署在 Cloud Functions / Cloud Run 時，只有以 set_event_queue 指定共用的佇列（Pub/Sub、Cloud Tasks 等）才會啟用
+
+FAST_ACK = False
+EVENT_QUEUE_PATH = '/tmp/line_events.sqlite3'
+EVENT_QUEUE_VISIBILITY = 60  # 取出後超過此秒數仍未完成，視為 worker 中斷，可被重新取出
+EVENT_QUEUE_BATCH = 20  # worker 每次取出的請求數
+
+
+class SQLiteEventQueue:
+    """
+    以 SQLite 檔案保存的 webhook 請求佇列，webhook 與 worker 可以是不同 process
+    每筆為一個已驗證簽章的原始請求 (bot_id, body, signature)
+    """
+    
+    instance_local = True  # 檔案在 instance 本機，部署環境中不能使用
+    
+    def __init__(self, path=EVENT_QUEUE_PATH, visibility=EVENT_QUEUE_VISIBILITY):
+        self.path = path
+        self.visibility = visibility
+        self.local = threading.local()
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, bot_id INTEGER, body TEXT, signature TEXT, "
+                "queued_at REAL, claimed_at REAL)"
+            )
+    
+    def connect(self):
+        """取得此 thread 專用的連線"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=10)
+        return conn
+    
+    def put(self, bot_id, body, signature):
+        """加入一筆請求"""
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT INTO events (bot_id, body, signature, queued_at) VALUES (?, ?, ?, ?)",
+                (bot_id, body, signature, time.time())
+            )
+    
+    def claim(self, limit=EVENT_QUEUE_BATCH):
+        """
+        依加入順序取出最多 limit 筆尚未被取出（或取出後逾時）的請求
+        
+        Returns:
+            list: [(item_id, bot_id, body, signature), ...]
+        """
+        now = time.time()
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")  # 避免多個 worker 取到同一筆
+        try:
+            rows = conn.execute(
+                "SELECT id, bot_id, body, signature FROM events "
+                "WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                (now - self.visibility, limit)
+            ).fetchall()
+            conn.executemany("UPDATE events SET claimed_at = ? WHERE id = ?", [(now, row[0]) for row in rows])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return rows
+    
+    def ack(self, item_id):
+        """處理完成後刪除"""
+        with self.connect() as conn:
+            conn.execute("DELETE FROM events WHERE id = ?", (item_id,))
+    
+    def __len__(self):
+        return self.connect().execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+class MemoryEventQueue:
+    """
+    只存在記憶體中的佇列（與 SQLiteEventQueue 相同介面），webhook 與 worker 須在同一個 process
+    """
+    
+    instance_local = True
+    
+    def __init__(self):
+        self.items = deque()
+        self.claimed = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+    
+    def put(self, bot_id, body, signature):
+        with self.lock:
+            self.items.append((self.next_id, bot_id, body, signature))
+            self.next_id += 1
+    
+    def claim(self, limit=EVENT_QUEUE_BATCH):
+        with self.lock:
+            rows = [self.items.popleft() for _ in range(min(limit, len(self.items)))]
+            self.claimed.update((row[0], row) for row in rows)
+        return rows
+    
+    def ack(self, item_id):
+        with self.lock:
+            self.claimed.pop(item_id, None)
+    
+    def __len__(self):
+        with self.lock:
+            return len(self.items) + len(self.claimed)
+
+
+_event_queue = None
+_fast_ack_warned = False
 
 
-def menuMessage():
-    """取得目錄 Flex Message"""
-    from week_alarm import menu
-    return FlexSendMessage(alt_text='目錄', contents=menu)
+def running_on_cloud():
+    """是否部署在 Cloud Functions / Cloud Run（平台會設定 K_SERVICE 或 FUNCTION_NAME）"""
+    return bool(os.environ.get('K_SERVICE') or os.environ.get('FUNCTION_NAME'))
+
+
+def fast_ack_enabled():
+    """
+    FAST_ACK 是否生效：部署環境中目前的佇列只存在 instance 本機時不啟用，直接處理，避免已回應的事件遺失
+    
+    Returns:
+        bool: 是否先排入佇列再回應
+    """
+    global _fast_ack_warned
+    if not FAST_ACK:
+        return False
+    if running_on_cloud() and getattr(get_event_queue(), 'instance_local', False):
+        if not _fast_ack_warned:
+            print("[fast-ack] 部署環境中需以 set_event_queue 指定共用的佇列，目前改為直接處理")
+            _fast_ack_warned = True
+        return False
+    return True
+
+
+def get_event_queue():
+    """取得（必要時建立）webhook 請求佇列，預設為 EVENT_QUEUE_PATH 的 SQLite 佇列"""
+    global _event_queue
+    if _event_queue is None:
+        _event_queue = SQLiteEventQueue()
+    return _event_queue
+
+
+def set_event_queue(queue):
+    """
+    直接指定 webhook 請求佇列（共用佇列、本地工具或 benchmark 用）
+    
+    Args:
+        queue: 至少實作 put(bot_id, body, signature)；由 process_queued_events 拉取時還需要 claim / ack，
+               推送型佇列（Pub/Sub push、Cloud Tasks）把 encode_queued_request 的內容送到 eventWorker 即可
+    """
+    global _event_queue
+    _event_queue = queue
+
+
+def process_queued_events(limit=EVENT_QUEUE_BATCH):
+    """
+    從佇列取出 webhook 請求並處理（event_worker.py 使用）
+    
+    Args:
+        limit: 最多處理幾筆請求
+        
+    Returns:
+        int: 處理的請求數
+    """
+    queue = get_event_queue()
+    rows = queue.claim(limit)
+    for item_id, bot_id, body, signature in rows:
+        try:
+            process_webhook(bot_id, body, signature)
+        finally:
+            # 失敗的請求不重試：reply token 很快就會失效，重做也無法回覆
+            queue.ack(item_id)
+    return len(rows)
+
+
+def encode_queued_request(bot_id, body, signature):
+    """
+    把一筆 webhook 請求轉成共用佇列的訊息內容（eventWorker 以 decode_queued_request 還原）
+    
+    Returns:
+        str: JSON 字串
+    """
+    return json.dumps({"bot_id": bot_id, "body": body, "signature": signature}, ensure_ascii=False)
+
+
+def decode_queued_request(payload):
+    """
+    從 worker 收到的 JSON 取出一筆 webhook 請求
+    
+    Args:
+        payload: encode_queued_request 的內容（Cloud Tasks），或 Pub/Sub push 的 { message: { data: base64 } }
+        
+    Returns:
+        tuple: (bot_id, body, signature)，payload 中沒有請求時為 None
+    """
+    if isinstance(payload, dict) and 'message' in payload:
+        data = payload['message'].get('data')
+        payload = json.loads(base64.b64decode(data)) if data else None
+    if not isinstance(payload, dict) or 'body' not in payload:
+        return None
+    return int(payload.get('bot_id', 0)), payload['body'], payload.get('signature', '')
+
+
+def eventWorker(request):
+    """
+    快速回應模式的 worker 進入點（HTTP 觸發）
+    - 推送型佇列（Pub/Sub push、Cloud Tasks）：body 中帶一筆請求，直接處理這一筆
+    - 其他情況（如由排程觸發）：以 process_queued_events 處理佇列中目前所有的請求
+    請求的簽章在 process_webhook 中會再以該 Bot 的 secret 驗證，偽造的內容不會被處理
+    
+    Returns:
+        str: 處理的請求數
+    """
+    item = decode_queued_request(request.get_json(silent=True))
+    if item is not None:
+        if item[0] not in parsers:
+            print(f"[fast-ack] 無效的 line_bot_id: {item[0]}")
+            return "0 processed"
+        process_webhook(*item)
+        return "1 processed"
+    
+    if not hasattr(get_event_queue(), 'claim'):
+        return "0 processed"  # 推送型佇列沒有可拉取的請求
+    processed = 0
+    while True:
+        count = process_queued_events()
+        if not count:
+            break
+        processed += count
+    return f"{processed} processed"
 
 
 # =====================================================
@@ -1167,7 +2562,8 @@ def menuMessage():
 
 def lineWebhook(request):
     """
-    LINE Webhook 進入點
+    LINE Webhook 進入點（所有 LINE Bot 共用）
+    各 Bot 的 Webhook URL 可設為 .../lineWebhook/{line_bot_id}，或共用同一個 URL 由 destination 判斷
     
     Args:
         request: HTTP request 物件
@@ -1178,79 +2574,135 @@ def lineWebhook(request):
     signature = request.headers.get('X-Line-Signature')
     body = request.get_data(as_text=True)
     
+    bot_id = resolve_bot_id(request.path, body, signature)
+    if bot_id is None:
+        print("Invalid signature. Please check your channel access token/channel secret.")
+        return '200 OK'
+    
+    if fast_ack_enabled():
+        # 簽章已驗證，排入佇列後立即回應，由 worker 處理
+        get_event_queue().put(bot_id, body, signature)
+        return '200 OK'
+    
+    process_webhook(bot_id, body, signature)
+    return '200 OK'
+
+
+def process_webhook(bot_id, body, signature):
+    """
+    處理一個 webhook 請求中的所有事件，並等待背景工作完成
+    
+    Args:
+        bot_id: 收到請求的 line_bot_id
+        body: 請求內容（文字）
+        signature: X-Line-Signature
+    """
+    token = _current_bot_id.set(bot_id)
     try:
-        handler.handle(body, signature)
+        event_scheduler.run(drop_duplicate_events(parsers[bot_id].parse(body, signature)))
     except InvalidSignatureError as e:
         print(e)
-    
-    return '200 OK'
+    finally:
+        _current_bot_id.reset(token)
+        # instance 在回應後會被凍結，先等背景工作完成
+        drain_background_tasks()
 
 
-@handler.add(FollowEvent)
+def with_event_context(func):
+    """
+    Webhook 事件處理函數的裝飾器
+    為每個事件建立 EventContext 並傳給處理函數
+    結束時印出回覆前的 Firestore 讀取次數，並啟動該事件的背景工作
+    """
+    def wrapper(event):
+        ctx = EventContext(event.source.user_id)
+        token = _current_event.set(ctx)
+        started = time.monotonic()
+        try:
+            return func(event, ctx)
+        finally:
+            _current_event.reset(token)
+            elapsed_ms = (time.monotonic() - started) * 1000
+            print(f"[{func.__name__}] reads={ctx.reads} queries={ctx.queries} time={elapsed_ms:.0f}ms")
+            # 回覆已送出，再執行推播、使用量統計等背景工作
+            start_background_tasks(ctx)
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+@add_event_handler(FollowEvent)
 def handle_follow(event):
     """處理使用者加入好友事件"""
     replyMessages = [welcomeMessage, loginMessage, introMessage]
-    line_bot_api.reply_message(event.reply_token, replyMessages)
+    get_line_bot_api(current_bot_id()).reply_message(event.reply_token, replyMessages)
 
 
-@handler.add(MessageEvent, message=TextMessage)
-def handle_message(event):
+@add_event_handler(MessageEvent, message=TextMessage)
+@with_event_context
+def handle_message(event, ctx):
     """處理使用者文字訊息"""
     line_id = event.source.user_id
     command = event.message.text.strip()
     
-    if is_signed_in(line_id):
+    if ctx.is_signed_in:
         # 已登入使用者
-        user_name, _ = get_user_by_line_id(line_id)
+        user_name = ctx.user_name
         
         if command in ['總班表', '全部班表']:
             log_usage(user_name, '全部班表')
-            replyMessages = get_full_schedule_link(line_id)
+            replyMessages = get_full_schedule_link(ctx)
         
         elif command in ['班表', '本週班表', '當週班表', '當周班表', '本周班表']:
             log_usage(user_name, '當週班表')
-            replyMessages = get_week_schedule_text(line_id)
+            replyMessages = get_week_schedule_text(ctx)
         
         elif command in ['換班', '調班']:
             log_usage(user_name, '換班')
-            replyMessages = can_shift(line_id, 'S')
+            replyMessages = can_shift(ctx, 'S')
         
         elif command in ['代班']:
             log_usage(user_name, '代班')
-            replyMessages = can_shift(line_id, 'G')
+            replyMessages = can_shift(ctx, 'G')
         
         elif command in ['設定提醒', '提醒設定', '設定']:
             log_usage(user_name, '設定提醒')
-            replyMessages = alarmMessage()
+            replyMessages = alarmMessage
         
         elif command in ['目錄', 'Menu', 'menu', '主選單', '選單']:
             log_usage(user_name, '目錄')
-            replyMessages = menuMessage()
+            replyMessages = menuMessage
         
         else:
             return  # 不回應其他訊息
     else:
         # 未登入使用者 - 嘗試用邀請碼登入
         if len(command) == 16 and command.isalnum():
-            user_name = sign_in_with_token(command, line_id)
+            user_name = sign_in_with_token(command, line_id, ctx.bot_id)
             if user_name:
                 replyMessages = [
                     TextSendMessage(text=f"登入成功！歡迎 {user_name}"),
                     TextSendMessage(text="手機請「點按功能主選單」\n平板或電腦請傳送「目錄」呼叫選單")
                 ]
+                # 此 Bot 推播額度快用完時，建議改用額度較多的 Bot
+                suggested_bot_id = suggest_push_bot(ctx.bot_id)
+                if suggested_bot_id:
+                    replyMessages.append(TextSendMessage(
+                        text=f"目前這個 LINE Bot 本月的通知額度快用完了\n建議加入第 {suggested_bot_id} 台服事系統 Bot，並在那裡重新輸入邀請碼登入，才能正常收到提醒"
+                    ))
             else:
                 replyMessages = TextSendMessage(text="登入失敗，邀請碼無效或已被使用")
         else:
             replyMessages = [errorMessage, loginMessage]
     
-    line_bot_api.reply_message(event.reply_token, replyMessages)
+    reply_with_notices(event, ctx, replyMessages)
 
 
-@handler.add(PostbackEvent)
-def handle_postback(event):
+@add_event_handler(PostbackEvent)
+@with_event_context
+def handle_postback(event, ctx):
     """處理使用者 Postback 事件"""
     print(event)
-    line_id = event.source.user_id
     command = event.postback.data
     
     if command.strip() == ' ' or command.strip() == '':
@@ -1264,7 +2716,7 @@ def handle_postback(event):
         # data: {mode}|{collection}|{serve_type}
         parts = data.split('|')
         mode, collection_id, serve_type = parts[0], parts[1], parts[2]
-        replyMessages = select_shift_date(line_id, mode, collection_id, serve_type)
+        replyMessages = select_shift_date(ctx, mode, collection_id, serve_type)
     
     elif prefix == 'A&':
         # 選擇日期後，顯示候選人選單
@@ -1280,7 +2732,7 @@ def handle_postback(event):
     elif prefix == 'B&':
         # 確認調班申請
         # data: {被申請日}|{被申請人}|{申請日}|{collection}|{serve_type}|{申請人}
-        replyMessages = confirm_shift_request(data.split('|'), 'S')
+        replyMessages = confirm_shift_request(ctx, data.split('|'), 'S')
     
     elif prefix == 'B#':
         # 該服事有多人的處理
@@ -1289,7 +2741,7 @@ def handle_postback(event):
     elif prefix == 'G#':
         # 確認代班申請
         # data: {被申請人}|{申請日}|{collection}|{serve_type}|{申請人}
-        replyMessages = confirm_shift_request(data.split('|'), 'G')
+        replyMessages = confirm_shift_request(ctx, data.split('|'), 'G')
     
     elif prefix == 'C&':
         # 發送調班請求
@@ -1309,11 +2761,13 @@ def handle_postback(event):
     
     elif prefix == 'F&':
         # 執行調班/代班
-        replyMessages = execute_shift(data)
+        # data: {case_id}|{collection}|{申請日}|{被申請日}（舊按鈕只有 {case_id}）
+        parts = data.split('|')
+        replyMessages = execute_shift(parts[0], tuple(parts[1:]) if len(parts) == 4 else None)
     
     elif prefix == 'C*':
         # 更換服事提醒模式
-        replyMessages = change_reminder_day(command, line_id)
+        replyMessages = change_reminder_day(command, ctx)
     
     elif prefix == 'W&':
         # 查看指定崇拜的班表
@@ -1323,4 +2777,4 @@ def handle_postback(event):
     else:
         return  # 不認識的指令不處理
     
-    line_bot_api.reply_message(event.reply_token, replyMessages)
\ No newline at end of file
+    reply_with_notices(event, ctx, replyMessages)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""
+推播額度與重新分配建議
+python push_quota_report.py [YYYY.MM]
+
+讀取 _push_quota/{月份} 的各 Bot 推播次數，並估計每位使用者的推播量：
+  - 調班/代班通知：users.usage_count 中的推播類型（放進收件匣的通知另外記錄，只有逾期推播才計入）
+  - 服事提醒：_reminder_log/{日期} 的發送記錄（week_clock_alarm 寫入）
+依本月至今的比例推估整月用量，列出需要改用其他 Bot 的使用者，
+讓每台 Bot 都不超過 PUSH_QUOTA_LIMIT
+"""
+
+import calendar
+import sys
+from datetime import datetime
+
+# 匯入 main.py 時會一併完成 Firebase 初始化
+from main import db, PUSH_QUOTA_LIMIT, get_push_quota_usage
+
+REMINDER_LOG = "_reminder_log"  # 與 week_clock_alarm 相同
+# 收件匣逾期推播由 week_clock_alarm 記錄（INBOX_PUSH_USAGE）
+PUSH_USAGE_TYPES = ['調班/代班請求', '調班/代班成功通知', '調班/代班失敗通知', '調班/代班通知（收件匣逾期推播）']
+
+
+def get_user_push_counts(month):
+    """
+    估計每位使用者某月收到的推播次數
+
+    Args:
+        month: 月份 (YYYY.MM)
+
+    Returns:
+        tuple: ({ userName: 次數 }, { userName: line_bot_id })
+    """
+    counts = {}
+    user_bots = {}
+    for user_doc in db.collection("users").get():
+        user_data = user_doc.to_dict()
+        if not user_data.get('lineId'):
+            continue
+        user_bots[user_doc.id] = user_data.get('line_bot_id', 0)
+        month_usage = user_data.get('usage_count', {}).get(month, {})
+        counts[user_doc.id] = sum(month_usage.get(usage_type, 0) for usage_type in PUSH_USAGE_TYPES)
+
+    # 該月每天的提醒發送記錄
+    log_ref = db.collection(REMINDER_LOG)
+    log_docs = (log_ref
+        .where("__name__", ">=", log_ref.document(f"{month}.01"))
+        .where("__name__", "<=", log_ref.document(f"{month}.31"))
+        .get())
+    for log_doc in log_docs:
+        for user_name in (log_doc.to_dict().get('sent') or {}):
+            if user_name in counts:
+                counts[user_name] += 1
+
+    return counts, user_bots
+
+
+def month_progress(month):
+    """
+    該月已經過的比例（過去的月份為 1）
+
+    Args:
+        month: 月份 (YYYY.MM)
+
+    Returns:
+        float: 0 ~ 1
+    """
+    now = datetime.now()
+    if month != now.strftime("%Y.%m"):
+        return 1.0
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    return now.day / days_in_month
+
+
+def plan_rebalance(bot_projected, user_projected, user_bots, limit=PUSH_QUOTA_LIMIT):
+    """
+    從超額的 Bot 依推播量由大到小移出使用者，移到移入後仍不超額、剩餘額度最多的 Bot
+
+    Args:
+        bot_projected: { line_bot_id: 整月推估用量 }
+        user_projected: { userName: 整月推估用量 }
+        user_bots: { userName: 目前的 line_bot_id }
+        limit: 每台 Bot 的額度
+
+    Returns:
+        tuple: ([(userName, 原 Bot, 新 Bot, 推估用量), ...], 調整後的 { line_bot_id: 推估用量 })
+    """
+    load = dict(bot_projected)
+    moves = []
+    for bot_id in sorted(load):
+        if load[bot_id] <= limit:
+            continue
+        candidates = sorted(
+            (name for name, user_bot in user_bots.items() if user_bot == bot_id and user_projected.get(name)),
+            key=lambda name: -user_projected[name]
+        )
+        for user_name in candidates:
+            if load[bot_id] <= limit:
+                break
+            amount = user_projected[user_name]
+            targets = [other for other in load if other != bot_id and load[other] + amount <= limit]
+            if not targets:
+                continue
+            target = min(targets, key=lambda other: (load[other], other))
+            load[bot_id] -= amount
+            load[target] += amount
+            moves.append((user_name, bot_id, target, amount))
+    return moves, load
+
+
+def build_report(month=None):
+    """
+    產生推播額度報告
+
+    Args:
+        month: 月份 (YYYY.MM)，None 表示本月
+
+    Returns:
+        dict: { month, progress, bot_usage, bot_projected, moves, balanced }
+    """
+    month = month or datetime.now().strftime("%Y.%m")
+    progress = month_progress(month)
+
+    bot_usage = get_push_quota_usage(month)
+    user_counts, user_bots = get_user_push_counts(month)
+
+    bot_projected = {bot_id: round(count / progress) for bot_id, count in bot_usage.items()}
+    user_projected = {name: round(count / progress) for name, count in user_counts.items()}
+    moves, balanced = plan_rebalance(bot_projected, user_projected, user_bots)
+
+    return {
+        "month": month,
+        "progress": progress,
+        "bot_usage": bot_usage,
+        "bot_projected": bot_projected,
+        "moves": moves,
+        "balanced": balanced,
+    }
+
+
+if __name__ == "__main__":
+    report = build_report(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"{report['month']} 推播額度（已過 {report['progress']:.0%}，每台上限 {PUSH_QUOTA_LIMIT} 則）")
+    for bot_id, used in report['bot_usage'].items():
+        projected = report['bot_projected'][bot_id]
+        mark = " ⚠️ 超額" if projected > PUSH_QUOTA_LIMIT else ""
+        print(f"  Bot {bot_id}: 已用 {used} 則，推估整月 {projected} 則{mark}")
+
+    if not report['moves']:
+        print("不需要調整")
+    else:
+        print("建議請以下使用者加入新的 Bot 並重新輸入邀請碼登入：")
+        for user_name, from_bot, to_bot, amount in report['moves']:
+            print(f"  {user_name}: Bot {from_bot} → Bot {to_bot}（推估每月 {amount} 則）")
+        print("調整後推估：" + "，".join(
+            f"Bot {bot_id} {load} 則" for bot_id, load in report['balanced'].items()
+        ))
@@ -333,15 +333,21 @@ async function createInitialData() {
     }
 }
 
+// LINE Bot 預先產生的當週班表與提醒 outbox，班表變更時需一併刪除
+const CURRENT_WEEK = '_current_week';
+const REMINDERS = '_reminders';
+
 // 儲存 metadata
+// updatedAt 是班表的版本戳記，LINE Bot 用它判斷班表快取是否過期
 async function saveMetadata() {
-    const { doc, setDoc } = window.firestore;
+    const { doc, writeBatch, serverTimestamp } = window.firestore;
     const db = window.db;
     const COLLECTION_NAME = window.COLLECTION_NAME;
 
     const metadata = {
         serviceItems: serviceItems,
-        nonUserColumns: nonUserColumns
+        nonUserColumns: nonUserColumns,
+        updatedAt: serverTimestamp()
     };
 
     // 如果有 displayConfig，也儲存
@@ -349,12 +355,15 @@ async function saveMetadata() {
         metadata.displayConfig = displayConfig;
     }
 
-    await setDoc(doc(db, COLLECTION_NAME, '_metadata'), metadata);
+    const batch = writeBatch(db);
+    batch.set(doc(db, COLLECTION_NAME, '_metadata'), metadata);
+    batch.delete(doc(db, CURRENT_WEEK, COLLECTION_NAME));
+    await batch.commit();
 }
 
-// 儲存班表資料
+// 儲存班表資料（同一個 batch 更新 _metadata.updatedAt 版本戳記並清除當週班表、該日提醒 outbox）
 async function saveSchedule(dateStr, data) {
-    const { doc, setDoc } = window.firestore;
+    const { doc, writeBatch, serverTimestamp } = window.firestore;
     const db = window.db;
     const COLLECTION_NAME = window.COLLECTION_NAME;
 
@@ -362,16 +371,26 @@ async function saveSchedule(dateStr, data) {
     const saveData = { ...data };
     delete saveData.date;
 
-    await setDoc(doc(db, COLLECTION_NAME, dateStr), saveData);
+    const batch = writeBatch(db);
+    batch.set(doc(db, COLLECTION_NAME, dateStr), saveData);
+    batch.set(doc(db, COLLECTION_NAME, '_metadata'), { updatedAt: serverTimestamp() }, { merge: true });
+    batch.delete(doc(db, CURRENT_WEEK, COLLECTION_NAME));
+    batch.delete(doc(db, REMINDERS, dateStr));
+    await batch.commit();
 }
 
-// 刪除班表資料
+// 刪除班表資料（同一個 batch 更新 _metadata.updatedAt 版本戳記並清除當週班表、該日提醒 outbox）
 async function deleteSchedule(dateStr) {
-    const { doc, deleteDoc } = window.firestore;
+    const { doc, writeBatch, serverTimestamp } = window.firestore;
     const db = window.db;
     const COLLECTION_NAME = window.COLLECTION_NAME;
 
-    await deleteDoc(doc(db, COLLECTION_NAME, dateStr));
+    const batch = writeBatch(db);
+    batch.delete(doc(db, COLLECTION_NAME, dateStr));
+    batch.set(doc(db, COLLECTION_NAME, '_metadata'), { updatedAt: serverTimestamp() }, { merge: true });
+    batch.delete(doc(db, CURRENT_WEEK, COLLECTION_NAME));
+    batch.delete(doc(db, REMINDERS, dateStr));
+    await batch.commit();
 }
 
 // ===========================
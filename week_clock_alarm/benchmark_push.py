@@ -0,0 +1,132 @@
+"""
+推播派送效能比較（本地 LINE API stub，不會真的發送訊息）
+python benchmark_push.py [人數] [延遲毫秒] [錯誤率]
+
+比較逐筆 push_message 與 PushDispatcher 並行發送的耗時，
+stub 會依錯誤率隨機回傳 429 / 500，並檢查每位收件者只收到一次
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from linebot import LineBotApi
+from linebot.models import TextSendMessage
+
+from push_dispatcher import PushDispatcher, print_report
+
+BOT_COUNT = 2
+
+
+class LineApiStub(ThreadingHTTPServer):
+    """
+    模擬 LINE push API：固定延遲、隨機 429 / 500，並依 X-Line-Retry-Key 去除重複
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency, error_rate):
+        super().__init__(('127.0.0.1', 0), LineApiHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.accepted_keys = set()
+        self.received = {}  # { 收件者: 次數 }
+        self.requests = 0
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def reset(self):
+        with self.lock:
+            self.accepted_keys.clear()
+            self.received.clear()
+            self.requests = 0
+
+
+class LineApiHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        stub = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        retry_key = self.headers.get('X-Line-Retry-Key')
+        time.sleep(stub.latency)
+
+        with stub.lock:
+            stub.requests += 1
+            if retry_key and retry_key in stub.accepted_keys:
+                return self.respond(409, {"message": "The retry key is already accepted"})
+            roll = random.random()
+            if roll < stub.error_rate / 2:
+                return self.respond(429, {"message": "Too Many Requests"})
+            if roll < stub.error_rate:
+                return self.respond(500, {"message": "Internal Server Error"})
+            if retry_key:
+                stub.accepted_keys.add(retry_key)
+            stub.received[body.get('to')] = stub.received.get(body.get('to'), 0) + 1
+        self.respond(200, {})
+
+    def respond(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def make_recipients(count):
+    """產生測試收件者 [(line_bot_id, lineId, 名稱), ...]"""
+    return [((i % BOT_COUNT) + 1, f"U{i:032d}", f"user{i}") for i in range(count)]
+
+
+def run_sequential(stub, recipients):
+    """舊做法：逐筆 push_message，不重試"""
+    apis = [LineBotApi(f"token{i}", endpoint=stub.endpoint) for i in range(BOT_COUNT)]
+    failed = 0
+    started = time.perf_counter()
+    for bot_id, line_id, _ in recipients:
+        try:
+            apis[bot_id - 1].push_message(line_id, TextSendMessage(text="提醒你這週有服事喔!"))
+        except Exception:
+            failed += 1
+    return time.perf_counter() - started, failed
+
+
+def run_dispatcher(stub, recipients):
+    """新做法：PushDispatcher 並行發送"""
+    dispatcher = PushDispatcher([f"token{i}" for i in range(BOT_COUNT)],
+                                backoff_base=0.05, endpoint=stub.endpoint)
+    for bot_id, line_id, name in recipients:
+        dispatcher.add(bot_id, line_id, TextSendMessage(text="提醒你這週有服事喔!"), label=name)
+    report = dispatcher.run()
+    return report
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    stub = LineApiStub(latency, error_rate)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    recipients = make_recipients(count)
+
+    elapsed, failed = run_sequential(stub, recipients)
+    print(f"逐筆發送: {elapsed:.2f}s 失敗 {failed} 筆 (請求 {stub.requests} 次)")
+
+    stub.reset()
+    report = run_dispatcher(stub, recipients)
+    print_report(report)
+    duplicates = sum(1 for n in stub.received.values() if n > 1)
+    missing = sum(1 for _, line_id, _ in recipients if line_id not in stub.received) - len(report['failed'])
+    print(f"PushDispatcher: {report['elapsed']:.2f}s (請求 {stub.requests} 次) 重複 {duplicates} 人 遺漏 {missing} 人")
+
+    stub.shutdown()
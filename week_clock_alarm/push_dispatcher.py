@@ -0,0 +1,345 @@
+"""
+推播派送器：依 LINE Bot 分組、限速並行發送 push message
+
+- 固定大小的 worker pool，避免逐筆等待 HTTP 往返
+- 每台 Bot 各自限速（LINE push API 以 channel 計算頻率上限）
+- 429 / 5xx / 連線錯誤以指數退避重試，並帶同一個 X-Line-Retry-Key，
+  重送不會造成重複推播（LINE 回 409 表示先前已收到，視為成功）
+- 可搭配 SendLedger 記錄已發送的對象，重新執行時跳過已發送的部分
+"""
+
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from linebot import LineBotApi
+from linebot.exceptions import LineBotApiError
+
+PUSH_WORKERS = 8          # 同時發送的 worker 數
+PUSH_RATE_PER_BOT = 50    # 每台 Bot 每秒最多發送次數
+PUSH_MAX_RETRIES = 4      # 失敗後最多重試次數
+PUSH_BACKOFF_BASE = 0.5   # 第一次重試前等待秒數，之後每次加倍
+PUSH_BACKOFF_MAX = 8      # 單次等待上限（秒）
+LEDGER_FLUSH_EVERY = 20   # 發送記錄每累積幾筆寫入一次
+
+# 由工作 key 產生固定的 retry key，重新執行時同一對象會帶相同的 X-Line-Retry-Key
+RETRY_KEY_NAMESPACE = uuid.UUID('6f1c2d4e-8a3b-4c5d-9e7f-0a1b2c3d4e5f')
+
+
+class RateLimiter:
+    """
+    簡單的固定間隔限速器，多個 thread 共用
+    """
+
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """等待直到輪到下一個發送時段"""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SendLedger:
+    """
+    單次排程（如某一天的提醒）的發送記錄，存在一份 Firestore 文件：
+        { sent: { key: 發送時間, ... } }
+    成功發送後先暫存，每 flush_every 筆以一次 merge 寫入
+    """
+
+    def __init__(self, doc_ref, flush_every=LEDGER_FLUSH_EVERY):
+        """
+        Args:
+            doc_ref: 記錄用的 DocumentReference（如 _reminder_log/2026.01.05）
+            flush_every: 累積幾筆寫入一次
+        """
+        self.doc_ref = doc_ref
+        self.flush_every = flush_every
+        self.sent = set()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    @property
+    def ledger_id(self):
+        return self.doc_ref.path
+
+    def load(self):
+        """讀取先前已發送的記錄（一次讀取）"""
+        snapshot = self.doc_ref.get()
+        self.sent = set((snapshot.to_dict() or {}).get('sent', {})) if snapshot.exists else set()
+        return self
+
+    def is_sent(self, key):
+        with self.lock:
+            return key in self.sent
+
+    def mark_sent(self, key):
+        """記錄已發送，累積到 flush_every 筆時寫入"""
+        with self.lock:
+            self.sent.add(key)
+            self.pending[key] = time.strftime("%Y-%m-%d %H:%M:%S")
+            if len(self.pending) < self.flush_every:
+                return
+            pending, self.pending = self.pending, {}
+        self.write(pending)
+
+    def flush(self):
+        """寫入尚未寫入的記錄"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if pending:
+            self.write(pending)
+
+    def write(self, pending):
+        self.doc_ref.set({"sent": pending}, merge=True)
+
+
+class PushJob:
+    """
+    單一筆推播工作
+    """
+
+    def __init__(self, bot_id, to, messages, label, key=None, retry_name=None):
+        self.bot_id = bot_id
+        self.to = to
+        self.messages = messages
+        self.label = label
+        self.key = key
+        # 同一筆工作的所有重送都使用同一個 retry key；有 retry_name 時跨次執行也相同
+        self.retry_key = str(uuid.uuid5(RETRY_KEY_NAMESPACE, retry_name) if retry_name else uuid.uuid4())
+        self.attempts = 0
+        self.accepted = False  # LINE 這次才接受（409 或已在記錄中則為 False，不佔推播額度）
+
+
+def is_retryable(error):
+    """
+    判斷錯誤是否值得重試
+
+    Args:
+        error: 發送時拋出的例外
+
+    Returns:
+        bool: 429、5xx 與連線/逾時錯誤為 True
+    """
+    if isinstance(error, LineBotApiError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, requests.exceptions.RequestException)
+
+
+def retry_delay(error, attempt, backoff_base=PUSH_BACKOFF_BASE):
+    """
+    計算下一次重試前的等待秒數（優先採用 Retry-After）
+
+    Args:
+        error: 發送時拋出的例外
+        attempt: 已失敗次數（從 1 開始）
+        backoff_base: 第一次重試的等待秒數
+
+    Returns:
+        float: 等待秒數
+    """
+    if isinstance(error, LineBotApiError):
+        retry_after = (error.headers or {}).get('Retry-After')
+        if retry_after and str(retry_after).isdigit():
+            return min(float(retry_after), PUSH_BACKOFF_MAX)
+    delay = min(backoff_base * (2 ** (attempt - 1)), PUSH_BACKOFF_MAX)
+    # 加上隨機抖動，避免所有 worker 同時重送
+    return delay * random.uniform(0.5, 1.0)
+
+
+class PushDispatcher:
+    """
+    收集推播工作後一次並行發送，並回傳發送結果統計
+
+    用法：
+        dispatcher = PushDispatcher(channel_access_token)
+        dispatcher.add(bot_id, line_id, TextSendMessage(text=...), label="小明")
+        dispatcher.skip("小華", "沒有綁定 LINE ID")
+        report = dispatcher.run()
+
+    傳入 ledger 時，key 已在記錄中的工作不會發送，成功發送的 key 會寫入記錄
+    """
+
+    def __init__(self, channel_access_tokens, workers=PUSH_WORKERS, rate_per_bot=PUSH_RATE_PER_BOT,
+                 max_retries=PUSH_MAX_RETRIES, backoff_base=PUSH_BACKOFF_BASE, endpoint=None, ledger=None):
+        """
+        Args:
+            channel_access_tokens: 各 Bot 的 access token，索引 = line_bot_id - 1
+            workers: worker pool 大小
+            rate_per_bot: 每台 Bot 每秒最多發送次數
+            max_retries: 失敗後最多重試次數
+            backoff_base: 第一次重試前等待秒數
+            endpoint: LINE API 位址，None 表示正式環境（benchmark 可指向本地 stub）
+            ledger: SendLedger（已 load），None 表示不記錄
+        """
+        self.tokens = list(channel_access_tokens)
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.endpoint = endpoint
+        self.ledger = ledger
+        self.limiters = {bot_id: RateLimiter(rate_per_bot) for bot_id in range(1, len(self.tokens) + 1)}
+        self.jobs = {}  # { bot_id: [PushJob, ...] }
+        self.skipped = []  # [(label, 原因), ...]
+        self.already_sent = []  # 發送記錄中已存在的 label
+        self.local = threading.local()
+
+    def add(self, bot_id, to, messages, label=None, key=None):
+        """
+        加入一筆推播工作；line_bot_id 無效時記為略過
+
+        Args:
+            bot_id: 使用的 line_bot_id
+            to: 收件者 LINE ID
+            messages: 訊息物件或訊息列表
+            label: 報告中顯示的名稱（通常為使用者名稱）
+            key: 發送記錄的 key（同一個 ledger 內唯一，通常為使用者名稱）
+        """
+        label = label or to
+        if not self.has_bot(bot_id):
+            self.skip(label, f"尚未連線 LINE Bot (line_bot_id={bot_id})")
+            return
+        if key and self.ledger:
+            if self.ledger.is_sent(key):
+                self.already_sent.append(label)
+                return
+            job = PushJob(bot_id, to, messages, label, key, retry_name=f"{self.ledger.ledger_id}/{key}")
+        else:
+            job = PushJob(bot_id, to, messages, label)
+        self.jobs.setdefault(bot_id, []).append(job)
+
+    def has_bot(self, bot_id):
+        """line_bot_id 是否對應到一台可發送的 Bot"""
+        return bot_id in self.limiters
+
+    def skip(self, label, reason):
+        """記錄不發送的對象與原因"""
+        self.skipped.append((label, reason))
+
+    def get_api(self, bot_id):
+        """
+        取得此 thread 專用的 LineBotApi
+
+        SDK 會把 X-Line-Retry-Key 寫進實例共用的 headers，
+        因此每個 worker 各自持有實例，避免不同工作互相帶到對方的 retry key
+        """
+        apis = getattr(self.local, 'apis', None)
+        if apis is None:
+            apis = self.local.apis = {}
+        if bot_id not in apis:
+            kwargs = {'endpoint': self.endpoint} if self.endpoint else {}
+            apis[bot_id] = LineBotApi(self.tokens[bot_id - 1], **kwargs)
+        return apis[bot_id]
+
+    def send(self, job):
+        """
+        發送單一工作，必要時重試
+
+        Returns:
+            tuple: (job, None) 成功，或 (job, 錯誤訊息) 失敗
+        """
+        # 只檢查此 process 的記錄（啟動時載入 + 本次已送出的 key），同一次執行中重複加入的 key 不會再送；
+        # 不會重新讀取 Firestore，同時執行的另一次排程是否已送出無法在這裡得知，跨執行的重複只靠固定的 retry key（409）避免
+        if job.key and self.ledger and self.ledger.is_sent(job.key):
+            return job, None
+
+        api = self.get_api(job.bot_id)
+        error = None
+        while True:
+            job.attempts += 1
+            self.limiters[job.bot_id].acquire()
+            try:
+                api.push_message(job.to, job.messages, retry_key=job.retry_key)
+                job.accepted = True
+                break
+            except Exception as e:
+                # 409：相同 retry key 的請求先前已被接受
+                if isinstance(e, LineBotApiError) and e.status_code == 409:
+                    break
+                if not is_retryable(e) or job.attempts > self.max_retries:
+                    error = str(e)
+                    break
+                time.sleep(retry_delay(e, job.attempts, self.backoff_base))
+            finally:
+                api.headers.pop('X-Line-Retry-Key', None)
+
+        if error is None and job.key and self.ledger:
+            self.ledger.mark_sent(job.key)
+        return job, error
+
+    def ordered_jobs(self):
+        """各 Bot 的工作輪流排列，避免單一 Bot 的限速卡住其他 Bot"""
+        queues = [list(jobs) for jobs in self.jobs.values()]
+        ordered = []
+        while any(queues):
+            for queue in queues:
+                if queue:
+                    ordered.append(queue.pop(0))
+        return ordered
+
+    def run(self):
+        """
+        並行發送所有工作
+
+        Returns:
+            dict: {
+                sent: [label, ...],
+                skipped: [(label, 原因), ...],
+                already_sent: [label, ...]（發送記錄中已存在，未重送）,
+                failed: [(label, 錯誤訊息), ...],
+                sent_by_bot: { line_bot_id: 實際佔用推播額度的次數 },
+                retries: 重試次數,
+                elapsed: 秒數
+            }
+        """
+        started = time.perf_counter()
+        jobs = self.ordered_jobs()
+        sent, failed = [], []
+
+        try:
+            if jobs:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    for job, error in executor.map(self.send, jobs):
+                        if error:
+                            failed.append((job.label, error))
+                        else:
+                            sent.append(job.label)
+        finally:
+            # 中途失敗也要寫入已發送的部分，重新執行時才能從中斷處繼續
+            if self.ledger:
+                self.ledger.flush()
+
+        self.jobs = {}
+        sent_by_bot = {}
+        for job in jobs:
+            if job.accepted:
+                sent_by_bot[job.bot_id] = sent_by_bot.get(job.bot_id, 0) + 1
+        return {
+            "sent": sent,
+            "skipped": self.skipped,
+            "already_sent": self.already_sent,
+            "failed": failed,
+            "sent_by_bot": sent_by_bot,
+            "retries": sum(job.attempts - 1 for job in jobs),
+            "elapsed": time.perf_counter() - started,
+        }
+
+
+def print_report(report):
+    """輸出發送結果摘要"""
+    print(f"[push] sent={len(report['sent'])} skipped={len(report['skipped'])} "
+          f"already_sent={len(report['already_sent'])} "
+          f"failed={len(report['failed'])} retries={report['retries']} time={report['elapsed']:.2f}s")
+    for label, reason in report['skipped']:
+        print(f"  略過 {label}: {reason}")
+    for label, error in report['failed']:
+        print(f"  失敗 {label}: {error}")
@@ -3,79 +3,155 @@ from linebot import LineBotApi
 from linebot.models import (
     TextSendMessage
 )
+from push_dispatcher import PushDispatcher, SendLedger, print_report
 ###firestore
 import firebase_admin
 from firebase_admin import credentials
 from firebase_admin import firestore
-# 引用私密金鑰  
-cred = credentials.Certificate('serviceAccount.json')
-# 初始化firebase，注意不能重複初始化
-firebase_admin.initialize_app(cred)
-# 初始化firestore
-db = firestore.client()
-###endFirestore
+from google.cloud.firestore_v1.field_path import FieldPath
 import json
+import threading
+import time
 from datetime import datetime, timedelta, date
 
-# LINE Bot API 初始化 - 支援多台 LINE Bot
-line_bot_apis = [LineBotApi(token) for token in channel_access_token]
 
+class LazyFirestore:
+    """
+    第一次存取時才初始化 Firebase 與 Firestore client（與 line_bot_GCF 相同）
+    用法與 firestore.client() 相同（db.collection(...)、db.batch() ...）
+    """
+    
+    def __init__(self, credential_path='serviceAccount.json'):
+        self._credential_path = credential_path
+        self._client = None
+        self._lock = threading.Lock()
+    
+    def client(self):
+        """取得（必要時建立）實際的 Firestore client"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    # 引用私密金鑰，注意 firebase 不能重複初始化
+                    if not firebase_admin._apps:
+                        firebase_admin.initialize_app(credentials.Certificate(self._credential_path))
+                    self._client = firestore.client()
+        return self._client
+    
+    def set_client(self, client):
+        """直接指定 Firestore client（本地工具或模擬環境用）"""
+        self._client = client
+    
+    def __getattr__(self, name):
+        return getattr(self.client(), name)
+
+
+db = LazyFirestore()
+###endFirestore
+
+# LINE API 位址，None 表示正式環境（本地模擬可指向 LINE API stub）
+LINE_API_ENDPOINT = None
 
-def get_line_bot_api_for_user_data(user_data):
+def get_documents(refs, field_paths=None):
     """
-    根據用戶資料中的 line_bot_id 取得正確的 LineBotApi
+    以單一 RPC (db.get_all) 讀取多個文件
     
     Args:
-        user_data: 使用者資料 dict
+        refs: DocumentReference 列表
+        field_paths: 只取回這些欄位（field mask），None 表示全部欄位
         
     Returns:
-        LineBotApi: 正確的 LINE Bot API 實例，如果未連線則返回 None
+        dict: { 文件路徑 (如 "users/小明"): DocumentSnapshot, ... }
     """
-    bot_id = user_data.get('line_bot_id', 0)
-    
-    # line_bot_id = 0 表示未連線任何 Bot
-    if bot_id == 0:
-        return None
+    refs = list(refs)
+    if not refs:
+        return {}
+    if field_paths is not None:
+        field_paths = [FieldPath(field).to_api_repr() for field in field_paths]
+    return {doc.reference.path: doc for doc in db.get_all(refs, field_paths=field_paths)}
+
     
-    # line_bot_id - 1 = 陣列索引
-    array_index = bot_id - 1
-    if 0 <= array_index < len(line_bot_apis):
-        return line_bot_apis[array_index]
+# 提醒 outbox：_reminders/{YYYY.MM.DD} → { recipients: { userName: { lineId, line_bot_id, alarm_days, serves } } }
+# 缺少時（第一次執行或 schedule-app 修改班表後被刪除）由這裡整份產生，
+# LINE Bot 在調班成功、設定提醒、登入時會局部更新
+REMINDERS = "_reminders"
+
+# 推播額度：_push_quota/{YYYY.MM} → { "1": 次數, ... }（與 LINE Bot 共用，依 line_bot_id）
+PUSH_QUOTA = "_push_quota"
+
+# 發送記錄：_reminder_log/{今天日期} → { sent: { userName: 發送時間 } }
+# Cloud Scheduler 重試或手動重跑時，已發送的用戶不會再收到一次
+REMINDER_LOG = "_reminder_log"
+
+# 通知收件匣：_inbox/{userName} → { notices: [{ text, queuedAt }], deadline: 最早的期限 (epoch 秒) }
+# LINE Bot 把不急的通知放在這裡，隨使用者下一次觸發的回覆送出；超過期限仍未送出的改用推播
+INBOX = "_inbox"
+REPLY_MESSAGE_LIMIT = 5  # 單次推播最多 5 則訊息
+INBOX_PUSH_USAGE = "調班/代班通知（收件匣逾期推播）"  # 使用量統計的類型，與 push_quota_report 相同
+
+
+def record_push_quota(sent_by_bot):
+    """
+    以原子操作累加各 Bot 本月的推播次數
     
-    return None  # 無效的 bot_id
+    Args:
+        sent_by_bot: { line_bot_id: 次數 }
+    """
+    if not sent_by_bot:
+        return
+    month = datetime.now().strftime("%Y.%m")
+    db.collection(PUSH_QUOTA).document(month).set(
+        {str(bot_id): firestore.Increment(count) for bot_id, count in sent_by_bot.items()},
+        merge=True
+    )
 
+
+def record_inbox_pushes(user_names):
+    """
+    在使用量統計記錄收件匣逾期推播（push_quota_report 依此估計每位使用者的推播量）
     
-def reminder_all_serves():
+    Args:
+        user_names: 成功推播的使用者名稱列表
     """
-    提醒所有崇拜這週有服事的人
+    if not user_names:
+        return
+    field = FieldPath('usage_count', datetime.now().strftime("%Y.%m"), INBOX_PUSH_USAGE).to_api_repr()
+    batch = db.batch()
+    for user_name in user_names:
+        batch.update(db.collection("users").document(user_name), {field: firestore.Increment(1)})
+    batch.commit()
+
+
+def build_reminder_outbox(this_sunday):
+    """
+    從班表與用戶資料產生某個週日的提醒 outbox
     
     流程：
     1. 從 _config/serve-list 取得所有崇拜清單
-    2. 計算這週日的日期
-    3. 遍歷每個崇拜，取得該週日的服事資料
-    4. 整理成 {人員: [崇拜名-服事項目, ...]} 的格式
-    5. 檢查每個有服事的用戶今天是否要被提醒
-    6. 發送提醒訊息（使用該用戶對應的 LINE Bot）
-    """
-    
-    # 計算這週日的日期
-    today = datetime.now()
-    days_until_sunday = (6 - today.weekday()) % 7  # weekday(): Monday=0, Sunday=6
-    if days_until_sunday == 0:
-        days_until_sunday = 7  # 如果今天是週日，取下週日
-    this_sunday = (today + timedelta(days=days_until_sunday)).strftime("%Y.%m.%d")
+    2. 以單一 get_all 取得所有崇拜該週日的服事資料
+    3. 整理成 {人員: [崇拜名-服事項目, ...]} 的格式
+    4. 以單一 get_all 取得這些用戶的 lineId / line_bot_id / alarm_days
     
+    Args:
+        this_sunday: 週日日期 (YYYY.MM.DD)
+        
+    Returns:
+        dict: { userName: { lineId, line_bot_id, alarm_days, serves }, ... }，找不到崇拜清單時為 None
+    """
     # 1. 從 _config/serve-list 取得所有崇拜清單
     serve_list_doc = db.collection("_config").document("serve-list").get()
     if not serve_list_doc.exists:
         print("找不到 _config/serve-list")
-        return
+        return None
     
     serves = serve_list_doc.to_dict().get('serves', [])
     
-    # 2. 整理每個人這週的服事 {人員: [(崇拜名, 服事項目), ...]}
-    person_serves = {}
+    # 2. 所有崇拜這週日的服事資料一次讀取
+    sunday_docs = get_documents(
+        [db.collection(serve_info.get('id')).document(this_sunday) for serve_info in serves]
+    )
     
+    # 3. 整理每個人這週的服事 {人員: [崇拜名-服事項目, ...]}
+    person_serves = {}
     for serve_info in serves:
         collection_id = serve_info.get('id')
         serve_name = serve_info.get('name', collection_id)
@@ -83,8 +159,8 @@ def reminder_all_serves():
         display_name = f"{emoji} {serve_name}".strip()
 
         # 取得該崇拜這週日的服事資料
-        schedule_doc = db.collection(collection_id).document(this_sunday).get()
-        if not schedule_doc.exists:
+        schedule_doc = sunday_docs.get(db.collection(collection_id).document(this_sunday).path)
+        if not schedule_doc or not schedule_doc.exists:
             continue
         
         schedule_data = schedule_doc.to_dict()
@@ -100,50 +176,199 @@ def reminder_all_serves():
                     person_serves[person] = []
                 person_serves[person].append(f"{display_name}-{serve_type}")
     
-    # 3. 檢查每個有服事的用戶今天是否要被提醒，並發送訊息
-    today_weekday = today.weekday()  # Monday=0, Sunday=6
+    # 4. 有服事的用戶資料一次讀取，只取提醒需要的欄位
+    user_docs = get_documents(
+        [db.collection("users").document(person_name) for person_name in person_serves],
+        ['lineId', 'line_bot_id', 'alarm_days']
+    )
     
+    recipients = {}
     for person_name, serve_list in person_serves.items():
-        print(f"用戶 {person_name} 的服事清單:")
-        print(serve_list)
-        # 取得用戶資料
-        user_doc = db.collection("users").document(person_name).get()
-        if not user_doc.exists:
+        user_doc = user_docs.get(db.collection("users").document(person_name).path)
+        if not user_doc or not user_doc.exists:
             print(f"用戶 {person_name} 不存在於 users collection")
             continue
         
         user_data = user_doc.to_dict()
-        line_id = user_data.get('lineId', '')
+        recipients[person_name] = {
+            "lineId": user_data.get('lineId', ''),
+            "line_bot_id": user_data.get('line_bot_id', 0),
+            "alarm_days": user_data.get('alarm_days', []),
+            "serves": serve_list,
+        }
+    return recipients
+
+
+@firestore.transactional
+def claim_inbox(transaction, inbox_ref):
+    """
+    取出整份收件匣並刪除（在 transaction 中，避免與使用者觸發的回覆重複送出）
+    
+    Args:
+        transaction: Firestore transaction
+        inbox_ref: _inbox/{userName} 的 DocumentReference
+        
+    Returns:
+        list: 通知列表 [{ text, queuedAt }, ...]（依加入順序），收件匣已被清空時為空列表
+    """
+    inbox_doc = next(iter(transaction.get(inbox_ref)))
+    if not inbox_doc.exists:
+        return []
+    notices = sorted(inbox_doc.to_dict().get('notices', []), key=lambda notice: notice.get('queuedAt', 0))
+    transaction.delete(inbox_ref)
+    transaction.update(db.collection("users").document(inbox_ref.id), {"inbox_pending": firestore.DELETE_FIELD})
+    return notices
+
+
+def restore_inbox(user_name, notices):
+    """
+    推播失敗時把取出的通知放回收件匣，期限設為現在，下一次 inbox 排程會再推播
+    
+    Args:
+        user_name: 使用者名稱
+        notices: claim_inbox 取出的通知列表
+    """
+    batch = db.batch()
+    batch.set(db.collection(INBOX).document(user_name), {
+        "notices": firestore.ArrayUnion(notices),
+        "deadline": firestore.Minimum(time.time()),
+    }, merge=True)
+    batch.update(db.collection("users").document(user_name), {"inbox_pending": firestore.Increment(len(notices))})
+    batch.commit()
+
+
+def deliver_expired_notices():
+    """
+    把超過期限仍留在收件匣的通知改用推播送出
+    
+    Returns:
+        dict: PushDispatcher 的發送結果，沒有逾期通知時為 None
+    """
+    expired_docs = db.collection(INBOX).where("deadline", "<=", time.time()).get()
+    if not expired_docs:
+        return None
+    
+    user_docs = get_documents(
+        [db.collection("users").document(inbox_doc.id) for inbox_doc in expired_docs],
+        field_paths=['lineId', 'line_bot_id']
+    )
+    dispatcher = PushDispatcher(channel_access_token, endpoint=LINE_API_ENDPOINT)
+    claimed = {}  # { 使用者名稱: 取出的通知 }，推播失敗時放回收件匣
+    
+    for inbox_doc in expired_docs:
+        person_name = inbox_doc.id
         
+        # 無法推播的用戶不取出，通知留在收件匣（綁定後傳訊息給 Bot 時會隨回覆送出）
+        user_doc = user_docs.get(f"users/{person_name}")
+        user_data = user_doc.to_dict() if user_doc is not None and user_doc.exists else {}
+        line_id = user_data.get('lineId', '')
+        bot_id = user_data.get('line_bot_id', 0)
         if not line_id:
-            print(f"用戶 {person_name} 沒有綁定 LINE ID")
+            dispatcher.skip(person_name, "沒有綁定 LINE ID，通知留在收件匣")
+            continue
+        if not dispatcher.has_bot(bot_id):
+            dispatcher.skip(person_name, f"尚未連線 LINE Bot (line_bot_id={bot_id})，通知留在收件匣")
             continue
         
-        # 檢查今天是否要提醒 (alarm_type 陣列，索引對應週一=0 到 週六=5)
-        alarm_type = user_data.get('alarm_type', [])
+        try:
+            notices = claim_inbox(db.transaction(), inbox_doc.reference)
+        except Exception as e:
+            print(f"收件匣 {person_name} 讀取失敗: {e}")
+            continue
+        if not notices:
+            continue
         
-        # 週日 (weekday=6) 不在 alarm_type 範圍內，跳過
-        if today_weekday >= len(alarm_type):
+        # 單次推播最多 5 則，超過時把第 5 則之後的通知合併成最後一則
+        texts = [notice['text'] for notice in notices]
+        messages = texts[:REPLY_MESSAGE_LIMIT - 1] + ["\n\n".join(texts[REPLY_MESSAGE_LIMIT - 1:])] \
+            if len(texts) > REPLY_MESSAGE_LIMIT else texts
+        claimed[person_name] = notices
+        dispatcher.add(bot_id, line_id, [TextSendMessage(text=text) for text in messages], label=person_name)
+    
+    try:
+        report = dispatcher.run()
+    except Exception:
+        # 發送中途中斷：無法確認哪些已送出，全部放回（重送比遺失好）
+        for person_name, notices in claimed.items():
+            restore_inbox(person_name, notices)
+        raise
+    
+    # 推播失敗（429 / 5xx / 逾時）的通知放回收件匣
+    for person_name, error in report['failed']:
+        try:
+            restore_inbox(person_name, claimed[person_name])
+        except Exception as e:
+            print(f"收件匣 {person_name} 放回失敗: {e}")
+    record_push_quota(report['sent_by_bot'])
+    try:
+        record_inbox_pushes(report['sent'])
+    except Exception as e:
+        print(f"收件匣推播使用量記錄失敗: {e}")
+    print_report(report)
+    return report
+
+
+def reminder_all_serves():
+    """
+    提醒所有崇拜這週有服事的人
+    
+    流程：
+    1. 計算這週日的日期（週日不提醒）
+    2. 讀取 _reminders/{週日}，不存在時以 build_reminder_outbox 產生並寫回
+    3. 篩選 alarm_days 包含今天的用戶
+    4. 交給 PushDispatcher 依 LINE Bot 分組並行發送，_reminder_log 中今天已發送的用戶跳過
+    
+    Returns:
+        dict: PushDispatcher 的發送結果（sent / skipped / failed / retries / elapsed）
+    """
+    
+    # 計算這週日的日期
+    today = datetime.now()
+    today_weekday = today.weekday()  # Monday=0, Sunday=6
+    if today_weekday == 6:
+        print("週日不提醒")
+        return None
+    this_sunday = (today + timedelta(days=6 - today_weekday)).strftime("%Y.%m.%d")
+    
+    # 1. 讀取預先產生的 outbox（平常只需要這一次讀取）
+    outbox_ref = db.collection(REMINDERS).document(this_sunday)
+    outbox_doc = outbox_ref.get()
+    if outbox_doc.exists:
+        recipients = outbox_doc.to_dict().get('recipients', {})
+    else:
+        recipients = build_reminder_outbox(this_sunday)
+        if recipients is None:
+            return None
+        outbox_ref.set({"recipients": recipients, "builtAt": firestore.SERVER_TIMESTAMP})
+    
+    # 2. 只處理今天要提醒的用戶（alarm_days 使用 weekday()，週一=0），並發送訊息
+    ledger = SendLedger(db.collection(REMINDER_LOG).document(today.strftime("%Y.%m.%d"))).load()
+    dispatcher = PushDispatcher(channel_access_token, endpoint=LINE_API_ENDPOINT, ledger=ledger)
+    
+    for person_name, recipient in recipients.items():
+        if today_weekday not in recipient.get('alarm_days', []):
             continue
         
-        if not alarm_type[today_weekday]:
+        serve_list = recipient.get('serves', [])
+        print(f"用戶 {person_name} 的服事清單:")
+        print(serve_list)
+        line_id = recipient.get('lineId', '')
+        
+        if not line_id:
+            dispatcher.skip(person_name, "沒有綁定 LINE ID")
             continue
         
-        # 4. 發送提醒訊息（使用該用戶對應的 LINE Bot）
+        # 3. 加入發送佇列（使用該用戶對應的 LINE Bot）
         message = f"提醒你這週有服事喔!\n\n這週的服事（{this_sunday.replace('.', '/')}）:\n"
         message += "\n".join([f"• {s}" for s in serve_list])
-        
-        try:
-            # 根據用戶的 line_bot_id 選擇正確的 LineBotApi
-            user_line_bot_api = get_line_bot_api_for_user_data(user_data)
-            if not user_line_bot_api:
-                print(f"用戶 {person_name} 尚未連線 LINE Bot (line_bot_id={user_data.get('line_bot_id', 0)})")
-                continue
-            
-            user_line_bot_api.push_message(line_id, TextSendMessage(text=message))
-            print(f"已提醒 {person_name} (使用 Bot {user_data.get('line_bot_id', 0)})")
-        except Exception as e:
-            print(f"發送訊息給 {person_name} 失敗:", str(e))
+        dispatcher.add(recipient.get('line_bot_id', 0), line_id, TextSendMessage(text=message),
+                       label=person_name, key=person_name)
+    
+    # 4. 並行發送，記錄推播額度並輸出結果摘要
+    report = dispatcher.run()
+    record_push_quota(report['sent_by_bot'])
+    print_report(report)
+    return report
 
 
 def force_reminder(nextSunday, channel_access_token, service_prefix):
@@ -186,6 +411,11 @@ def cloud_Scheduler(request):
 
         if function=="reminder":
             reminder_all_serves()
+            # 收件匣失敗不影響服事提醒，下一次 inbox 排程會再處理
+            try:
+                deliver_expired_notices()
+            except Exception as e:
+                print(f"收件匣到期通知失敗: {e}")
 
             # # 強制提醒主領、兒崇奉獻
             # if datetime.now().isoweekday() == 1:
@@ -197,4 +427,8 @@ def cloud_Scheduler(request):
             #     force_reminder(nextSunday, channel_access_token_youth, '', '主領', '選歌')
             #     force_reminder(nextSunday, channel_access_token_kids, 'kids_', '司會', '選經文')
         
+        elif function=="inbox":
+            # 每小時執行：推播收件匣中已超過期限的通知
+            deliver_expired_notices()
+        
         return "success"
\ No newline at end of file